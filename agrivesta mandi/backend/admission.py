@@ -0,0 +1,222 @@
+"""
+Admission Control for Multilingual Mandi.
+
+Each class of model-backed endpoint (translate, chat, negotiate, ...)
+gets its own Bulkhead: a fixed number of concurrent upstream calls and
+a bounded wait queue. When the queue is full, or a request waits too
+long for a slot, it is rejected at once with Overloaded, which the API
+turns into a 503 with Retry-After.
+
+WHY: The default thread pool silently capped concurrency and let excess
+requests pile up until they timed out. Rejecting fast keeps latency
+predictable for the requests we do admit, and one busy endpoint can no
+longer starve the others.
+
+Queued requests are served in weighted fair order (start-time fair
+queuing) by client, as identified by rate_limit.py, rather than FIFO:
+a client with a hundred requests queued cannot make a client with one
+wait behind all of them.
+
+Limits are configured per class as "concurrency:queue", e.g.
+    GEMINI_LIMITS="chat=16:64,translate=32:128"
+"""
+import asyncio
+import heapq
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from metrics import add_queue_wait
+from rate_limit import current_client
+
+DEFAULT_LIMITS = {
+    "translate": (32, 128),
+    "detect": (8, 32),
+    "negotiate": (16, 64),
+    "insight": (16, 64),
+    "chat": (16, 64),
+    "phrases": (8, 32),
+}
+
+# Longest a request may wait in the queue before it is turned away
+QUEUE_TIMEOUT = float(os.getenv("GEMINI_QUEUE_TIMEOUT", "10"))
+
+
+class Overloaded(Exception):
+    """Raised when a bulkhead rejects a request."""
+
+    def __init__(self, kind: str, retry_after: int, reason: str = "queue full"):
+        super().__init__(f"{kind} overloaded: {reason}")
+        self.kind = kind
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+class Bulkhead:
+    """
+    Concurrency limit plus a bounded, weighted-fair wait queue for one
+    endpoint class.
+
+    Each queued request gets a start tag: the later of the current
+    virtual time and its client's previous finish tag. A freed slot goes
+    to the lowest tag, so each client gets capacity in proportion to its
+    weight however many requests it has queued.
+    """
+
+    def __init__(self, kind: str, limit: int, max_queue: int, queue_timeout: float = QUEUE_TIMEOUT):
+        self.kind = kind
+        self.limit = limit
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        # Heap of (start tag, seq, future) for queued requests
+        self._waiters = []
+        self._seq = 0
+        self._virtual_time = 0.0
+        # client id -> finish tag of its latest request
+        self._last_finish = {}
+        self.active = 0
+        self.waiting = 0
+        self.rejected = 0
+        self.admitted = 0
+        # EWMA of upstream service time, used to estimate Retry-After
+        self.avg_service = 1.0
+        self.total_wait = 0.0
+
+    def retry_after(self) -> int:
+        """Seconds until the current queue should have drained."""
+        backlog = (self.waiting + self.active) / max(1, self.limit)
+        return max(1, int(backlog * self.avg_service + 0.999))
+
+    def _tag(self) -> float:
+        """Start tag for a new request of the current client."""
+        client, weight = current_client()
+        if len(self._last_finish) > 10_000:
+            # Tags at or behind virtual time are equivalent to a fresh client
+            self._last_finish = {
+                c: f for c, f in self._last_finish.items() if f > self._virtual_time
+            }
+        start = max(self._virtual_time, self._last_finish.get(client, 0.0))
+        self._last_finish[client] = start + 1.0 / max(weight, 0.01)
+        return start
+
+    async def _acquire(self) -> None:
+        tag = self._tag()
+        # Queued requests only exist while every slot is taken
+        if self.active < self.limit:
+            self.active += 1
+            self._virtual_time = max(self._virtual_time, tag)
+            return
+        future = asyncio.get_running_loop().create_future()
+        self._seq += 1
+        heapq.heappush(self._waiters, (tag, self._seq, future))
+        try:
+            await asyncio.wait_for(future, timeout=self.queue_timeout)
+        except BaseException:
+            if future.done() and not future.cancelled():
+                # The slot was handed over as we gave up; pass it on
+                self._release()
+            raise
+
+    def _release(self) -> None:
+        """Hands the slot to the lowest-tagged live waiter, or frees it."""
+        while self._waiters:
+            tag, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                self._virtual_time = max(self._virtual_time, tag)
+                future.set_result(None)
+                return
+        self.active -= 1
+
+    @asynccontextmanager
+    async def slot(self):
+        """
+        Holds one concurrency slot for the duration of the block.
+
+        Raises:
+            Overloaded: If the queue is full or the wait exceeds queue_timeout
+        """
+        # Counters update synchronously, so a burst cannot slip past the check
+        if self.active + self.waiting >= self.limit + self.max_queue:
+            self.rejected += 1
+            raise Overloaded(self.kind, self.retry_after())
+
+        queued_at = time.monotonic()
+        self.waiting += 1
+        try:
+            await self._acquire()
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise Overloaded(self.kind, self.retry_after(), "queue timeout")
+        finally:
+            self.waiting -= 1
+
+        started = time.monotonic()
+        self.total_wait += started - queued_at
+        add_queue_wait(self.kind, started - queued_at)
+        self.admitted += 1
+        try:
+            yield
+        finally:
+            self._release()
+            self.avg_service = 0.8 * self.avg_service + 0.2 * (time.monotonic() - started)
+
+    async def run(self, fn):
+        """Runs `await fn()` inside a slot. See slot()."""
+        async with self.slot():
+            return await fn()
+
+    def snapshot(self) -> dict:
+        return {
+            "limit": self.limit,
+            "max_queue": self.max_queue,
+            "active": self.active,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "avg_service_s": round(self.avg_service, 3),
+            "avg_queue_wait_s": round(self.total_wait / self.admitted, 4) if self.admitted else 0.0,
+        }
+
+
+def _parse_limits(spec: str) -> dict:
+    """Parses "chat=16:64,translate=32:128" into {kind: (limit, queue)}."""
+    limits = dict(DEFAULT_LIMITS)
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        try:
+            kind, values = part.split("=", 1)
+            limit, _, queue = values.partition(":")
+            limits[kind.strip()] = (int(limit), int(queue or limit))
+        except ValueError:
+            print(f"Ignoring invalid GEMINI_LIMITS entry: {part}")
+    return limits
+
+
+class AdmissionController:
+    """Holds one Bulkhead per endpoint class."""
+
+    def __init__(self, limits: Optional[dict] = None):
+        self.bulkheads = {
+            kind: Bulkhead(kind, limit, queue)
+            for kind, (limit, queue) in (limits or DEFAULT_LIMITS).items()
+        }
+
+    def get(self, kind: str) -> Bulkhead:
+        bulkhead = self.bulkheads.get(kind)
+        if bulkhead is None:
+            limit, queue = DEFAULT_LIMITS["chat"]
+            bulkhead = self.bulkheads[kind] = Bulkhead(kind, limit, queue)
+        return bulkhead
+
+    async def run(self, kind: str, fn):
+        return await self.get(kind).run(fn)
+
+    def slot(self, kind: str):
+        return self.get(kind).slot()
+
+    def snapshot(self) -> dict:
+        return {kind: b.snapshot() for kind, b in self.bulkheads.items()}
+
+
+# Shared controller used by services
+admission = AdmissionController(_parse_limits(os.getenv("GEMINI_LIMITS", "")))
@@ -0,0 +1,231 @@
+"""
+Caching primitives for Multilingual Mandi.
+
+- LRUCache: in-process LRU with TTL and an entry cap
+- SQLiteCache: on-disk key/value tier shared by all uvicorn workers
+- TieredCache: LRU in front of SQLite, with hit/miss counters
+
+WHY: Market traffic is extremely repetitive ("what is the rate",
+"thoda kam karo"). Serving repeats from memory takes microseconds
+instead of a 1-3 s Gemini round trip, and the SQLite tier keeps that
+memory across restarts and workers.
+"""
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Optional
+
+DEFAULT_CACHE_DB = Path(
+    os.getenv("CACHE_DB_PATH", str(Path(__file__).parent / "data" / "cache.sqlite3"))
+)
+
+
+def normalize_text(text: str) -> str:
+    """
+    Canonical form of user text for cache keys.
+
+    NFKC-normalizes, casefolds and collapses whitespace so trivially
+    different spellings of the same phrase share an entry.
+    """
+    return " ".join(unicodedata.normalize("NFKC", text).casefold().split())
+
+
+class LRUCache:
+    """
+    Thread-safe LRU cache with per-entry TTL.
+
+    Args:
+        max_entries: Entries kept before the least recently used is evicted
+        ttl: Seconds an entry stays valid (0 = no expiry)
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            value, expires = entry
+            if expires and expires < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl: Optional[float] = None) -> None:
+        ttl = self.ttl if ttl is None else ttl
+        expires = time.monotonic() + ttl if ttl else 0
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SQLiteCache:
+    """
+    Namespaced key/value store in a local SQLite file.
+
+    Uses WAL mode and one connection per thread so several uvicorn
+    workers (processes) and threads can read and write concurrently.
+
+    Args:
+        namespace: Logical table partition, e.g. "translation"
+        path: Database file
+        ttl: Seconds a row stays valid (0 = no expiry)
+        max_rows: Rows kept per namespace; oldest are pruned beyond this
+    """
+
+    # Prune expired/excess rows every N writes rather than on each one
+    PRUNE_EVERY = 200
+
+    def __init__(self, namespace: str, path: Path = DEFAULT_CACHE_DB, ttl: float = 0,
+                 max_rows: int = 100_000):
+        self.namespace = namespace
+        self.path = Path(path)
+        self.ttl = ttl
+        self.max_rows = max_rows
+        self._local = threading.local()
+        self._writes = 0
+        self._disabled = False
+
+    def _conn(self) -> Optional[sqlite3.Connection]:
+        if self._disabled:
+            return None
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                conn = sqlite3.connect(str(self.path), timeout=5, isolation_level=None)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS cache ("
+                    " namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL,"
+                    " expires REAL NOT NULL, updated REAL NOT NULL,"
+                    " PRIMARY KEY (namespace, key))"
+                )
+            except sqlite3.Error as e:
+                # WHY: Read-only filesystems (e.g. serverless) fall back to L1 only
+                print(f"SQLite cache disabled: {e}")
+                self._disabled = True
+                return None
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str, default=None):
+        conn = self._conn()
+        if conn is None:
+            return default
+        try:
+            row = conn.execute(
+                "SELECT value, expires FROM cache WHERE namespace = ? AND key = ?",
+                (self.namespace, key),
+            ).fetchone()
+        except sqlite3.Error as e:
+            print(f"SQLite cache read error: {e}")
+            return default
+        if row is None or (row[1] and row[1] < time.time()):
+            return default
+        return json.loads(row[0])
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        conn = self._conn()
+        if conn is None:
+            return
+        ttl = self.ttl if ttl is None else ttl
+        now = time.time()
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (namespace, key, value, expires, updated)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (self.namespace, key, json.dumps(value, ensure_ascii=False),
+                 now + ttl if ttl else 0, now),
+            )
+            self._writes += 1
+            if self._writes % self.PRUNE_EVERY == 0:
+                self.prune()
+        except sqlite3.Error as e:
+            print(f"SQLite cache write error: {e}")
+
+    def prune(self) -> None:
+        """Drops expired rows and the oldest rows beyond max_rows."""
+        conn = self._conn()
+        if conn is None:
+            return
+        conn.execute(
+            "DELETE FROM cache WHERE namespace = ? AND expires > 0 AND expires < ?",
+            (self.namespace, time.time()),
+        )
+        conn.execute(
+            "DELETE FROM cache WHERE namespace = ? AND key IN ("
+            " SELECT key FROM cache WHERE namespace = ? ORDER BY updated DESC LIMIT -1 OFFSET ?)",
+            (self.namespace, self.namespace, self.max_rows),
+        )
+
+
+class TieredCache:
+    """
+    LRU (L1) in front of SQLite (L2) with hit/miss counters.
+
+    L1 lookups are synchronous and sub-millisecond; L2 lookups run in a
+    worker thread so the event loop never blocks on disk.
+    """
+
+    def __init__(self, name: str, l1: LRUCache, l2: Optional[SQLiteCache] = None):
+        self.name = name
+        self.l1 = l1
+        self.l2 = l2
+        self.stats = {"l1_hits": 0, "l2_hits": 0, "misses": 0, "writes": 0}
+
+    async def get(self, key: str):
+        value = self.l1.get(key)
+        if value is not None:
+            self.stats["l1_hits"] += 1
+            return value
+        if self.l2 is not None:
+            value = await asyncio.to_thread(self.l2.get, key)
+            if value is not None:
+                self.stats["l2_hits"] += 1
+                self.l1.set(key, value)
+                return value
+        self.stats["misses"] += 1
+        return None
+
+    async def set(self, key: str, value) -> None:
+        self.l1.set(key, value)
+        self.stats["writes"] += 1
+        if self.l2 is not None:
+            await asyncio.to_thread(self.l2.set, key, value)
+
+    def snapshot(self) -> dict:
+        """Counters plus hit ratio, for health/metrics endpoints."""
+        lookups = self.stats["l1_hits"] + self.stats["l2_hits"] + self.stats["misses"]
+        hits = self.stats["l1_hits"] + self.stats["l2_hits"]
+        return {
+            **self.stats,
+            "entries": len(self.l1),
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+        }
@@ -0,0 +1,332 @@
+"""
+Server-side chat sessions for the Multilingual Mandi assistant.
+
+Each session keeps its recent turns verbatim plus a rolling summary of
+older ones. Once the verbatim turns pass CHAT_HISTORY_TOKENS, the oldest
+are handed out (take_fold) to be summarized by the model in the
+background and folded into the summary (apply_summary). Prompts only
+ever include the summary and the newest turns that fit the budget, so
+their size stays flat however long a conversation runs.
+
+Sessions are opt-in: /api/chat only opens one when the client sends
+"session": true or a session_id, so stateless clients (scripts, load
+tests, the bulk of one-off questions) cost no memory here.
+
+The store is bounded three ways: a turn cap per session, an idle TTL,
+and a global memory budget enforced by evicting the least recently used
+sessions.
+
+Sessions live in this process's memory only. With several uvicorn
+workers a follow-up may reach a worker that never saw the session and
+starts a new one, and serverless instances (Vercel) lose them on every
+cold start. Such deployments need sticky routing, or the client should
+treat a changed session_id as a fresh conversation.
+
+WHY: /api/chat was stateless, so users repeated context in every message
+and prompts grew with it. Replaying a whole transcript instead would
+make latency and cost grow with conversation length.
+"""
+import os
+import secrets
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Optional
+
+# Verbatim history allowed in a prompt, in estimated tokens
+CHAT_HISTORY_TOKENS = int(os.getenv("CHAT_HISTORY_TOKENS", "600"))
+# Upper bound for the rolling summary, in estimated tokens
+CHAT_SUMMARY_TOKENS = int(os.getenv("CHAT_SUMMARY_TOKENS", "200"))
+# Turns kept verbatim per session, whatever their size
+CHAT_SESSION_MAX_TURNS = int(os.getenv("CHAT_SESSION_MAX_TURNS", "20"))
+# Idle sessions expire after this many seconds
+CHAT_SESSION_TTL = float(os.getenv("CHAT_SESSION_TTL", str(2 * 3600)))
+# Memory budget for all sessions together
+CHAT_SESSIONS_MAX_MB = float(os.getenv("CHAT_SESSIONS_MAX_MB", "64"))
+# Longer messages are truncated before they are stored
+MAX_STORED_CHARS = 2000
+
+# Rough per-object overhead of a Turn/Session beyond its strings
+_TURN_OVERHEAD = 120
+_SESSION_OVERHEAD = 400
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Cheap token estimate without a tokenizer.
+
+    Roman script averages ~4 characters per token; Indic scripts
+    tokenize far worse, so non-ASCII characters count double.
+    """
+    if not text:
+        return 0
+    ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+    return (ascii_chars + 3) // 4 + (len(text) - ascii_chars + 1) // 2
+
+
+def clip_to_tokens(text: str, tokens: int) -> str:
+    """Cuts text to roughly `tokens` estimated tokens, at a word boundary."""
+    if estimate_tokens(text) <= tokens:
+        return text
+    words, kept, used = text.split(), [], 0
+    for word in words:
+        cost = estimate_tokens(word + " ")
+        if used + cost > tokens:
+            break
+        kept.append(word)
+        used += cost
+    return " ".join(kept) + " ..."
+
+
+class Turn:
+    """One user message and the assistant's answer."""
+
+    __slots__ = ("seq", "user", "assistant", "tokens", "size")
+
+    def __init__(self, seq: int, user: str, assistant: str):
+        self.seq = seq
+        self.user = user[:MAX_STORED_CHARS]
+        self.assistant = assistant[:MAX_STORED_CHARS]
+        self.tokens = estimate_tokens(self.user) + estimate_tokens(self.assistant) + 4
+        self.size = sys.getsizeof(self.user) + sys.getsizeof(self.assistant) + _TURN_OVERHEAD
+
+
+class Session:
+    """A conversation: rolling summary plus recent verbatim turns."""
+
+    __slots__ = ("id", "summary", "turns", "tokens", "size", "next_seq", "folding", "spilled", "updated")
+
+    def __init__(self, session_id: str):
+        self.id = session_id
+        self.summary = ""
+        self.turns: deque = deque()
+        # Estimated tokens and bytes of the verbatim turns
+        self.tokens = 0
+        self.size = _SESSION_OVERHEAD
+        self.next_seq = 0
+        # True while a summary of older turns is being generated
+        self.folding = False
+        # Turns dropped by the turn cap while folding, for apply_summary()
+        self.spilled = []
+        self.updated = time.monotonic()
+
+    @property
+    def is_empty(self) -> bool:
+        return not self.turns and not self.summary
+
+    def context(self, budget: int = CHAT_HISTORY_TOKENS) -> tuple:
+        """
+        History to put in a prompt.
+
+        Returns:
+            (summary, turns) where turns are the newest ones that fit
+            within `budget` estimated tokens, oldest first
+        """
+        picked, used = [], 0
+        for turn in reversed(self.turns):
+            if used + turn.tokens > budget and picked:
+                break
+            picked.append(turn)
+            used += turn.tokens
+        picked.reverse()
+        return self.summary, picked
+
+
+_FALLBACK_PREFIX = "Earlier the user asked: "
+
+
+def fallback_summary(summary: str, turns: list, limit: int = CHAT_SUMMARY_TOKENS) -> str:
+    """
+    Summary without a model call: the previous summary plus the topics
+    of the folded questions, dropping the oldest topics to fit `limit`.
+    """
+    topics = [clip_to_tokens(turn.user, 20) for turn in turns]
+    head, found, tail = summary.rpartition(_FALLBACK_PREFIX)
+    if found:
+        # Extend an earlier fallback summary instead of nesting it
+        topics = tail.rstrip(".").split("; ") + topics
+        summary = head.strip()
+    # A failed fold may re-add topics the turn cap already recorded
+    topics = list(dict.fromkeys(topics))
+    merged = summary
+    while topics:
+        merged = f"{summary} {_FALLBACK_PREFIX}{'; '.join(topics)}.".strip()
+        if estimate_tokens(merged) <= limit:
+            break
+        topics.pop(0)
+    return clip_to_tokens(merged, limit)
+
+
+class SessionStore:
+    """
+    LRU map of sessions with a turn cap, idle TTL and memory budget.
+
+    Args:
+        max_turns: Verbatim turns kept per session
+        history_tokens: Verbatim history budget before folding starts
+        max_bytes: Estimated memory budget for all sessions
+        ttl: Idle seconds before a session expires
+    """
+
+    def __init__(self, max_turns: int = CHAT_SESSION_MAX_TURNS, history_tokens: int = CHAT_HISTORY_TOKENS,
+                 max_bytes: int = int(CHAT_SESSIONS_MAX_MB * 1024 * 1024), ttl: float = CHAT_SESSION_TTL):
+        self.max_turns = max_turns
+        self.history_tokens = history_tokens
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._sessions: OrderedDict = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {"created": 0, "resumed": 0, "evicted": 0, "expired": 0, "folds": 0}
+
+    def _drop(self, session_id: str) -> None:
+        session = self._sessions.pop(session_id)
+        self._bytes -= session.size
+
+    def _evict(self, now: float) -> None:
+        # Least recently used first, so expired sessions sit at the front
+        while self._sessions:
+            oldest_id, oldest = next(iter(self._sessions.items()))
+            if now - oldest.updated > self.ttl:
+                self.stats["expired"] += 1
+            elif self._bytes > self.max_bytes and len(self._sessions) > 1:
+                self.stats["evicted"] += 1
+            else:
+                break
+            self._drop(oldest_id)
+
+    def resolve(self, session_id: Optional[str]) -> Session:
+        """
+        Returns the live session for session_id, or a new one.
+
+        WHY: Unknown or expired ids get a fresh server-generated id rather
+        than being adopted, so clients cannot pick each other's sessions.
+        """
+        now = time.monotonic()
+        with self._lock:
+            session = self._sessions.get(session_id) if session_id else None
+            if session is not None and now - session.updated > self.ttl:
+                self._drop(session_id)
+                self.stats["expired"] += 1
+                session = None
+            if session is not None:
+                self._sessions.move_to_end(session_id)
+                session.updated = now
+                self.stats["resumed"] += 1
+                return session
+            session = Session(secrets.token_urlsafe(16))
+            self._sessions[session.id] = session
+            self._bytes += session.size
+            self.stats["created"] += 1
+            self._evict(now)
+            return session
+
+    def record(self, session: Session, user: str, assistant: str) -> None:
+        """Appends a completed turn, enforcing the turn cap and memory budget."""
+        with self._lock:
+            turn = Turn(session.next_seq, user, assistant)
+            session.next_seq += 1
+            session.turns.append(turn)
+            session.tokens += turn.tokens
+            self._resize(session, turn.size)
+            if len(session.turns) > self.max_turns:
+                # Folding has fallen behind (or keeps failing); drop the
+                # overflow into the summary without waiting for the model
+                overflow = []
+                while len(session.turns) > self.max_turns:
+                    overflow.append(self._pop_oldest(session))
+                self._set_summary(session, fallback_summary(session.summary, overflow))
+                if session.folding:
+                    session.spilled.extend(overflow)
+            session.updated = now = time.monotonic()
+            if session.id in self._sessions:
+                self._sessions.move_to_end(session.id)
+            self._evict(now)
+
+    def take_fold(self, session: Session) -> Optional[list]:
+        """
+        Claims the oldest turns for summarization once the verbatim
+        history is over budget.
+
+        Folds down to half the budget, so a summary is not regenerated
+        on every turn.
+
+        Returns:
+            Turns to summarize, or None if no fold is needed or one is
+            already running. The caller must call apply_summary() or
+            cancel_fold() afterwards.
+        """
+        with self._lock:
+            if session.folding or session.tokens <= self.history_tokens:
+                return None
+            target = self.history_tokens // 2
+            turns, remaining = [], session.tokens
+            for turn in list(session.turns)[:-1]:
+                if remaining <= target:
+                    break
+                turns.append(turn)
+                remaining -= turn.tokens
+            if not turns:
+                return None
+            session.folding = True
+            return turns
+
+    def apply_summary(self, session: Session, folded: list, summary: str) -> None:
+        """
+        Replaces the folded turns (if still present) with the new summary.
+
+        Turns newer than the fold that the turn cap dropped meanwhile are
+        only in the fallback summary record() wrote, so their topics are
+        carried over into the new one.
+        """
+        with self._lock:
+            last_seq = folded[-1].seq
+            while session.turns and session.turns[0].seq <= last_seq:
+                self._pop_oldest(session)
+            summary = clip_to_tokens(summary.strip(), CHAT_SUMMARY_TOKENS)
+            missed = [turn for turn in session.spilled if turn.seq > last_seq]
+            if missed:
+                summary = fallback_summary(summary, missed)
+            self._set_summary(session, summary)
+            session.folding = False
+            session.spilled = []
+            self.stats["folds"] += 1
+
+    def cancel_fold(self, session: Session) -> None:
+        with self._lock:
+            session.folding = False
+            session.spilled = []
+
+    def _pop_oldest(self, session: Session) -> Turn:
+        turn = session.turns.popleft()
+        session.tokens -= turn.tokens
+        self._resize(session, -turn.size)
+        return turn
+
+    def _set_summary(self, session: Session, summary: str) -> None:
+        self._resize(session, sys.getsizeof(summary) - sys.getsizeof(session.summary))
+        session.summary = summary
+
+    def _resize(self, session: Session, delta: int) -> None:
+        session.size += delta
+        # Only sessions still in the map count against the budget
+        if self._sessions.get(session.id) is session:
+            self._bytes += delta
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def snapshot(self) -> dict:
+        return {
+            "sessions": len(self._sessions),
+            "memory_bytes": self._bytes,
+            "max_memory_mb": round(self.max_bytes / (1024 * 1024), 1),
+            "max_turns": self.max_turns,
+            "history_tokens": self.history_tokens,
+            **self.stats,
+        }
+
+
+# Shared store used by the chat endpoint
+chat_sessions = SessionStore()
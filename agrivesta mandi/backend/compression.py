@@ -0,0 +1,89 @@
+"""
+Response compression helpers for Multilingual Mandi.
+
+- negotiate() picks the best encoding a client accepts (Accept-Encoding,
+  with q-values), preferring brotli over gzip.
+- compress() encodes a body with deterministic output (gzip mtime 0),
+  so build artifacts and ETags stay stable between runs.
+
+Brotli needs the optional `brotli` package; without it only gzip is
+offered.
+
+WHY: Many vendors are on 2G/3G. The full price list and the frontend
+bundle shrink 5-10x compressed, which is most of the page load time.
+"""
+import gzip
+import os
+from typing import Optional
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Responses smaller than this are sent uncompressed (headers would eat the gain)
+COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", "1024"))
+# Level for bodies compressed per request; build-time assets use the maximum
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "5"))
+
+# Preference order when a client accepts several encodings equally
+_PREFERENCE = ("br", "gzip")
+
+
+def available_encodings() -> tuple:
+    """Encodings this process can produce, best first."""
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def negotiate(accept_encoding: Optional[str], offered: tuple) -> Optional[str]:
+    """
+    Picks the encoding to use for a response.
+
+    Args:
+        accept_encoding: The request's Accept-Encoding header
+        offered: Encodings available for this response
+
+    Returns:
+        "br", "gzip" or None for identity
+    """
+    if not accept_encoding:
+        return None
+    weights = {}
+    for part in accept_encoding.lower().split(","):
+        coding, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[coding.strip()] = q
+    wildcard = weights.get("*", 0.0)
+    best, best_q = None, 0.0
+    for coding in _PREFERENCE:
+        if coding not in offered:
+            continue
+        q = weights.get(coding, wildcard)
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def compress(data: bytes, encoding: str, best: bool = False) -> bytes:
+    """
+    Compresses a body.
+
+    Args:
+        data: Raw bytes
+        encoding: "br" or "gzip"
+        best: Use maximum compression (for build-time assets)
+    """
+    if encoding == "br":
+        if brotli is None:
+            raise ValueError("brotli is not installed")
+        return brotli.compress(data, quality=11 if best else BROTLI_QUALITY)
+    if encoding == "gzip":
+        return gzip.compress(data, compresslevel=9 if best else GZIP_LEVEL, mtime=0)
+    raise ValueError(f"Unsupported encoding: {encoding}")
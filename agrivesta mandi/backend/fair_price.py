@@ -0,0 +1,330 @@
+"""
+Local Fair-Price Engine for Multilingual Mandi.
+
+Computes a fair-price band per item from the mandi quotes in
+prices.json and turns a vendor's asking price into a deterministic
+verdict (below market / fair / slightly high / overpriced).
+
+WHY: The verdict used to come from a multi-second Gemini call that
+guessed prices from memory, even though we hold real figures. Bands are
+built once per price snapshot, so a verdict is a couple of dict lookups.
+Only the friendly phrasing still needs the model.
+"""
+import asyncio
+import os
+import re
+from statistics import median
+from typing import Optional
+
+from price_store import price_store
+
+# Unit conversions to one canonical unit per family
+# WHY: "40/kg" and "4000/quintal" must compare as the same price
+UNIT_FAMILIES = {
+    "kg": ("weight", 1.0),
+    "kgs": ("weight", 1.0),
+    "kilo": ("weight", 1.0),
+    "kilogram": ("weight", 1.0),
+    "g": ("weight", 0.001),
+    "gm": ("weight", 0.001),
+    "gms": ("weight", 0.001),
+    "gram": ("weight", 0.001),
+    "grams": ("weight", 0.001),
+    "quintal": ("weight", 100.0),
+    "qtl": ("weight", 100.0),
+    "tonne": ("weight", 1000.0),
+    "ton": ("weight", 1000.0),
+    "dozen": ("count", 1.0),
+    "doz": ("count", 1.0),
+    "piece": ("count", 1 / 12),
+    "pieces": ("count", 1 / 12),
+    "pc": ("count", 1 / 12),
+    "pcs": ("count", 1 / 12),
+    "bunch": ("bunch", 1.0),
+    "bundle": ("bunch", 1.0),
+    "gaddi": ("bunch", 1.0),
+}
+CANONICAL_UNITS = {"weight": "kg", "count": "dozen", "bunch": "bunch"}
+
+# Common Hindi/Hinglish names buyers type for the items we track
+ITEM_ALIASES = {
+    "tamatar": "tomato",
+    "aloo": "potato",
+    "alu": "potato",
+    "pyaz": "onion",
+    "pyaaz": "onion",
+    "kanda": "onion",
+    "gajar": "carrot",
+    "gobi": "cauliflower",
+    "phool gobi": "cauliflower",
+    "patta gobi": "cabbage",
+    "bandh gobi": "cabbage",
+    "palak": "spinach",
+    "baingan": "brinjal",
+    "shimla mirch": "capsicum",
+    "kheera": "cucumber",
+    "lehsun": "garlic",
+    "adrak": "ginger",
+    "hari mirch": "green chilli",
+    "kela": "banana",
+    "seb": "apple",
+}
+
+# Half-width of the band around the median when mandis agree closely
+BAND_TOLERANCE = float(os.getenv("FAIR_PRICE_TOLERANCE", "0.10"))
+# How far above the band still counts as "slightly high"
+OVERPRICE_MARGIN = float(os.getenv("FAIR_PRICE_OVERPRICE_MARGIN", "0.15"))
+
+_NUMBER_RE = re.compile(r"([0-9][0-9,]*(?:\.[0-9]+)?)")
+_UNIT_RE = re.compile(r"(?:/|per|a|ka|ek)?\s*([0-9]+(?:\.[0-9]+)?)?\s*([a-z]+)", re.I)
+
+
+def normalize_item(item: str) -> str:
+    """Lowercases an item name and maps local aliases to our item names."""
+    name = " ".join(item.strip().lower().split())
+    return ITEM_ALIASES.get(name, name)
+
+
+def parse_unit_price(text) -> tuple:
+    """
+    Parses a free-form price into a canonical (value, family, unit).
+
+    Handles "40/kg", "₹4000 per quintal", "50 rs", "20 per 250g",
+    "60/dozen" and bare numbers (family None).
+
+    Returns:
+        (value_per_canonical_unit, family, canonical_unit), or
+        (None, None, None) if no number is found
+    """
+    if isinstance(text, (int, float)) and not isinstance(text, bool):
+        return float(text), None, None
+    if not isinstance(text, str):
+        return None, None, None
+    match = _NUMBER_RE.search(text)
+    if not match:
+        return None, None, None
+    value = float(match.group(1).replace(",", ""))
+
+    for qty, unit in _UNIT_RE.findall(text[match.end():].lower()):
+        family = UNIT_FAMILIES.get(unit)
+        if family is None:
+            continue
+        name, factor = family
+        amount = float(qty) if qty else 1.0
+        if amount <= 0:
+            break
+        return value / (factor * amount), name, CANONICAL_UNITS[name]
+    return value, None, None
+
+
+def _percentile(sorted_values: list, q: float) -> float:
+    """Linear-interpolated percentile of an already sorted list."""
+    if len(sorted_values) == 1:
+        return sorted_values[0]
+    pos = (len(sorted_values) - 1) * q
+    lo = int(pos)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (pos - lo)
+
+
+def _band(values: list, unit: str, mandis: list, source: str) -> dict:
+    values = sorted(values)
+    mid = median(values)
+    return {
+        "low": round(min(_percentile(values, 0.25), mid * (1 - BAND_TOLERANCE)), 2),
+        "high": round(max(_percentile(values, 0.75), mid * (1 + BAND_TOLERANCE)), 2),
+        "median": round(mid, 2),
+        "unit": unit,
+        "mandis": mandis,
+        "source": source,
+    }
+
+
+def build_bands(records: list) -> dict:
+    """
+    Builds fair-price bands per item from price records.
+
+    When an item is quoted in several unit families, the most common one
+    wins and the others are ignored.
+
+    Returns:
+        Dict mapping normalized item name to a band dict
+    """
+    quotes = {}
+    for record in records:
+        if not isinstance(record, dict):
+            continue
+        value, family, unit = parse_unit_price(record.get("price"))
+        if value is None or family is None:
+            continue
+        item = normalize_item(str(record.get("item", "")))
+        quotes.setdefault(item, {}).setdefault(family, []).append(
+            (value, unit, record.get("location", ""))
+        )
+
+    bands = {}
+    for item, families in quotes.items():
+        rows = max(families.values(), key=len)
+        bands[item] = _band(
+            [r[0] for r in rows], rows[0][1], [r[2] for r in rows], "mandi"
+        )
+    return bands
+
+
+class FairPriceEngine:
+    """
+    Deterministic verdicts against bands cached per price snapshot.
+
+    band() and assess() read the snapshot synchronously (scripts, worker
+    threads); async handlers use aband() and aassess(), which never load
+    prices.json on the event loop.
+    """
+
+    def __init__(self, store=price_store):
+        self.store = store
+        self._etag = None
+        self._bands = {}
+
+    def _bands_for(self, snapshot) -> dict:
+        if snapshot.etag != self._etag:
+            # Swap both together; concurrent rebuilds produce identical tables
+            self._bands, self._etag = build_bands(snapshot.records), snapshot.etag
+        return self._bands
+
+    def bands(self) -> dict:
+        """Returns the band table, rebuilding it when the snapshot changes."""
+        return self._bands_for(self.store.get())
+
+    async def abands(self) -> dict:
+        """bands() for async handlers; a reload and rebuild run in a worker thread."""
+        snapshot = await self.store.aget()
+        if snapshot.etag == self._etag:
+            return self._bands
+        return await asyncio.to_thread(self._bands_for, snapshot)
+
+    def band(self, item: str, table: Optional[dict] = None) -> Optional[dict]:
+        """
+        Returns the fair-price band for an item, or None if unknown.
+
+        Args:
+            table: Band table from abands(); read from the store if omitted
+        """
+        try:
+            if table is None:
+                table = self.bands()
+            return table.get(normalize_item(item))
+        except (OSError, ValueError) as e:
+            print(f"Fair price band error: {e}")
+            return None
+
+    async def aband(self, item: str) -> Optional[dict]:
+        """Async band(). See abands()."""
+        try:
+            table = await self.abands()
+        except (OSError, ValueError) as e:
+            print(f"Fair price band error: {e}")
+            return None
+        return self.band(item, table)
+
+    def assess(self, item: str, vendor_price: str, market_price: str = "standard",
+               table: Optional[dict] = None) -> Optional[dict]:
+        """
+        Judges a vendor's asking price.
+
+        Args:
+            item: The produce being negotiated
+            vendor_price: Asking price, e.g. "50/kg" or "₹50"
+            market_price: A client-supplied reference ("45/kg") or "standard"
+                to use the mandi band
+            table: Band table from abands(); read from the store if omitted
+
+        Returns:
+            Verdict dict, or None if there is no usable reference or the
+            asking price cannot be compared with it
+        """
+        band = None
+        if market_price and market_price != "standard":
+            ref_value, ref_family, ref_unit = parse_unit_price(market_price)
+            if ref_value is not None:
+                if ref_family is None:
+                    # Bare number: assume the unit the mandis quote this item in
+                    known = self.band(item, table)
+                    ref_unit = known["unit"] if known else CANONICAL_UNITS["weight"]
+                band = _band([ref_value], ref_unit, [], "client")
+        if band is None:
+            band = self.band(item, table)
+        if band is None:
+            return None
+
+        value, family, unit = parse_unit_price(vendor_price)
+        if value is None:
+            return None
+        if family is None:
+            unit = band["unit"]
+        elif unit != band["unit"]:
+            return None
+
+        high = band["high"]
+        if value < band["low"]:
+            verdict = "below market"
+        elif value <= high:
+            verdict = "fair"
+        elif value <= high * (1 + OVERPRICE_MARGIN):
+            verdict = "slightly high"
+        else:
+            verdict = "overpriced"
+
+        offer = value if verdict in ("below market", "fair") else band["median"]
+        return {
+            "verdict": verdict,
+            "vendor_price": round(value, 2),
+            "unit": unit,
+            "fair_band": band,
+            "deviation_pct": round((value - band["median"]) / band["median"] * 100, 1)
+            if band["median"] else None,
+            "suggested_offer": round(offer),
+        }
+
+    async def aassess(self, item: str, vendor_price: str,
+                      market_price: str = "standard") -> Optional[dict]:
+        """Async assess(). See abands()."""
+        try:
+            table = await self.abands()
+        except (OSError, ValueError) as e:
+            print(f"Fair price band error: {e}")
+            table = {}
+        return self.assess(item, vendor_price, market_price, table)
+
+
+def describe_verdict(item: str, assessment: dict) -> str:
+    """
+    One-line plain-English summary of an assessment.
+
+    WHY: Used for structured-only responses and as prompt context, so the
+    model phrases our verdict instead of inventing its own.
+    """
+    band = assessment["fair_band"]
+    unit = assessment["unit"]
+    where = f" across {len(band['mandis'])} mandi(s)" if band["mandis"] else ""
+    text = (
+        f"{item} at ₹{assessment['vendor_price']:g}/{unit} is {assessment['verdict']}: "
+        f"fair range is ₹{band['low']:g}-{band['high']:g}/{unit}{where} "
+        f"(median ₹{band['median']:g}/{unit})."
+    )
+    if assessment["verdict"] in ("slightly high", "overpriced"):
+        text += f" Offer around ₹{assessment['suggested_offer']}/{unit}."
+    return text
+
+
+def describe_band(item: str, band: dict) -> str:
+    """One-line plain-English summary of a fair-price band."""
+    unit = band["unit"]
+    where = f" across {len(band['mandis'])} mandi(s)" if band["mandis"] else ""
+    return (
+        f"{item}: fair price ₹{band['low']:g}-{band['high']:g}/{unit}{where}, "
+        f"median ₹{band['median']:g}/{unit}."
+    )
+
+
+# Shared engine used by the API
+fair_price_engine = FairPriceEngine()
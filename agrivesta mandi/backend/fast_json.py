@@ -0,0 +1,36 @@
+"""
+Fast JSON encoding for Multilingual Mandi.
+
+Uses orjson when it is installed and falls back to the standard library
+with the same compact, UTF-8 output otherwise.
+
+WHY: Serializing the full price list and large query pages with json
+was the biggest CPU cost of /api/prices after caching; orjson is
+several times faster.
+"""
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dumps(obj) -> bytes:
+    """
+    Serializes obj to compact UTF-8 JSON bytes.
+
+    NaN and Infinity become null with orjson (json would reject them);
+    the API never produces them on purpose.
+
+    Raises:
+        TypeError: For objects that are not JSON serializable
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj)
+        except TypeError:
+            # e.g. integers beyond 64 bits or non-string keys; json copes
+            pass
+    return json.dumps(obj, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
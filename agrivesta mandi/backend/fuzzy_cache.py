@@ -0,0 +1,294 @@
+"""
+Near-duplicate answer cache for the Multilingual Mandi chat assistant.
+
+Questions are folded to a canonical form (case, punctuation, common
+romanized-Hindi spelling variants, item aliases, filler words) and
+turned into a set of character trigrams. A cached answer is reused when
+a new question's trigram set is similar enough (Jaccard) to a stored
+one asked for the same response language.
+
+    "aaj tamatar ka rate kya hai"  ->  aaj tomato rate
+    "Tamaatar ka aaj bhaav?"       ->  tomato aaj rate
+
+Some words decide the answer however similar the rest of the question
+is, so they must match exactly: numbers, negations, commodities and
+intents (buy/sell/store, cheap/costly). "should I buy onions" and
+"should I sell onions" are never the same question.
+
+WHY: Chat traffic at the mandi is mostly the same handful of questions
+typed slightly differently. An exact-match cache misses almost all of
+them; a fuzzy one answers them in microseconds.
+"""
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Optional
+
+from cache import normalize_text
+from fair_price import ITEM_ALIASES
+
+# Minimum Jaccard similarity between trigram sets to reuse an answer
+CHAT_CACHE_THRESHOLD = float(os.getenv("CHAT_CACHE_THRESHOLD", "0.8"))
+CHAT_CACHE_SIZE = int(os.getenv("CHAT_CACHE_SIZE", "2000"))
+CHAT_CACHE_TTL = float(os.getenv("CHAT_CACHE_TTL", str(6 * 3600)))
+# Answers that depend on today's prices go stale quickly
+CHAT_CACHE_PRICE_TTL = float(os.getenv("CHAT_CACHE_PRICE_TTL", "300"))
+
+# Spelling variants folded to one form before trigrams are taken
+WORD_VARIANTS = {
+    "kia": "kya", "kyaa": "kya", "kiya": "kya",
+    "he": "hai", "h": "hai", "hain": "hai", "hy": "hai",
+    "aj": "aaj", "today": "aaj", "abhi": "aaj", "now": "aaj",
+    "bhav": "rate", "bhaav": "rate", "bhao": "rate", "daam": "rate", "dam": "rate",
+    "kimat": "rate", "keemat": "rate", "qeemat": "rate", "price": "rate",
+    "prices": "rate", "rates": "rate", "cost": "rate",
+    "mein": "me", "mai": "me", "main": "me",
+    "kitna": "kitne", "kitni": "kitne",
+    "kaise": "how", "kese": "how",
+    "sasta": "cheap", "saste": "cheap", "sasti": "cheap",
+    "mehnga": "costly", "mehenga": "costly", "mahanga": "costly", "expensive": "costly",
+    "kharid": "buy", "kharidna": "buy", "kharidu": "buy", "kharidun": "buy", "kharide": "buy",
+    "kharidein": "buy", "kharido": "buy", "kharidne": "buy", "khareed": "buy", "khareedna": "buy",
+    "khareedu": "buy", "khareede": "buy", "khareedo": "buy", "buying": "buy", "bought": "buy",
+    "purchase": "buy", "purchasing": "buy",
+    "bech": "sell", "bechna": "sell", "bechu": "sell", "bechun": "sell", "beche": "sell",
+    "bechein": "sell", "becho": "sell", "bechne": "sell", "selling": "sell", "sold": "sell",
+    "rakh": "store", "rakhna": "store", "rakhu": "store", "rakhun": "store", "rakhe": "store",
+    "rakhein": "store", "rakho": "store", "rakhne": "store", "storing": "store", "stored": "store",
+    "storage": "store", "stores": "store",
+    "chawal": "rice", "gehun": "wheat", "gehu": "wheat", "nimbu": "lemon", "matar": "peas",
+    "bhindi": "okra", "mooli": "radish", "kaddu": "pumpkin",
+}
+# Words that carry no meaning for matching
+FILLER_WORDS = frozenset({
+    "kya", "hai", "ka", "ki", "ke", "ko", "me", "se", "to", "ji", "bhai",
+    "bhaiya", "yaar", "please", "plz", "pls", "the", "a", "an", "is", "are",
+    "what", "whats", "of", "in", "for", "do", "i", "tell", "batao", "bataiye",
+    "का", "की", "के", "को", "है", "हैं", "क्या", "में", "से", "भाई", "जी",
+})
+# Negations; like numbers they must match exactly, since "should I not
+# sell" and "should I sell" differ by one word but want opposite answers
+NEGATION_WORDS = frozenset({
+    "not", "no", "never", "dont", "don", "doesnt", "doesn", "didnt", "didn",
+    "isnt", "isn", "shouldnt", "shouldn", "wont", "cant", "cannot",
+    "na", "naa", "nahi", "nahin", "nahee", "nai", "nhi", "nhin", "mat",
+    "नहीं", "नही", "मत", "ना", "न",
+})
+# What the question is about; a different commodity is a different question
+COMMODITY_WORDS = frozenset(
+    {word for item in ITEM_ALIASES.values() for word in item.split()}
+    | {"rice", "wheat", "dal", "lemon", "peas", "okra", "radish", "pumpkin"}
+)
+# What the asker wants to do; buying and selling advice are opposites
+INTENT_WORDS = frozenset({"buy", "sell", "store", "cheap", "costly"})
+# Words marking a question whose answer depends on current prices
+TIME_SENSITIVE_WORDS = frozenset({
+    "aaj", "rate", "kal", "tomorrow", "yesterday", "market", "mandi",
+    "costly", "cheap", "kitne", "trend",
+    "आज", "भाव", "दाम", "कीमत", "रेट",
+})
+
+_ASPIRATE_RE = re.compile(r"([bcdgjkpt])h")
+_VOWEL_RUN_RE = re.compile(r"([aeiou])\1+")
+
+
+def _fold_spelling(word: str) -> str:
+    """Collapses romanized spelling variation: ee/oo, doubled vowels, aspirates, w/v, z/j."""
+    folded = word.replace("ee", "i").replace("oo", "u")
+    folded = _VOWEL_RUN_RE.sub(r"\1", folded)
+    return _ASPIRATE_RE.sub(r"\1", folded).replace("w", "v").replace("z", "j")
+
+
+# Item aliases keyed by their folded spelling, so "tamaatar" finds "tamatar"
+_FOLDED_ALIASES = {_fold_spelling(alias): item for alias, item in ITEM_ALIASES.items()}
+
+# Canonical words are kept as they are: folding "how" (kaise) to "hov"
+# would only blur them with unrelated words
+_CANONICAL_WORDS = (
+    frozenset(WORD_VARIANTS.values()) | COMMODITY_WORDS | INTENT_WORDS
+    | TIME_SENSITIVE_WORDS | NEGATION_WORDS
+)
+
+
+def _fold_word(word: str) -> str:
+    """
+    Folds one word: item aliases and English plurals of commodities to
+    the commodity, other romanized words lose spelling variation.
+    """
+    word = ITEM_ALIASES.get(word, word)
+    if word in _CANONICAL_WORDS or not word.isascii():
+        return word
+    # Only commodity plurals are stripped; "bees" (twenty) is not "bee"
+    for singular in (word[:-2], word[:-1]) if word.endswith("s") else ():
+        if singular in COMMODITY_WORDS:
+            return singular
+    folded = _fold_spelling(word)
+    return _FOLDED_ALIASES.get(folded, folded)
+
+
+def fold_question(text: str) -> list:
+    """
+    Canonical words of a question, in order, with filler removed.
+
+    Returns:
+        List of folded words (may be empty for pure filler)
+    """
+    # Keep letters, combining marks (Indic vowel signs) and digits
+    cleaned = "".join(
+        ch if unicodedata.category(ch)[0] in "LMN" else " "
+        for ch in normalize_text(text)
+    )
+    words = []
+    for raw in cleaned.split():
+        word = WORD_VARIANTS.get(raw, raw)
+        if word in FILLER_WORDS:
+            continue
+        words.append(_fold_word(word))
+    return words
+
+
+def trigrams(words: list) -> frozenset:
+    """Character trigrams of each padded word, ignoring word order."""
+    grams = set()
+    for word in words:
+        padded = f" {word} "
+        grams.update(padded[i : i + 3] for i in range(len(padded) - 2))
+    return frozenset(grams)
+
+
+def is_time_sensitive(words: list) -> bool:
+    """True if the answer likely depends on today's prices."""
+    return any(w in TIME_SENSITIVE_WORDS or w.isdigit() for w in words)
+
+
+class FuzzyAnswerCache:
+    """
+    LRU cache of answers looked up by question similarity.
+
+    Each language has an inverted index from trigram to entry ids, so a
+    lookup only scores entries sharing at least one trigram instead of
+    scanning the whole cache. Numbers, negations, commodities and intents
+    must match exactly: "2 kg" and "20 kg", "should I sell" and "should
+    I not sell", or "store tomatoes" and "store potatoes" are never the
+    same question.
+
+    Args:
+        threshold: Minimum Jaccard similarity to return a stored answer
+        max_entries: Entries kept across all languages before LRU eviction
+        ttl: Lifetime of ordinary answers in seconds
+        price_ttl: Lifetime of price-dependent answers in seconds
+    """
+
+    def __init__(self, threshold: float = CHAT_CACHE_THRESHOLD, max_entries: int = CHAT_CACHE_SIZE,
+                 ttl: float = CHAT_CACHE_TTL, price_ttl: float = CHAT_CACHE_PRICE_TTL):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.price_ttl = price_ttl
+        # entry id -> (language, grams, guard, answer, expires), where guard
+        # holds the words that must match exactly (see _guard)
+        self._entries: OrderedDict = OrderedDict()
+        # language -> trigram -> set of entry ids
+        self._index = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0, "expired": 0}
+
+    @staticmethod
+    def _guard(words: list) -> frozenset:
+        """Numbers, negations, commodities and intents of a question."""
+        return frozenset(
+            w for w in words
+            if w.isdigit() or w in NEGATION_WORDS or w in COMMODITY_WORDS or w in INTENT_WORDS
+        )
+
+    def _remove(self, entry_id: int) -> None:
+        language, grams, _, _, _ = self._entries.pop(entry_id)
+        index = self._index.get(language, {})
+        for gram in grams:
+            ids = index.get(gram)
+            if ids is not None:
+                ids.discard(entry_id)
+                if not ids:
+                    del index[gram]
+
+    def get(self, question: str, language: str) -> Optional[str]:
+        """
+        Returns the answer to the most similar cached question, or None.
+        """
+        words = fold_question(question)
+        grams = trigrams(words)
+        if not grams:
+            self.stats["misses"] += 1
+            return None
+        guard = self._guard(words)
+        now = time.monotonic()
+        with self._lock:
+            index = self._index.get(language, {})
+            overlap = {}
+            for gram in grams:
+                for entry_id in index.get(gram, ()):
+                    overlap[entry_id] = overlap.get(entry_id, 0) + 1
+
+            best_id, best_score = None, self.threshold
+            expired = []
+            for entry_id, shared in overlap.items():
+                _, entry_grams, entry_guard, _, expires = self._entries[entry_id]
+                if expires < now:
+                    expired.append(entry_id)
+                    continue
+                if entry_guard != guard:
+                    continue
+                score = shared / (len(grams) + len(entry_grams) - shared)
+                if score >= best_score:
+                    best_id, best_score = entry_id, score
+            for entry_id in expired:
+                self._remove(entry_id)
+            self.stats["expired"] += len(expired)
+
+            if best_id is None:
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(best_id)
+            self.stats["hits"] += 1
+            return self._entries[best_id][3]
+
+    def set(self, question: str, language: str, answer: str) -> None:
+        """Stores an answer; price-dependent questions get the short TTL."""
+        words = fold_question(question)
+        grams = trigrams(words)
+        if not grams or not answer:
+            return
+        ttl = self.price_ttl if is_time_sensitive(words) else self.ttl
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = (language, grams, self._guard(words), answer, time.monotonic() + ttl)
+            index = self._index.setdefault(language, {})
+            for gram in grams:
+                index.setdefault(gram, set()).add(entry_id)
+            self.stats["writes"] += 1
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.stats["evictions"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._index.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def snapshot(self) -> dict:
+        """Counters plus hit ratio, for the health endpoint."""
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "entries": len(self._entries),
+            "threshold": self.threshold,
+            "hit_ratio": round(self.stats["hits"] / lookups, 4) if lookups else 0.0,
+        }
@@ -0,0 +1,435 @@
+"""
+Bulk Price Ingest for Multilingual Mandi.
+
+Price updates arrive in batches (NDJSON or CSV) and are appended to an
+append-only log. A background task periodically compacts the log into
+a new prices.json snapshot (and persists the price history), which the
+PriceStore then picks up on its next mtime check.
+
+Durability uses group commit: every batch is written immediately, and
+whichever batch grabs the fsync lock first makes all writes so far
+durable, so concurrent batches share one fsync.
+
+All uvicorn workers append to the same log. On POSIX, appends take a
+shared flock on <log>.lock and rotation an exclusive one, and whole
+compactions are serialized by <log>.compact.lock; a worker whose handle
+points at a rotated-away file reopens the log before its next append.
+
+Each worker also records its batches into its own in-memory price
+history. The saved history is the shared copy: a compaction reloads it,
+applies the rotated log (every worker's entries) and saves it, and every
+worker then replaces its copy with the saved one plus the live log, so
+no worker overwrites another's points and all of them serve the same
+history.
+Where flock is unavailable (Windows) the locks are no-ops, and the log
+assumes a single writer process (run one worker).
+
+WHY: Thousands of updates land every morning. Rewriting the whole JSON
+file per update does not scale, and readers of /api/prices must never
+wait on a writer - they keep serving the previous snapshot until the
+new file is atomically swapped in.
+"""
+import csv
+import io
+import json
+import os
+import threading
+from contextlib import contextmanager
+from datetime import date
+from pathlib import Path
+from typing import Optional
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from price_store import price_store, parse_price
+from price_history import price_history
+
+DEFAULT_LOG_PATH = Path(
+    os.getenv("INGEST_LOG_PATH", str(Path(__file__).parent / "data" / "ingest.log"))
+)
+
+# Seconds between background compactions
+COMPACT_INTERVAL = float(os.getenv("INGEST_COMPACT_INTERVAL", "60"))
+
+# Hard cap per request to keep a single batch from exhausting memory
+MAX_BATCH_ROWS = int(os.getenv("INGEST_MAX_BATCH_ROWS", "50000"))
+
+VALID_TRENDS = ("up", "down", "stable")
+
+# Optional shared secret; when set, ingest requires "Authorization: Bearer <token>"
+INGEST_TOKEN = os.getenv("INGEST_TOKEN", "")
+
+
+class IngestError(ValueError):
+    """Raised when a batch cannot be parsed at all."""
+
+
+def _fsync_dir(path: Path) -> None:
+    """Makes a rename inside `path` durable (no-op where unsupported)."""
+    try:
+        fd = os.open(str(path), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+@contextmanager
+def _process_lock(path: Path, exclusive: bool):
+    """
+    flock on `path`, held across processes (no-op without fcntl).
+
+    Opens its own descriptor each time, because flock requests on one
+    shared descriptor would convert each other instead of blocking.
+    """
+    if fcntl is None:
+        yield
+        return
+    fd = os.open(str(path), os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        yield
+    finally:
+        os.close(fd)
+
+
+def normalize_update(raw: dict) -> dict:
+    """
+    Validates one update and returns it in log format.
+
+    Accepted fields: item, location, price ("40/kg" or a number),
+    optional unit (used with numeric prices), trend and date (YYYY-MM-DD).
+
+    Raises:
+        ValueError: With a human-readable reason if the row is invalid
+    """
+    if not isinstance(raw, dict):
+        raise ValueError("row must be an object")
+    item = str(raw.get("item") or "").strip()
+    location = str(raw.get("location") or "").strip()
+    if not item or not location:
+        raise ValueError("item and location are required")
+
+    price = raw.get("price")
+    value, unit = parse_price(price)
+    if value is None:
+        raise ValueError(f"unparseable price: {price!r}")
+    if unit is None:
+        unit = str(raw.get("unit") or "kg").strip().lower()
+    number = str(int(value)) if value.is_integer() else f"{value:.2f}".rstrip("0")
+    price = f"{number}/{unit}"
+
+    update = {"item": item, "location": location, "price": price}
+    trend = str(raw.get("trend") or "").strip().lower()
+    if trend:
+        if trend not in VALID_TRENDS:
+            raise ValueError(f"trend must be one of {', '.join(VALID_TRENDS)}")
+        update["trend"] = trend
+    day = str(raw.get("date") or "").strip()
+    update["date"] = date.fromisoformat(day[:10]).isoformat() if day else date.today().isoformat()
+    return update
+
+
+def parse_batch(body: bytes, content_type: str) -> tuple:
+    """
+    Parses an NDJSON or CSV batch.
+
+    Args:
+        body: Raw request body (UTF-8)
+        content_type: Request Content-Type; "csv" selects CSV, else NDJSON
+
+    Returns:
+        (updates, errors) where errors is a list of {"line", "error"} dicts
+
+    Raises:
+        IngestError: If the body is not decodable or exceeds MAX_BATCH_ROWS
+    """
+    try:
+        text = body.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise IngestError("Body must be UTF-8")
+
+    if "csv" in (content_type or "").lower():
+        rows = enumerate(csv.DictReader(io.StringIO(text)), start=2)
+    else:
+        rows = (
+            (n, line) for n, line in enumerate(text.splitlines(), start=1) if line.strip()
+        )
+
+    updates, errors = [], []
+    for line_no, row in rows:
+        if len(updates) + len(errors) >= MAX_BATCH_ROWS:
+            raise IngestError(f"Batch too large. Maximum {MAX_BATCH_ROWS} rows.")
+        try:
+            if isinstance(row, str):
+                row = json.loads(row)
+            updates.append(normalize_update(row))
+        except ValueError as e:
+            errors.append({"line": line_no, "error": str(e)})
+    return updates, errors
+
+
+class PriceIngestor:
+    """
+    Append-only update log with group-commit fsync and compaction.
+    """
+
+    def __init__(self, log_path: Path = DEFAULT_LOG_PATH, store=price_store, history=price_history):
+        self.log_path = Path(log_path)
+        self.store = store
+        self.history = history
+        self._append_lock = threading.Lock()
+        self._fsync_lock = threading.Lock()
+        self._compact_lock = threading.Lock()
+        # Held while the in-memory history is rebuilt, so no batch recorded
+        # meanwhile is lost (see _sync_history)
+        self._history_lock = threading.Lock()
+        self._history_seen = None
+        self._file = None
+        self._written_seq = 0
+        self._synced_seq = 0
+        self.stats = {"accepted": 0, "fsyncs": 0, "compactions": 0}
+
+    def _sibling(self, suffix: str) -> Path:
+        return self.log_path.with_suffix(self.log_path.suffix + suffix)
+
+    def _open(self):
+        """The live log, reopened if another worker rotated it away."""
+        if self._file is not None:
+            try:
+                current = os.stat(self.log_path).st_ino
+            except FileNotFoundError:
+                current = None
+            if current != os.fstat(self._file.fileno()).st_ino:
+                os.fsync(self._file.fileno())
+                self._file.close()
+                self._file = None
+        if self._file is None:
+            self.log_path.parent.mkdir(parents=True, exist_ok=True)
+            self._file = open(self.log_path, "ab")
+        return self._file
+
+    def append(self, updates: list) -> int:
+        """
+        Appends a batch durably and feeds it to the price history.
+
+        Blocks until the batch is fsynced (possibly by another batch's
+        fsync); call from a worker thread.
+
+        Returns:
+            Number of updates appended
+        """
+        if not updates:
+            return 0
+        payload = b"".join(
+            json.dumps(u, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n"
+            for u in updates
+        )
+        self.log_path.parent.mkdir(parents=True, exist_ok=True)
+        with self._append_lock, _process_lock(self._sibling(".lock"), exclusive=False):
+            f = self._open()
+            f.write(payload)
+            f.flush()
+            self._written_seq += 1
+            seq = self._written_seq
+
+        # Group commit: one fsync covers every batch written before it.
+        # The fsync runs outside _append_lock so other batches can be
+        # written meanwhile and share the next one.
+        with self._fsync_lock:
+            if self._synced_seq < seq:
+                with self._append_lock:
+                    target = self._written_seq
+                    # Our own reference to the file, so a concurrent
+                    # _rotate() closing it cannot pull it from under us
+                    # (rotation fsyncs what it closes anyway)
+                    fd = os.dup(self._file.fileno()) if self._file is not None else None
+                if fd is not None:
+                    try:
+                        os.fsync(fd)
+                    finally:
+                        os.close(fd)
+                self._synced_seq = target
+                self.stats["fsyncs"] += 1
+
+        with self._history_lock:
+            self.history.record_many(
+                (u["item"], u["location"], u["date"], u["price"]) for u in updates
+            )
+        self.stats["accepted"] += len(updates)
+        return len(updates)
+
+    @staticmethod
+    def _read_log(path: Path) -> list:
+        """Parsed entries of a log file, skipping torn or invalid lines."""
+        entries = []
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        update = json.loads(line)
+                        entries.append((update["item"], update["location"], update["date"], update["price"]))
+                    except (ValueError, KeyError, TypeError):
+                        # Torn final line from a crash (or a write in progress)
+                        continue
+        except FileNotFoundError:
+            pass
+        return entries
+
+    def _sync_history(self) -> None:
+        """
+        Rebuilds this worker's history from the saved one plus the live
+        log, if another compaction has saved since the last rebuild.
+        Call with the compact locks held.
+        """
+        version = self.history.disk_version()
+        if version is None or version == self._history_seen:
+            return
+        with self._history_lock:
+            self.history.reload()
+            self.history.record_many(self._read_log(self.log_path))
+        self._history_seen = version
+
+    def _rotate(self) -> Optional[Path]:
+        """
+        Moves the live log aside so appends continue on a fresh file.
+
+        Holds the exclusive cross-process lock, so no worker is midway
+        through an append; their handles to the moved file are replaced
+        on their next append (see _open).
+        """
+        with self._append_lock, _process_lock(self._sibling(".lock"), exclusive=True):
+            if self._file is not None:
+                self._file.flush()
+                self._file.close()
+                self._file = None
+            if not self.log_path.exists() or self.log_path.stat().st_size == 0:
+                return None
+            # fsync covers the file, whichever worker's handle wrote to it
+            with open(self.log_path, "rb") as f:
+                os.fsync(f.fileno())
+            rotated = self._sibling(".compacting")
+            if rotated.exists():
+                # A previous compaction was interrupted; fold both logs together
+                with open(rotated, "ab") as dst, open(self.log_path, "rb") as src:
+                    dst.write(src.read())
+                    dst.flush()
+                    os.fsync(dst.fileno())
+                self.log_path.unlink()
+            else:
+                os.replace(self.log_path, rotated)
+            return rotated
+
+    def compact(self) -> int:
+        """
+        Folds the log into a new prices.json and persists the history.
+
+        The new file is written to a temp path, fsynced and atomically
+        renamed, so readers see either the old or the new snapshot. The
+        saved history is merged rather than overwritten: it is reloaded,
+        the rotated log applied to it, and saved again.
+
+        Returns:
+            Number of log entries compacted
+        """
+        if not self.log_path.parent.exists():
+            return 0
+        with self._compact_lock, _process_lock(self._sibling(".compact.lock"), exclusive=True):
+            rotated = self._rotate()
+            leftover = self._sibling(".compacting")
+            if rotated is None and leftover.exists():
+                rotated = leftover
+            if rotated is None:
+                # Nothing to fold here, but another worker may have saved
+                self._sync_history()
+                return 0
+
+            latest = {}
+            count = 0
+            with open(rotated, "r", encoding="utf-8") as f:
+                for line in f:
+                    count += 1
+                    try:
+                        update = json.loads(line)
+                    except ValueError:
+                        # Torn final line from a crash mid-write
+                        continue
+                    key = (update["item"].lower(), update["location"].lower())
+                    # Newest price date wins, so a late backfill for an
+                    # older day cannot overwrite today's price; on equal
+                    # dates the later line wins
+                    current = latest.get(key)
+                    if current is None or update.get("date", "") >= current.get("date", ""):
+                        latest[key] = update
+
+            self.store.invalidate()
+            snapshot = self.store.get()
+            records = []
+            for record in snapshot.source:
+                if isinstance(record, dict):
+                    key = (
+                        str(record.get("item", "")).strip().lower(),
+                        str(record.get("location", "")).strip().lower(),
+                    )
+                    update = latest.pop(key, None)
+                    if update is not None:
+                        record = {**record, "price": update["price"]}
+                        if "trend" in update:
+                            record["trend"] = update["trend"]
+                records.append(record)
+            for update in latest.values():
+                records.append({
+                    "item": update["item"],
+                    "price": update["price"],
+                    "location": update["location"],
+                    "trend": update.get("trend", "stable"),
+                })
+
+            path = self.store.resolve_path()
+            tmp = path.with_suffix(".json.tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(records, f, ensure_ascii=False, indent=4)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, path)
+            _fsync_dir(path.parent)
+
+            # Saved history + the rotated log, not this worker's copy, which
+            # lacks what other workers ingested since their last sync
+            with self._history_lock:
+                self.history.reload()
+                self.history.record_many(self._read_log(rotated))
+                self.history.save()
+            self._history_seen = None
+            self._sync_history()
+            rotated.unlink()
+            self.store.invalidate()
+            self.stats["compactions"] += 1
+            return count
+
+    def recover(self) -> int:
+        """
+        Compacts logs left by a previous process, which also replays them
+        into the saved history. Call once at startup.
+
+        Returns:
+            Number of entries recovered
+        """
+        recovered = sum(
+            len(self._read_log(path)) for path in (self._sibling(".compacting"), self.log_path)
+        )
+        if not recovered:
+            return 0
+        self.compact()
+        return recovered
+
+
+# Shared ingestor used by the API
+price_ingestor = PriceIngestor()
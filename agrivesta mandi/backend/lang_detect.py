@@ -0,0 +1,160 @@
+"""
+Offline Language Detection for Multilingual Mandi.
+
+Classifies text by Unicode script first - Tamil, Telugu, Bengali,
+Kannada, Gujarati and Punjabi each have their own script. Only the two
+ambiguous cases go to a small character n-gram model trained on the
+bundled data/lang_samples.json:
+- Devanagari: Hindi vs Marathi
+- Latin: English vs romanized Hinglish
+
+WHY: A Gemini call per detection costs seconds and fails when the
+upstream is down. Script ranges plus a tiny Naive Bayes model answer
+in microseconds and work offline.
+"""
+import json
+import math
+import threading
+from pathlib import Path
+
+SAMPLES_PATH = Path(__file__).parent / "data" / "lang_samples.json"
+
+# Unicode blocks that identify a language on their own
+# (Devanagari and Latin are resolved by the n-gram model)
+SCRIPT_RANGES = (
+    (0x0900, 0x097F, "Devanagari"),
+    (0x0980, 0x09FF, "Bengali"),
+    (0x0A00, 0x0A7F, "Punjabi"),
+    (0x0A80, 0x0AFF, "Gujarati"),
+    (0x0B80, 0x0BFF, "Tamil"),
+    (0x0C00, 0x0C7F, "Telugu"),
+    (0x0C80, 0x0CFF, "Kannada"),
+)
+AMBIGUOUS_SCRIPTS = {
+    "Devanagari": ("Hindi", "Marathi"),
+    "Latin": ("English", "Hinglish"),
+}
+
+NGRAM_ORDERS = (1, 2, 3)
+
+
+def _script_of(ch: str):
+    code = ord(ch)
+    if code < 0x0250:
+        return "Latin" if ch.isalpha() else None
+    for lo, hi, script in SCRIPT_RANGES:
+        if lo <= code <= hi:
+            return script
+    return None
+
+
+def _ngrams(text: str):
+    """Character n-grams of each word, padded with spaces."""
+    for word in text.lower().split():
+        padded = f" {word} "
+        for n in NGRAM_ORDERS:
+            for i in range(len(padded) - n + 1):
+                yield padded[i : i + n]
+
+
+class NgramModel:
+    """
+    Multinomial Naive Bayes over character 1-3 grams.
+
+    Trained lazily from the bundled samples on first use so importing
+    the module stays cheap.
+    """
+
+    def __init__(self, samples_path: Path = SAMPLES_PATH):
+        self.samples_path = samples_path
+        self._profiles = None
+        self._lock = threading.Lock()
+
+    def _train(self) -> dict:
+        with open(self.samples_path, "r", encoding="utf-8") as f:
+            samples = json.load(f)
+        profiles = {}
+        vocabulary = set()
+        for lang, sentences in samples.items():
+            counts = {}
+            for sentence in sentences:
+                for gram in _ngrams(sentence):
+                    counts[gram] = counts.get(gram, 0) + 1
+            vocabulary.update(counts)
+            profiles[lang] = counts
+        size = len(vocabulary) + 1
+        # Log-probabilities with add-one smoothing; "" holds the unseen score
+        model = {}
+        for lang, counts in profiles.items():
+            total = sum(counts.values()) + size
+            table = {gram: math.log((c + 1) / total) for gram, c in counts.items()}
+            table[""] = math.log(1 / total)
+            model[lang] = table
+        return model
+
+    def _model(self) -> dict:
+        if self._profiles is None:
+            with self._lock:
+                if self._profiles is None:
+                    self._profiles = self._train()
+        return self._profiles
+
+    def classify(self, text: str, candidates) -> tuple:
+        """
+        Picks the most likely candidate language.
+
+        Returns:
+            (language, confidence) where confidence is the posterior
+            probability of the winner among the candidates
+        """
+        model = self._model()
+        scores = {}
+        grams = list(_ngrams(text))
+        for lang in candidates:
+            table = model[lang]
+            unseen = table[""]
+            scores[lang] = sum(table.get(g, unseen) for g in grams)
+        best = max(scores, key=scores.get)
+        # Softmax over log-likelihoods, stable against large magnitudes
+        top = scores[best]
+        norm = sum(math.exp(s - top) for s in scores.values())
+        return best, 1 / norm
+
+
+_model = NgramModel()
+
+
+def detect_script(text: str) -> tuple:
+    """
+    Finds the dominant script among the letters of `text`.
+
+    Returns:
+        (script, share) with share in 0..1, or (None, 0.0) if no letters
+    """
+    counts = {}
+    for ch in text:
+        script = _script_of(ch)
+        if script:
+            counts[script] = counts.get(script, 0) + 1
+    if not counts:
+        return None, 0.0
+    script = max(counts, key=counts.get)
+    return script, counts[script] / sum(counts.values())
+
+
+def detect_language_local(text: str) -> tuple:
+    """
+    Detects the language of `text` without any network call.
+
+    Returns:
+        (language, confidence) - language is one of the supported
+        languages or "Hinglish", or None if the text has no letters
+    """
+    script, share = detect_script(text)
+    if script is None:
+        return None, 0.0
+    candidates = AMBIGUOUS_SCRIPTS.get(script)
+    if candidates is None:
+        return script, share
+    lang, posterior = _model.classify(text, candidates)
+    return lang, share * posterior
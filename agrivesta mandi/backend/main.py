@@ -10,41 +10,183 @@ A FastAPI application that serves:
 Built for Republic Day Hackathon 2026 🇮🇳
 """
 from fastapi import FastAPI, HTTPException, Request
-from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
+from contextlib import asynccontextmanager
+import asyncio
 import json
 import os
-from pathlib import Path
 
 from services import (
     translate_text, 
+    translate_batch,
     get_negotiation_advice, 
     detect_language,
     get_price_insight,
     chat_with_assistant,
-    generate_smart_phrases
+    stream_chat_with_assistant,
+    stream_negotiation_advice,
+    generate_smart_phrases,
+    generate_phrases_from_model,
+    translation_memory,
+    chat_cache,
+    prompt_flight,
+    gemini_breaker,
+    gemini_hedger,
+    get_client,
+    SUPPORTED_LANGUAGES
 )
+from price_store import price_store, etag_matches, export_chunks, PriceQueryError
+from price_history import price_history
+from lang_detect import detect_language_local
+from admission import admission, Overloaded
+from fair_price import fair_price_engine, describe_verdict, describe_band
+from phrase_bank import PHRASE_BANK_SAVE_INTERVAL, phrase_bank, default_combos, warm_up
+from metrics import registry, MetricsMiddleware
+from rate_limit import rate_limiter, RateLimitMiddleware
+from compression import available_encodings, negotiate as negotiate_encoding, COMPRESS_MIN_SIZE, GZIP_LEVEL
+from fast_json import dumps as fast_dumps
+from static_assets import PrecompressedStaticFiles, frontend_directory
+from chat_sessions import chat_sessions
+from ingest import (
+    price_ingestor,
+    parse_batch,
+    IngestError,
+    COMPACT_INTERVAL,
+    INGEST_TOKEN
+)
+
+async def _compaction_loop():
+    """Periodically folds ingested price updates into a new snapshot."""
+    while True:
+        await asyncio.sleep(COMPACT_INTERVAL)
+        try:
+            await asyncio.to_thread(price_ingestor.compact)
+        except Exception as e:
+            print(f"Price compaction error: {e}")
+
+
+# Fill missing phrase bank entries in the background at startup
+PHRASE_BANK_WARMUP = os.getenv("PHRASE_BANK_WARMUP", "0") == "1"
+
+
+async def _phrase_bank_warmup():
+    """Pre-generates phrases for every tracked item, context and language."""
+    try:
+        records = (await asyncio.to_thread(price_store.get)).records
+        items = [r.get("item", "") for r in records if isinstance(r, dict)]
+        combos = default_combos(items, [*SUPPORTED_LANGUAGES, "Hinglish"])
+        added = await warm_up(phrase_bank, generate_phrases_from_model, combos)
+        print(f"Phrase bank warm-up added {added} variants")
+    except Exception as e:
+        print(f"Phrase bank warm-up error: {e}")
+
+
+async def _phrase_bank_save_loop():
+    """
+    Periodically writes phrases generated for unseen combinations.
+
+    WHY: Saving only at shutdown loses them whenever a worker is killed
+    or recycled instead of stopped.
+    """
+    while True:
+        await asyncio.sleep(PHRASE_BANK_SAVE_INTERVAL)
+        try:
+            await asyncio.to_thread(phrase_bank.save)
+        except Exception as e:
+            print(f"Phrase bank save error: {e}")
+
+
+# Build the Gemini client in the background once the app is up, so the
+# first model request does not pay for it. Off on Vercel, where a cold
+# start serving /api/prices should not import the SDK at all.
+GEMINI_PRELOAD = os.getenv("GEMINI_PRELOAD", "0" if os.getenv("VERCEL") else "1") == "1"
+
+
+async def _preload_model_client():
+    try:
+        await asyncio.to_thread(get_client)
+    except Exception as e:
+        print(f"Gemini client preload error: {e}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Replays any ingest log left by a previous process and runs compaction
+    and phrase bank saves (and optionally the phrase bank warm-up and
+    Gemini client preload) in the background for the lifetime of the app.
+    """
+    try:
+        await asyncio.to_thread(price_ingestor.recover)
+    except Exception as e:
+        print(f"Price ingest recovery error: {e}")
+    tasks = [asyncio.create_task(_compaction_loop())]
+    if PHRASE_BANK_SAVE_INTERVAL > 0:
+        tasks.append(asyncio.create_task(_phrase_bank_save_loop()))
+    if PHRASE_BANK_WARMUP:
+        tasks.append(asyncio.create_task(_phrase_bank_warmup()))
+    if GEMINI_PRELOAD:
+        tasks.append(asyncio.create_task(_preload_model_client()))
+    try:
+        yield
+    finally:
+        for task in tasks:
+            task.cancel()
+        try:
+            await asyncio.to_thread(price_ingestor.compact)
+        except Exception as e:
+            print(f"Price compaction error: {e}")
+        # Keep phrases generated for unseen combinations
+        await asyncio.to_thread(phrase_bank.save)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson when available (see fast_json.py)."""
+
+    def render(self, content) -> bytes:
+        return fast_dumps(content)
+
 
 # Initialize FastAPI with metadata
 app = FastAPI(
     title="Multilingual Mandi API",
     description="AI-powered market assistant for Indian vendors",
-    version="2.0.0"
+    version="2.0.0",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse
 )
 
+# Gzip JSON/text bodies above COMPRESS_MIN_SIZE for slow mobile links.
+# Event streams and bodies that are already encoded pass through as-is.
+app.add_middleware(GZipMiddleware, minimum_size=COMPRESS_MIN_SIZE, compresslevel=GZIP_LEVEL)
+
+# Per-client token buckets; answers 429 before any work is done
+app.add_middleware(RateLimitMiddleware, limiter=rate_limiter)
+
 # CORS middleware for development
-# WHY: Allows frontend to make requests during local development
+# WHY: Allows frontend to make requests during local development. Added
+# after the rate limiter so it wraps it: 429s need CORS headers too, or
+# the browser hides their status and Retry-After from the app.
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # In production, restrict to specific domains
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Retry-After", "X-RateLimit-Limit", "X-RateLimit-Remaining"],
 )
 
+# Request timing for /api/metrics (outermost, so it sees the full latency)
+app.add_middleware(MetricsMiddleware)
+
+
+# Served trends are computed from the price history when it has data
+price_store.history = price_history
+
 
 # ===== Request Models =====
 class TranslationRequest(BaseModel):
@@ -53,11 +195,18 @@ class TranslationRequest(BaseModel):
     source_lang: Optional[str] = "auto"
 
 
+class BatchTranslationRequest(BaseModel):
+    texts: List[str]
+    target_langs: List[str]
+
+
 class NegotiationRequest(BaseModel):
     item: str
     vendor_price: str
     market_price: str = "standard"
     language: Optional[str] = "Hinglish"
+    structured_only: bool = False
+    stream: bool = False
 
 
 class LanguageDetectRequest(BaseModel):
@@ -67,11 +216,17 @@ class LanguageDetectRequest(BaseModel):
 class PriceInsightRequest(BaseModel):
     item: str
     location: Optional[str] = "India"
+    structured_only: bool = False
 
 
 class ChatRequest(BaseModel):
     message: str
     language: Optional[str] = "Hinglish"
+    stream: bool = False
+    # true starts a server-side conversation (see chat_sessions.py)
+    session: bool = False
+    # Returned by the previous /api/chat response to continue a conversation
+    session_id: Optional[str] = None
 
 
 class SmartPhrasesRequest(BaseModel):
@@ -80,32 +235,178 @@ class SmartPhrasesRequest(BaseModel):
     language: Optional[str] = "Hinglish"
 
 
+# ===== Streaming Helpers =====
+
+def _wants_stream(body_flag: bool, http_request: Request) -> bool:
+    """Streaming is requested with "stream": true or Accept: text/event-stream."""
+    return body_flag or "text/event-stream" in http_request.headers.get("accept", "")
+
+
+def _sse(event: str, data: dict) -> str:
+    """Formats one server-sent event."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def _sse_response(http_request: Request, events, result_field: str, done: dict,
+                        preamble: Optional[list] = None) -> StreamingResponse:
+    """
+    Relays ("delta" | "fallback", text) events from a service stream as SSE.
+    
+    WHY: The first event is awaited before the response starts, so an
+    Overloaded rejection still becomes a proper 503. After that, tokens
+    are forwarded as they arrive, and a client disconnect closes the
+    service stream, which cancels the upstream model call.
+    
+    Events sent: optional preamble events, "delta" {"text"}, "fallback"
+    {"text"} (replace what was shown), then "done" with the full text in
+    `result_field` plus `done`.
+    """
+    try:
+        first = await events.__anext__()
+    except StopAsyncIteration:
+        first = None
+    
+    async def relay():
+        parts = []
+        try:
+            for event, data in preamble or []:
+                yield _sse(event, data)
+            event = first
+            while event is not None:
+                kind, text = event
+                if kind == "fallback":
+                    parts = [text]
+                else:
+                    parts.append(text)
+                yield _sse(kind, {"text": text})
+                if await http_request.is_disconnected():
+                    return
+                try:
+                    event = await events.__anext__()
+                except StopAsyncIteration:
+                    event = None
+            yield _sse("done", {result_field: "".join(parts), **done})
+        finally:
+            await events.aclose()
+    
+    return StreamingResponse(
+        relay(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 # ===== API Endpoints =====
 
 @app.get("/api/health")
 async def health_check():
     """Health check endpoint for deployment verification."""
-    return {"status": "healthy", "service": "multilingual-mandi", "version": "2.0.0"}
+    return {
+        "status": "healthy",
+        "service": "multilingual-mandi",
+        "version": "2.0.0",
+        "translation_cache": translation_memory.snapshot(),
+        "chat_cache": chat_cache.snapshot(),
+        "chat_sessions": chat_sessions.snapshot(),
+        "coalescing": prompt_flight.snapshot(),
+        "admission": admission.snapshot(),
+        "circuit_breaker": {**gemini_breaker.snapshot(), "hedging": gemini_hedger.snapshot()},
+        "phrase_bank": phrase_bank.snapshot(),
+        "rate_limit": rate_limiter.snapshot()
+    }
+
+
+@registry.collector
+def _component_metrics() -> list:
+    """Cache, coalescing, admission and breaker counters at scrape time."""
+    translation = translation_memory.stats
+    flight = prompt_flight.snapshot()
+    bulkheads = admission.snapshot()
+    breaker = gemini_breaker.snapshot()
+    sessions = chat_sessions.snapshot()
+    return [
+        ("mandi_cache_hits_total", "counter", "Answer cache hits by cache and tier.", [
+            ({"cache": "translation", "tier": "memory"}, translation["l1_hits"]),
+            ({"cache": "translation", "tier": "sqlite"}, translation["l2_hits"]),
+            ({"cache": "chat", "tier": "memory"}, chat_cache.stats["hits"]),
+            ({"cache": "phrase_bank", "tier": "memory"}, phrase_bank.stats["hits"]),
+        ]),
+        ("mandi_cache_misses_total", "counter", "Answer cache misses by cache.", [
+            ({"cache": "translation"}, translation["misses"]),
+            ({"cache": "chat"}, chat_cache.stats["misses"]),
+            ({"cache": "phrase_bank"}, phrase_bank.stats["misses"]),
+        ]),
+        ("mandi_coalesced_calls_total", "counter", "Model calls that shared an in-flight identical call.", [
+            ({}, flight["coalesced"]),
+        ]),
+        ("mandi_admission_active", "gauge", "Model calls holding an admission slot.", [
+            ({"kind": kind}, b["active"]) for kind, b in bulkheads.items()
+        ]),
+        ("mandi_admission_waiting", "gauge", "Requests queued for an admission slot.", [
+            ({"kind": kind}, b["waiting"]) for kind, b in bulkheads.items()
+        ]),
+        ("mandi_admission_rejected_total", "counter", "Requests rejected with 503 by admission control.", [
+            ({"kind": kind}, b["rejected"]) for kind, b in bulkheads.items()
+        ]),
+        ("mandi_circuit_open", "gauge", "1 while the Gemini circuit breaker is open, 0.5 half-open.", [
+            ({}, {"closed": 0, "half_open": 0.5, "open": 1}[breaker["state"]]),
+        ]),
+        ("mandi_circuit_rejected_total", "counter", "Model calls skipped because the circuit was open.", [
+            ({}, breaker["rejected"]),
+        ]),
+        ("mandi_chat_sessions", "gauge", "Live server-side chat sessions.", [
+            ({}, sessions["sessions"]),
+        ]),
+        ("mandi_chat_sessions_memory_bytes", "gauge", "Estimated memory held by chat sessions.", [
+            ({}, sessions["memory_bytes"]),
+        ]),
+        ("mandi_chat_sessions_evicted_total", "counter", "Chat sessions dropped for the memory budget or idle TTL.", [
+            ({"reason": "memory"}, sessions["evicted"]),
+            ({"reason": "idle"}, sessions["expired"]),
+        ]),
+    ]
+
+
+@app.get("/api/metrics")
+async def metrics():
+    """
+    Prometheus metrics: per-endpoint and per-language latency histograms
+    (total, upstream, overhead), queue wait, cache results and fallbacks.
+    """
+    return Response(
+        content=registry.render(),
+        media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
 
 
 @app.get("/api/prices")
-async def get_prices():
+async def get_prices(
+    request: Request,
+    item: Optional[str] = None,
+    location: Optional[str] = None,
+    city: Optional[str] = None,
+    trend: Optional[str] = None,
+    unit: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    sort: Optional[str] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+):
     """
     Returns local market prices from the data store.
     
     WHY: Provides real-time price information to help vendors
-    and buyers make informed trading decisions.
+    and buyers make informed trading decisions. The body is served
+    pre-serialized from memory and revalidated with ETag/304.
+    
+    Without query parameters the full price list is returned as before.
+    With any filter (item, location, city, trend, unit, min_price,
+    max_price), sort ("price" or "-price"), limit or cursor, the result
+    is a page: {"items": [...], "total": n, "next_cursor": "..."}.
     """
     try:
-        # Use relative path that works in both dev and production
-        prices_path = Path(__file__).parent / "data" / "prices.json"
-        
-        # Fallback to absolute path for Vercel deployment
-        if not prices_path.exists():
-            prices_path = Path("backend/data/prices.json")
-        
-        with open(prices_path, "r", encoding="utf-8") as f:
-            return json.load(f)
+        snapshot = await price_store.aget()
     except FileNotFoundError:
         raise HTTPException(
             status_code=404, 
@@ -121,6 +422,189 @@ async def get_prices():
             status_code=500, 
             detail=f"Could not load price data: {str(e)}"
         )
+    
+    headers = {
+        "ETag": snapshot.etag,
+        "Last-Modified": snapshot.last_modified,
+        "Cache-Control": "no-cache",
+        "Vary": "Accept-Encoding",
+    }
+    # WHY: The snapshot ETag also validates query pages, since the same
+    # URL against the same snapshot always yields the same page
+    if etag_matches(request.headers.get("if-none-match"), snapshot.etag):
+        return Response(status_code=304, headers=headers)
+    
+    if not request.query_params:
+        # WHY: The full list is the largest response we send; compress it
+        # once per snapshot instead of on every request
+        encoding = negotiate_encoding(request.headers.get("accept-encoding"), available_encodings())
+        if encoding and len(snapshot.body) >= COMPRESS_MIN_SIZE:
+            return Response(
+                content=snapshot.encoded(encoding),
+                media_type="application/json",
+                headers={**headers, "Content-Encoding": encoding},
+            )
+        return Response(content=snapshot.body, media_type="application/json", headers=headers)
+    
+    try:
+        page = snapshot.query(
+            limit=limit if limit is not None else 50,
+            cursor=cursor,
+            item=item,
+            city=city,
+            location=location,
+            trend=trend,
+            unit=unit,
+            min_price=min_price,
+            max_price=max_price,
+            sort=sort,
+        )
+    except PriceQueryError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return FastJSONResponse(content=page, headers=headers)
+
+
+@app.get("/api/prices/export")
+async def export_prices(
+    request: Request,
+    format: Optional[str] = None,
+    item: Optional[str] = None,
+    location: Optional[str] = None,
+    city: Optional[str] = None,
+    trend: Optional[str] = None,
+    unit: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    sort: Optional[str] = None,
+):
+    """
+    Streams the full (optionally filtered) price dataset.
+    
+    The format is negotiated from the Accept header - text/csv for CSV,
+    otherwise NDJSON - and can be forced with ?format=csv|ndjson.
+    Filters are the same as /api/prices, without pagination.
+    """
+    if format is None:
+        accept = request.headers.get("accept", "")
+        format = "csv" if "text/csv" in accept else "ndjson"
+    if format not in ("csv", "ndjson"):
+        raise HTTPException(status_code=400, detail="format must be csv or ndjson")
+    
+    try:
+        snapshot = await price_store.aget()
+        ids = snapshot.index.select(
+            item=item,
+            city=city,
+            location=location,
+            trend=trend,
+            unit=unit,
+            min_price=min_price,
+            max_price=max_price,
+            sort=sort,
+        )
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Price data not found")
+    except PriceQueryError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    media_type = "text/csv; charset=utf-8" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        export_chunks(snapshot.records, ids, format),
+        media_type=media_type,
+        headers={
+            "ETag": snapshot.etag,
+            "Content-Disposition": f"attachment; filename=prices.{'csv' if format == 'csv' else 'ndjson'}",
+        }
+    )
+
+
+@app.get("/api/prices/history")
+async def get_price_history(
+    item: str,
+    location: Optional[str] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    days: Optional[int] = None,
+    window: Optional[int] = None,
+):
+    """
+    Returns the daily price series for an item (one per mandi).
+    
+    Optional start/end (ISO dates) or days bound the window; window adds
+    the rolling change vs that many days earlier.
+    
+    WHY: Queries run in a worker thread, since the first one loads the
+    history (memory map and NumPy import) and would stall the event loop.
+    """
+    if days is not None and days < 1 or window is not None and window < 1:
+        raise HTTPException(status_code=400, detail="days and window must be positive")
+    try:
+        series = await asyncio.to_thread(price_history.series, item, location, start, end, days, window)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Dates must be in YYYY-MM-DD format")
+    if not series:
+        raise HTTPException(status_code=404, detail=f"No price history for {item}")
+    return {"item": item, "series": series}
+
+
+@app.get("/api/prices/stats")
+async def get_price_stats(
+    item: str,
+    location: Optional[str] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    days: Optional[int] = None,
+    window: Optional[int] = None,
+):
+    """
+    Returns min/max/mean/median and change over a window for an item,
+    per mandi and across all mandis.
+    """
+    if days is not None and days < 1 or window is not None and window < 1:
+        raise HTTPException(status_code=400, detail="days and window must be positive")
+    try:
+        stats = await asyncio.to_thread(price_history.aggregate, item, location, start, end, days, window)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Dates must be in YYYY-MM-DD format")
+    if stats is None:
+        raise HTTPException(status_code=404, detail=f"No price history for {item}")
+    return stats
+
+
+@app.post("/api/prices/ingest")
+async def ingest_prices(request: Request):
+    """
+    Accepts a batch of price updates as NDJSON or CSV.
+    
+    Each row needs item, location and price ("40/kg" or a number with
+    an optional unit); trend and date (YYYY-MM-DD) are optional. Send
+    Content-Type text/csv for CSV with a header row, anything else is
+    read as NDJSON. Updates are durable on return and reach /api/prices
+    at the next background compaction.
+    """
+    if INGEST_TOKEN and request.headers.get("authorization") != f"Bearer {INGEST_TOKEN}":
+        raise HTTPException(status_code=401, detail="Invalid ingest token")
+    
+    body = await request.body()
+    if not body.strip():
+        raise HTTPException(status_code=400, detail="Batch cannot be empty")
+    
+    try:
+        updates, errors = await asyncio.to_thread(
+            parse_batch, body, request.headers.get("content-type", "")
+        )
+    except IngestError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    try:
+        accepted = await asyncio.to_thread(price_ingestor.append, updates)
+    except OSError as e:
+        print(f"Price ingest error: {e}")
+        raise HTTPException(
+            status_code=503,
+            detail="Price ingest temporarily unavailable"
+        )
+    return {"accepted": accepted, "rejected": len(errors), "errors": errors[:20]}
 
 
 @app.post("/api/translate")
@@ -147,6 +631,8 @@ async def translate(request: TranslationRequest):
     try:
         result = await translate_text(request.text, request.target_lang)
         return {"translated_text": result, "target_lang": request.target_lang}
+    except Overloaded:
+        raise
     except Exception as e:
         print(f"Translation endpoint error: {e}")
         raise HTTPException(
@@ -155,13 +641,59 @@ async def translate(request: TranslationRequest):
         )
 
 
+@app.post("/api/translate/batch")
+async def translate_many(request: BatchTranslationRequest):
+    """
+    Translates many texts into many languages in one request.
+    
+    Cached entries are served directly; the rest are packed into a
+    handful of model calls. Entries that still fail carry the
+    "[Translation failed]" marker.
+    """
+    texts = request.texts
+    if not texts or any(not t.strip() for t in texts):
+        raise HTTPException(
+            status_code=400, 
+            detail="Texts cannot be empty"
+        )
+    if not request.target_langs:
+        raise HTTPException(
+            status_code=400, 
+            detail="At least one target language is required"
+        )
+    if len(texts) > 200 or len(set(request.target_langs)) > len(SUPPORTED_LANGUAGES):
+        raise HTTPException(
+            status_code=400, 
+            detail=f"Batch too large. Maximum 200 texts and {len(SUPPORTED_LANGUAGES)} languages."
+        )
+    if any(len(t) > 2000 for t in texts):
+        raise HTTPException(
+            status_code=400, 
+            detail="Text too long. Maximum 2000 characters."
+        )
+    
+    try:
+        return await translate_batch(texts, list(dict.fromkeys(request.target_langs)))
+    except Overloaded:
+        raise
+    except Exception as e:
+        print(f"Batch translation endpoint error: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail="Translation service temporarily unavailable"
+        )
+
+
 @app.post("/api/negotiate")
-async def negotiate(request: NegotiationRequest):
+async def negotiate(request: NegotiationRequest, http_request: Request):
     """
     Provides AI-powered negotiation advice.
     
     Helps buyers and vendors reach fair deals with culturally
-    appropriate bargaining suggestions.
+    appropriate bargaining suggestions. The verdict is computed locally
+    from mandi prices; set structured_only to skip the model entirely.
+    With "stream": true (or Accept: text/event-stream) the verdict is
+    sent first and the advice follows as server-sent events.
     """
     if not request.item.strip():
         raise HTTPException(
@@ -169,14 +701,45 @@ async def negotiate(request: NegotiationRequest):
             detail="Item name cannot be empty"
         )
     
+    assessment = await fair_price_engine.aassess(
+        request.item,
+        request.vendor_price,
+        request.market_price
+    )
+    if request.structured_only:
+        advice = (
+            describe_verdict(request.item, assessment)
+            if assessment
+            else f"No local price data to judge {request.item} at {request.vendor_price}."
+        )
+        return {"advice": advice, "item": request.item, "verdict": assessment}
+    
+    if _wants_stream(request.stream, http_request):
+        return await _sse_response(
+            http_request,
+            stream_negotiation_advice(
+                request.item,
+                request.vendor_price,
+                request.market_price,
+                request.language,
+                assessment
+            ),
+            "advice",
+            {"item": request.item},
+            preamble=[("verdict", {"item": request.item, "verdict": assessment})]
+        )
+    
     try:
         advice = await get_negotiation_advice(
             request.item, 
             request.vendor_price, 
             request.market_price,
-            request.language
+            request.language,
+            assessment
         )
-        return {"advice": advice, "item": request.item}
+        return {"advice": advice, "item": request.item, "verdict": assessment}
+    except Overloaded:
+        raise
     except Exception as e:
         print(f"Negotiation endpoint error: {e}")
         raise HTTPException(
@@ -202,13 +765,18 @@ async def detect_lang(request: LanguageDetectRequest):
         detected_lang = await detect_language(request.text)
         return {"detected_language": detected_lang}
     except Exception as e:
-        return {"detected_language": "Hindi"}
+        print(f"Language detection endpoint error: {e}")
+        local_lang, _confidence = detect_language_local(request.text)
+        return {"detected_language": local_lang or "Hindi"}
 
 
 @app.post("/api/price-insight")
 async def price_insight(request: PriceInsightRequest):
     """
     Gets AI-powered insights about commodity prices.
+    
+    The price range comes from local mandi data when we have the item;
+    set structured_only to get just that band without a model call.
     """
     if not request.item.strip():
         raise HTTPException(
@@ -216,20 +784,35 @@ async def price_insight(request: PriceInsightRequest):
             detail="Item name cannot be empty"
         )
     
+    band = await fair_price_engine.aband(request.item)
+    if request.structured_only:
+        insight = describe_band(request.item, band) if band else "Price information not available."
+        return {"insight": insight, "item": request.item, "band": band}
+    
     try:
-        insight = await get_price_insight(request.item, request.location)
-        return {"insight": insight, "item": request.item}
+        insight = await get_price_insight(request.item, request.location, band)
+        return {"insight": insight, "item": request.item, "band": band}
+    except Overloaded:
+        raise
     except Exception as e:
         print(f"Price insight error: {e}")
-        return {"insight": "Price information not available.", "item": request.item}
+        return {"insight": "Price information not available.", "item": request.item, "band": band}
 
 
 @app.post("/api/chat")
-async def ai_chat(request: ChatRequest):
+async def ai_chat(request: ChatRequest, http_request: Request):
     """
     AI-powered vendor/buyer assistant for market-related queries.
     
     Helps with any market question in the user's preferred language.
+    With "stream": true (or Accept: text/event-stream) the answer is
+    sent as server-sent events while the model generates it.
+    
+    With "session": true (or a session_id) the response carries a
+    session_id; sending it back with the next message continues the
+    conversation with its context. Unknown or expired ids start a new
+    session (with a new id). Requests with neither are stateless and
+    keep nothing on the server.
     """
     if not request.message.strip():
         raise HTTPException(
@@ -237,9 +820,25 @@ async def ai_chat(request: ChatRequest):
             detail="Message cannot be empty"
         )
     
+    session = None
+    extra = {"language": request.language}
+    if request.session or request.session_id:
+        session = chat_sessions.resolve(request.session_id)
+        extra["session_id"] = session.id
+    
+    if _wants_stream(request.stream, http_request):
+        return await _sse_response(
+            http_request,
+            stream_chat_with_assistant(request.message, request.language, session),
+            "response",
+            extra
+        )
+    
     try:
-        response = await chat_with_assistant(request.message, request.language)
-        return {"response": response, "language": request.language}
+        response = await chat_with_assistant(request.message, request.language, session)
+        return {"response": response, **extra}
+    except Overloaded:
+        raise
     except Exception as e:
         print(f"Chat error: {e}")
         raise HTTPException(
@@ -268,6 +867,8 @@ async def smart_phrases(request: SmartPhrasesRequest):
             request.language
         )
         return {"phrases": phrases, "item": request.item, "language": request.language}
+    except Overloaded:
+        raise
     except Exception as e:
         print(f"Smart phrases error: {e}")
         raise HTTPException(
@@ -278,6 +879,19 @@ async def smart_phrases(request: SmartPhrasesRequest):
 
 # ===== Error Handlers =====
 
+@app.exception_handler(Overloaded)
+async def overloaded_handler(request: Request, exc: Overloaded):
+    """
+    Fast rejection when an endpoint class is at capacity.
+    WHY: Tells clients when to retry instead of letting requests pile up.
+    """
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Service busy. Please try again shortly."},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
+
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
     """
@@ -293,12 +907,12 @@ async def global_exception_handler(request: Request, exc: Exception):
 
 # ===== Serve Frontend =====
 # Mount static files LAST so API routes take precedence
-# WHY: Use Path to resolve frontend directory relative to project root
-frontend_path = Path(__file__).parent.parent / "frontend"
-app.mount("/", StaticFiles(directory=str(frontend_path), html=True), name="frontend")
+# WHY: Serves the hashed, precompressed build from frontend/dist when it
+# is up to date (python static_assets.py build), else the raw files
+frontend_path = frontend_directory()
+app.mount("/", PrecompressedStaticFiles(directory=str(frontend_path), html=True), name="frontend")
 
 
 # ===== TODO =====
 # NEXT_DEVELOPER: Add authentication for vendor profiles in Phase 2
-# TODO: Implement request rate limiting
 # TODO: Add request logging for analytics
@@ -0,0 +1,322 @@
+"""
+Request metrics for Multilingual Mandi in Prometheus text format.
+
+- MetricsMiddleware times every HTTP request and labels it by endpoint
+  (route template), method, status and language.
+- Services report, for the request being served, time spent waiting on
+  the model once admitted (upstream_span), admission queue wait
+  (add_queue_wait), cache results (mark_cache), fallbacks
+  (record_fallback) and the response language (set_language), through
+  a context variable.
+- Registry.render() writes histograms, counters and any registered
+  collector (cache/admission/breaker snapshots) for GET /api/metrics.
+
+Histograms use fixed buckets and one bisect per observation, so
+recording costs about a microsecond. Numbers are per process: with
+several uvicorn workers, Prometheus scrapes each one.
+
+WHY: main.py and services.py only printed errors, so there was no way to
+tell whether a slow answer came from Gemini, the admission queue or
+our own code.
+"""
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Optional
+
+# Default latency buckets in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Requests slower than this are logged (0 disables)
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "3000"))
+
+# Languages used as label values; anything else becomes "other"
+KNOWN_LANGUAGES = {
+    "Hindi", "Tamil", "Telugu", "Bengali", "Marathi", "Kannada",
+    "Gujarati", "Punjabi", "English", "Hinglish", "multi",
+}
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _fmt(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter with labels."""
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_labels(self.labelnames, labels)} {_fmt(value)}")
+        return lines
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram with labels.
+
+    Stores one count per bucket (non-cumulative) and turns them into the
+    cumulative Prometheus buckets only when rendered.
+    """
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple = (),
+                 buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [bucket counts..., +Inf count, sum]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels) -> None:
+        slot = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[slot] += 1
+            series[-1] += value
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((labels, list(series)) for labels, series in self._series.items())
+        for labels, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += count
+                le = f'le="{_fmt(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_fmt(series[-1])}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+class Registry:
+    """Holds metrics and pull-style collectors, and renders them all."""
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, *args, **kwargs) -> Counter:
+        metric = Counter(*args, **kwargs)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, *args, **kwargs) -> Histogram:
+        metric = Histogram(*args, **kwargs)
+        self._metrics.append(metric)
+        return metric
+
+    def collector(self, fn: Callable[[], list]) -> Callable:
+        """
+        Registers fn, called at scrape time. It returns a list of
+        (name, type, help, [(labels_dict, value), ...]) tuples.
+        """
+        self._collectors.append(fn)
+        return fn
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for fn in self._collectors:
+            try:
+                families = fn()
+            except Exception as e:
+                print(f"Metrics collector error: {e}")
+                continue
+            for name, kind, help_text, samples in families:
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    names = tuple(labels)
+                    lines.append(f"{name}{_labels(names, tuple(labels[n] for n in names))} {_fmt(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+REQUEST_SECONDS = registry.histogram(
+    "mandi_http_request_duration_seconds",
+    "Total time to serve a request, including streamed bodies.",
+    ("endpoint", "method", "status", "language"),
+)
+UPSTREAM_SECONDS = registry.histogram(
+    "mandi_upstream_duration_seconds",
+    "Time a request spent waiting on Gemini, from the granted admission slot.",
+    ("endpoint", "language"),
+)
+OVERHEAD_SECONDS = registry.histogram(
+    "mandi_overhead_duration_seconds",
+    "Request time not spent waiting on Gemini (our own overhead).",
+    ("endpoint", "language"),
+)
+QUEUE_WAIT_SECONDS = registry.histogram(
+    "mandi_admission_queue_wait_seconds",
+    "Time spent waiting for an admission slot.",
+    ("endpoint", "language", "kind"),
+)
+CACHE_LOOKUPS = registry.counter(
+    "mandi_request_cache_lookups_total",
+    "Answer cache lookups made while serving requests, by result.",
+    ("endpoint", "language", "cache", "result"),
+)
+FALLBACKS = registry.counter(
+    "mandi_fallbacks_total",
+    "Canned fallback answers returned because a model call failed.",
+    ("endpoint", "kind"),
+)
+
+
+def _endpoint_of(scope: dict) -> str:
+    """Route template for API requests, so /api/x?y=1 and ids share a label."""
+    path = getattr(scope.get("route"), "path", None)
+    if path:
+        return path
+    return "unmatched" if scope.get("path", "").startswith("/api") else "static"
+
+
+class RequestStats:
+    """Per-request measurements filled in by services."""
+
+    __slots__ = ("scope", "language", "upstream", "_open_spans", "_busy_since")
+
+    def __init__(self, scope: dict):
+        self.scope = scope
+        self.language = "none"
+        self.upstream = 0.0
+        self._open_spans = 0
+        self._busy_since = 0.0
+
+    @property
+    def endpoint(self) -> str:
+        return _endpoint_of(self.scope)
+
+
+_current: ContextVar[Optional[RequestStats]] = ContextVar("mandi_request_stats", default=None)
+
+
+def set_language(language: Optional[str]) -> None:
+    """Labels the current request with its response language."""
+    stats = _current.get()
+    if stats is not None and language:
+        stats.language = language if language in KNOWN_LANGUAGES else "other"
+
+
+@contextmanager
+def upstream_span():
+    """
+    Times a wait on the model for the current request.
+
+    Overlapping spans (e.g. a batch's parallel calls) count once, so
+    upstream time never exceeds the request's wall time.
+    """
+    stats = _current.get()
+    if stats is None:
+        yield
+        return
+    if stats._open_spans == 0:
+        stats._busy_since = time.perf_counter()
+    stats._open_spans += 1
+    try:
+        yield
+    finally:
+        stats._open_spans -= 1
+        if stats._open_spans == 0:
+            stats.upstream += time.perf_counter() - stats._busy_since
+
+
+def add_queue_wait(kind: str, seconds: float) -> None:
+    """Records an admission queue wait against the current request's endpoint and language."""
+    stats = _current.get()
+    if stats is None:
+        QUEUE_WAIT_SECONDS.observe(seconds, "background", "none", kind)
+    else:
+        QUEUE_WAIT_SECONDS.observe(seconds, stats.endpoint, stats.language, kind)
+
+
+def mark_cache(cache: str, hit: bool) -> None:
+    """Counts a cache lookup against the current request's endpoint and language."""
+    stats = _current.get()
+    if stats is not None:
+        CACHE_LOOKUPS.inc(stats.endpoint, stats.language, cache, "hit" if hit else "miss")
+
+
+def record_fallback(kind: str) -> None:
+    stats = _current.get()
+    FALLBACKS.inc(stats.endpoint if stats is not None else "background", kind)
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware timing each HTTP request.
+
+    Runs around streaming bodies too, since Starlette sends the whole
+    body before the application call returns.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        stats = RequestStats(scope)
+        token = _current.set(stats)
+        status = 500
+        started = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            _current.reset(token)
+            total = time.perf_counter() - started
+            endpoint = _endpoint_of(scope)
+            REQUEST_SECONDS.observe(total, endpoint, scope["method"], str(status), stats.language)
+            if endpoint != "static":
+                if stats.upstream:
+                    UPSTREAM_SECONDS.observe(stats.upstream, endpoint, stats.language)
+                OVERHEAD_SECONDS.observe(max(0.0, total - stats.upstream), endpoint, stats.language)
+            if SLOW_REQUEST_MS and total * 1000 >= SLOW_REQUEST_MS:
+                print(
+                    f"Slow request: {scope['method']} {endpoint} {status} "
+                    f"{total * 1000:.0f} ms (upstream {stats.upstream * 1000:.0f} ms, "
+                    f"language {stats.language})"
+                )
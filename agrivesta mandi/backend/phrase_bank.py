@@ -0,0 +1,297 @@
+"""
+Smart Phrase Bank for Multilingual Mandi.
+
+Pre-generated bargaining phrases keyed by (item, context, language),
+stored in data/phrase_bank.json as one compact JSON object:
+
+    {"version": 1, "entries": {"tomato|high price|Hinglish": ["...", ...]}}
+
+Each key holds a few variants that are served round-robin so repeat
+visitors do not see the same lines every time. The bank is filled
+offline (`python phrase_bank.py build`) or by the optional background
+warm-up job (PHRASE_BANK_WARMUP=1). Combinations the bank has never
+seen still go to the model; the answer is added to the bank and the
+remaining variants are generated in the background, so later visitors
+get the rotation too. New variants reach the file every
+PHRASE_BANK_SAVE_INTERVAL seconds (main.py) and at shutdown.
+
+WHY: Items come from prices.json, languages from SUPPORTED_LANGUAGES
+and contexts from a handful of values, so almost every phrase request
+repeats a combination we can answer ahead of time with a dict lookup
+instead of a multi-second Gemini call.
+"""
+import asyncio
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Optional
+
+from cache import normalize_text
+from fair_price import normalize_item
+
+PHRASE_BANK_PATH = Path(
+    os.getenv("PHRASE_BANK_PATH", str(Path(__file__).parent / "data" / "phrase_bank.json"))
+)
+# Variants kept (and generated by the warm-up) per combination
+PHRASE_BANK_VARIANTS = int(os.getenv("PHRASE_BANK_VARIANTS", "3"))
+# Concurrent model calls the warm-up job and background top-ups may use
+PHRASE_BANK_WARMUP_CONCURRENCY = int(os.getenv("PHRASE_BANK_WARMUP_CONCURRENCY", "2"))
+# Seconds between saves of newly generated variants (0 disables)
+PHRASE_BANK_SAVE_INTERVAL = float(os.getenv("PHRASE_BANK_SAVE_INTERVAL", "60"))
+
+# Contexts the frontend and the negotiation fallback ask for
+DEFAULT_CONTEXTS = (
+    "general negotiation",
+    "high price",
+    "bulk buy",
+    "quality check",
+    "end of day",
+)
+
+
+def phrase_key(item: str, context: str, language: str) -> str:
+    """Canonical bank key; aliases like "tamatar" share the "tomato" entry."""
+    return f"{normalize_item(item)}|{normalize_text(context or DEFAULT_CONTEXTS[0])}|{(language or 'Hinglish').strip()}"
+
+
+class PhraseBank:
+    """
+    In-memory view of the phrase bank file with round-robin variants.
+
+    The file is loaded on first use. New variants are kept in memory and
+    written back by save(), which merges with whatever other workers have
+    written in the meantime.
+    """
+
+    def __init__(self, path: Path = PHRASE_BANK_PATH, max_variants: int = PHRASE_BANK_VARIANTS):
+        self.path = Path(path)
+        self.max_variants = max_variants
+        self._entries: Optional[dict] = None
+        self._cursor = {}
+        self._dirty = False
+        self._lock = threading.Lock()
+        # Background top-ups by key, so a key is filled by one task at a time
+        self._filling = {}
+        self._fill_slots: Optional[asyncio.Semaphore] = None
+        self.stats = {"hits": 0, "misses": 0, "added": 0}
+
+    def _read_file(self) -> dict:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            print(f"Phrase bank load error: {e}")
+            return {}
+        entries = data.get("entries", {}) if isinstance(data, dict) else {}
+        return {
+            key: [v for v in variants if isinstance(v, str) and v.strip()]
+            for key, variants in entries.items()
+            if isinstance(variants, list)
+        }
+
+    def _data(self) -> dict:
+        if self._entries is None:
+            with self._lock:
+                if self._entries is None:
+                    self._entries = self._read_file()
+        return self._entries
+
+    def variants(self, key: str) -> list:
+        return self._data().get(key, [])
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Returns the next variant for a key, or None if the bank has none.
+        """
+        variants = self._data().get(key)
+        if not variants:
+            self.stats["misses"] += 1
+            return None
+        self.stats["hits"] += 1
+        turn = self._cursor.get(key, 0)
+        self._cursor[key] = turn + 1
+        return variants[turn % len(variants)]
+
+    def add(self, key: str, text: str) -> bool:
+        """
+        Adds a variant unless it duplicates one already stored or the key
+        is full.
+
+        Returns:
+            True if the variant was added
+        """
+        text = text.strip()
+        if not text:
+            return False
+        self._data()
+        with self._lock:
+            variants = self._entries.setdefault(key, [])
+            if len(variants) >= self.max_variants:
+                return False
+            canonical = normalize_text(text)
+            if any(normalize_text(v) == canonical for v in variants):
+                return False
+            variants.append(text)
+            self._dirty = True
+        self.stats["added"] += 1
+        return True
+
+    def save(self) -> bool:
+        """
+        Writes the bank atomically if anything was added.
+
+        Variants written by other workers since our load are merged in
+        first, so concurrent processes do not drop each other's additions.
+        """
+        if not self._dirty or self._entries is None:
+            return False
+        with self._lock:
+            merged = self._read_file()
+            for key, variants in self._entries.items():
+                stored = merged.setdefault(key, [])
+                for text in variants:
+                    if len(stored) >= self.max_variants:
+                        break
+                    if text not in stored:
+                        stored.append(text)
+            self._entries = merged
+            self._dirty = False
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"version": 1, "entries": merged}, f,
+                          ensure_ascii=False, separators=(",", ":"), sort_keys=True)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            # WHY: Read-only deploys (e.g. serverless) still serve from memory
+            print(f"Phrase bank save error: {e}")
+            return False
+        return True
+
+    def top_up_later(self, generate, combo: tuple) -> None:
+        """
+        Generates the rest of a combination's variants in a background task.
+
+        Called after a miss was answered, so the next visitors rotate
+        through max_variants phrases instead of the one that was banked.
+        Must run on the event loop.
+
+        Args:
+            generate: async fn(item, context, language) -> str, raising on failure
+            combo: (item, context, language)
+        """
+        key = phrase_key(*combo)
+        if key in self._filling or len(self.variants(key)) >= self.max_variants:
+            return
+        if self._fill_slots is None:
+            self._fill_slots = asyncio.Semaphore(PHRASE_BANK_WARMUP_CONCURRENCY)
+        task = asyncio.create_task(top_up(self, generate, combo, self._fill_slots))
+        self._filling[key] = task
+        task.add_done_callback(lambda _, k=key: self._filling.pop(k, None))
+
+    def missing(self, combos) -> list:
+        """(item, context, language) combos with fewer than max_variants variants."""
+        data = self._data()
+        return [
+            combo for combo in combos
+            if len(data.get(phrase_key(*combo), [])) < self.max_variants
+        ]
+
+    def snapshot(self) -> dict:
+        """Counters for the health endpoint."""
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "keys": len(self._entries) if self._entries is not None else None,
+            "hit_ratio": round(self.stats["hits"] / lookups, 4) if lookups else 0.0,
+        }
+
+
+def default_combos(items, languages, contexts=DEFAULT_CONTEXTS) -> list:
+    """Every (item, context, language) combination worth pre-generating."""
+    seen = set()
+    combos = []
+    for item in items:
+        name = normalize_item(str(item))
+        if not name or name in seen:
+            continue
+        seen.add(name)
+        for context in contexts:
+            for language in languages:
+                combos.append((name, context, language))
+    return combos
+
+
+async def warm_up(bank: PhraseBank, generate, combos, concurrency: int = PHRASE_BANK_WARMUP_CONCURRENCY) -> int:
+    """
+    Fills the bank up to max_variants for each combination.
+
+    Args:
+        bank: Bank to fill
+        generate: async fn(item, context, language) -> str calling the model;
+            it must raise on failure so canned fallbacks are never banked
+        combos: (item, context, language) tuples
+        concurrency: Parallel model calls
+
+    Returns:
+        Number of variants added
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    added = await asyncio.gather(*(top_up(bank, generate, combo, semaphore) for combo in bank.missing(combos)))
+    await asyncio.to_thread(bank.save)
+    return sum(added)
+
+
+async def top_up(bank: PhraseBank, generate, combo: tuple, semaphore: asyncio.Semaphore) -> int:
+    """
+    Generates variants for one combination until it has max_variants.
+
+    Args:
+        bank: Bank to fill
+        generate: async fn(item, context, language) -> str, raising on failure
+        combo: (item, context, language)
+        semaphore: Bounds the model calls shared with other fills
+
+    Returns:
+        Number of variants added
+    """
+    key = phrase_key(*combo)
+    added = 0
+    # A few extra attempts in case the model repeats itself
+    for _ in range(bank.max_variants * 2):
+        if len(bank.variants(key)) >= bank.max_variants:
+            break
+        async with semaphore:
+            try:
+                text = await generate(*combo)
+            except Exception as e:
+                print(f"Phrase bank fill error for {key}: {e}")
+                break
+        if bank.add(key, text):
+            added += 1
+    return added
+
+
+# Shared bank used by services
+phrase_bank = PhraseBank()
+
+
+if __name__ == "__main__":
+    # Offline build: python phrase_bank.py build
+    import sys
+
+    if sys.argv[1:2] != ["build"]:
+        print("Usage: python phrase_bank.py build")
+        sys.exit(1)
+
+    from price_store import price_store
+    from services import SUPPORTED_LANGUAGES, generate_phrases_from_model
+
+    items = [r.get("item", "") for r in price_store.get().records if isinstance(r, dict)]
+    combos = default_combos(items, [*SUPPORTED_LANGUAGES, "Hinglish"])
+    count = asyncio.run(warm_up(phrase_bank, generate_phrases_from_model, combos))
+    print(f"Added {count} phrase variants to {phrase_bank.path}")
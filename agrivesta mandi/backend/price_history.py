@@ -0,0 +1,484 @@
+"""
+Price History Store for Multilingual Mandi.
+
+Keeps one daily price series per (item, mandi) pair in a single
+float32 matrix (series x days, NaN = no quote that day) that can be
+memory-mapped straight from disk.
+
+On-disk layout (data/history/):
+- history.json: {"start": "YYYY-MM-DD", "days": N, "series": [[item, location], ...]}
+- history.f4:   raw little-endian float32 matrix, row-major, series x days
+
+WHY: A year of daily prices for 2,000 series is ~2.9 MB, loads in O(1)
+via mmap, and min/max/mean/median/rolling change are single vectorized
+NumPy calls instead of Python loops. The files are read, and NumPy
+imported, on first use; an empty history never imports NumPy at all.
+
+Usage (build the store from a CSV of date,item,location,price):
+    python price_history.py import history.csv
+"""
+import json
+import math
+import os
+import sys
+import threading
+import time
+import warnings
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Optional
+
+from price_store import parse_price
+
+DEFAULT_HISTORY_DIR = Path(
+    os.getenv("PRICE_HISTORY_DIR", str(Path(__file__).parent / "data" / "history"))
+)
+
+# Trend = mean of the last TREND_WINDOW days vs the TREND_WINDOW days before,
+# with a relative move under TREND_THRESHOLD counted as "stable"
+TREND_WINDOW = int(os.getenv("PRICE_TREND_WINDOW", "7"))
+TREND_THRESHOLD = float(os.getenv("PRICE_TREND_THRESHOLD", "0.03"))
+
+_DTYPE = "<f4"
+_ITEMSIZE = 4
+
+# Set by _numpy() on first use
+np = None
+
+
+def _numpy():
+    """
+    Imports NumPy on first use.
+    WHY: It adds ~70 ms to a serverless cold start, and /api/prices
+    only needs it once a history actually exists.
+    """
+    global np
+    if np is None:
+        import numpy
+        np = numpy
+    return np
+
+
+def _series_key(item: str, location: str) -> tuple:
+    return (item.strip().lower(), location.strip().lower())
+
+
+def _as_date(value) -> date:
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value).strip()[:10])
+
+
+class _State:
+    """One consistent view of the matrix (None while empty) and its metadata."""
+
+    __slots__ = ("matrix", "series", "index", "by_item", "start", "days")
+
+    def __init__(self, matrix, series: list, start: date):
+        self.matrix = matrix
+        self.series = series
+        self.start = start
+        self.days = matrix.shape[1] if matrix is not None else 0
+        self.index = {}
+        self.by_item = {}
+        for row, (item, location) in enumerate(series):
+            self.index[_series_key(item, location)] = row
+            self.by_item.setdefault(item.strip().lower(), []).append(row)
+
+
+class PriceHistory:
+    """
+    Array-backed daily price history.
+
+    Readers work on an immutable _State reference; writers either update
+    cells in place or build a larger matrix and swap the reference, so
+    aggregate queries never wait on an ingest.
+    """
+
+    def __init__(self, directory: Path = DEFAULT_HISTORY_DIR):
+        self.directory = Path(directory)
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        # None until first use; see _ensure_loaded()
+        self._loaded: Optional[_State] = None
+        self._version = 0
+        self.updated_at = 0.0
+
+    def _ensure_loaded(self) -> None:
+        """Loads the on-disk history on first use (an empty one if there is none)."""
+        if self._loaded is not None:
+            return
+        with self._load_lock:
+            if self._loaded is None and not self.load():
+                with self._lock:
+                    if self._loaded is None:
+                        self._loaded = _State(None, [], date.today())
+
+    @property
+    def _state(self) -> _State:
+        self._ensure_loaded()
+        return self._loaded
+
+    @property
+    def version(self) -> int:
+        """Bumped on every change so dependent caches (PriceStore) can refresh."""
+        self._ensure_loaded()
+        return self._version
+
+    # ===== Persistence =====
+
+    @property
+    def _meta_path(self) -> Path:
+        return self.directory / "history.json"
+
+    @property
+    def _data_path(self) -> Path:
+        return self.directory / "history.f4"
+
+    def load(self) -> bool:
+        """
+        Memory-maps the on-disk history if present.
+
+        Returns:
+            True if a history was loaded, False if none exists yet
+        """
+        try:
+            with open(self._meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            series = [tuple(s) for s in meta["series"]]
+            days = int(meta["days"])
+            shape = (len(series), days)
+            if len(series) and days:
+                if self._data_path.stat().st_size != shape[0] * shape[1] * _ITEMSIZE:
+                    raise ValueError("history.f4 size does not match history.json")
+                # WHY: copy-on-write mapping - pages load lazily and in-place
+                # ingest writes never touch the file until save()
+                matrix = _numpy().memmap(self._data_path, dtype=_DTYPE, mode="c", shape=shape)
+            elif series:
+                matrix = _numpy().empty(shape, dtype=_DTYPE)
+            else:
+                matrix = None
+            state = _State(matrix, series, _as_date(meta["start"]))
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"Price history load error: {e}")
+            return False
+        with self._lock:
+            self._loaded = state
+            self._version += 1
+            self.updated_at = self._meta_path.stat().st_mtime
+        return True
+
+    def disk_version(self) -> Optional[tuple]:
+        """Identity of the saved history (changes on every save), or None if there is none."""
+        try:
+            stat = self._meta_path.stat()
+        except OSError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    def reload(self) -> None:
+        """
+        Replaces the in-memory history with what is on disk, dropping
+        unsaved observations (empty if nothing has been saved yet).
+
+        WHY: Every worker process records into its own copy; the one that
+        compacts saves the merged result, and the others reload it.
+        """
+        if self.load() or self._meta_path.exists():
+            # Loaded, or unreadable (already reported); keep what we have
+            return
+        with self._lock:
+            self._loaded = _State(None, [], date.today())
+            self._version += 1
+            self.updated_at = time.time()
+
+    def save(self) -> None:
+        """Atomically writes the matrix and metadata to disk."""
+        self._ensure_loaded()
+        np = _numpy()
+        with self._lock:
+            state = self._state
+            self.directory.mkdir(parents=True, exist_ok=True)
+            tmp_data = self._data_path.with_suffix(".f4.tmp")
+            tmp_meta = self._meta_path.with_suffix(".json.tmp")
+            matrix = state.matrix if state.matrix is not None else np.empty((0, 0), dtype=_DTYPE)
+            np.ascontiguousarray(matrix, dtype=_DTYPE).tofile(tmp_data)
+            with open(tmp_meta, "w", encoding="utf-8") as f:
+                json.dump(
+                    {
+                        "start": state.start.isoformat(),
+                        "days": state.days,
+                        "series": [list(s) for s in state.series],
+                    },
+                    f,
+                    ensure_ascii=False,
+                )
+            os.replace(tmp_data, self._data_path)
+            os.replace(tmp_meta, self._meta_path)
+
+    # ===== Writes =====
+
+    def record_many(self, rows) -> int:
+        """
+        Records many (item, location, day, price) observations at once.
+
+        The price may be a number or a display string like "40/kg".
+        Later observations for the same series and day overwrite earlier ones.
+
+        Returns:
+            Number of observations stored
+        """
+        parsed = []
+        for item, location, day, price in rows:
+            value, _unit = parse_price(price)
+            if value is None or not item or not location:
+                continue
+            try:
+                day = _as_date(day)
+            except ValueError:
+                continue
+            parsed.append((item.strip(), location.strip(), day, value))
+        if not parsed:
+            return 0
+
+        self._ensure_loaded()
+        np = _numpy()
+        with self._lock:
+            state = self._state
+            series = list(state.series)
+            index = dict(state.index)
+            for item, location, _day, _value in parsed:
+                key = _series_key(item, location)
+                if key not in index:
+                    index[key] = len(series)
+                    series.append((item, location))
+
+            first = min(p[2] for p in parsed)
+            last = max(p[2] for p in parsed)
+            if state.days:
+                start = min(state.start, first)
+                end = max(state.start + timedelta(days=state.days - 1), last)
+            else:
+                start, end = first, last
+            days = (end - start).days + 1
+
+            matrix = state.matrix
+            if matrix is None or (len(series), days) != matrix.shape or start != state.start:
+                grown = np.full((len(series), days), np.nan, dtype=_DTYPE)
+                offset = (state.start - start).days
+                if matrix is not None and matrix.size:
+                    grown[: matrix.shape[0], offset : offset + matrix.shape[1]] = matrix
+                matrix = grown
+
+            rows_idx = np.fromiter((index[_series_key(p[0], p[1])] for p in parsed), dtype=np.intp)
+            cols_idx = np.fromiter(((p[2] - start).days for p in parsed), dtype=np.intp)
+            matrix[rows_idx, cols_idx] = np.fromiter((p[3] for p in parsed), dtype=_DTYPE)
+
+            if matrix is not state.matrix or len(series) != len(state.series):
+                self._loaded = _State(matrix, series, start)
+            self._version += 1
+            self.updated_at = time.time()
+        return len(parsed)
+
+    def record(self, item: str, location: str, day, price) -> int:
+        """Records a single observation. See record_many."""
+        return self.record_many([(item, location, day, price)])
+
+    # ===== Reads =====
+
+    def has_data(self) -> bool:
+        return bool(self._state.series)
+
+    def _rows(self, state: _State, item: str, location: Optional[str]) -> list:
+        if location:
+            row = state.index.get(_series_key(item, location))
+            return [] if row is None else [row]
+        return list(state.by_item.get(item.strip().lower(), []))
+
+    def _columns(self, state: _State, start=None, end=None, days: Optional[int] = None) -> tuple:
+        """Resolves a date window to a [lo, hi) column slice."""
+        hi = state.days
+        if end is not None:
+            hi = min(hi, max(0, (_as_date(end) - state.start).days + 1))
+        lo = 0
+        if start is not None:
+            lo = max(0, (_as_date(start) - state.start).days)
+        if days is not None:
+            lo = max(lo, hi - days)
+        return lo, max(lo, hi)
+
+    def series(self, item: str, location: Optional[str] = None, start=None, end=None,
+               days: Optional[int] = None, window: Optional[int] = None) -> list:
+        """
+        Returns the raw daily series (and rolling change) for an item.
+
+        Args:
+            item: Commodity name
+            location: Mandi location; all mandis for the item if omitted
+            start, end: Optional ISO dates bounding the window (inclusive)
+            days: Optional window length counted back from the end
+            window: If set, also return the change vs `window` days earlier
+
+        Returns:
+            One dict per series with dates, prices and optional change lists
+        """
+        state = self._state
+        rows = self._rows(state, item, location)
+        if not rows:
+            return []
+        np = _numpy()
+        lo, hi = self._columns(state, start, end, days)
+        dates = [(state.start + timedelta(days=d)).isoformat() for d in range(lo, hi)]
+        result = []
+        for row in rows:
+            values = np.asarray(state.matrix[row, lo:hi], dtype=np.float64)
+            entry = {
+                "item": state.series[row][0],
+                "location": state.series[row][1],
+                "dates": dates,
+                "prices": _to_list(values),
+            }
+            if window:
+                full = np.asarray(state.matrix[row, max(0, lo - window):hi], dtype=np.float64)
+                entry["window"] = window
+                entry["change"] = _to_list(_rolling_change(full, window)[-(hi - lo):] if hi > lo else full[:0])
+            result.append(entry)
+        return result
+
+    def aggregate(self, item: str, location: Optional[str] = None, start=None, end=None,
+                  days: Optional[int] = None, window: Optional[int] = None) -> Optional[dict]:
+        """
+        Vectorized window statistics for an item, per mandi and overall.
+
+        Returns:
+            Dict with min/max/mean/median/last/change stats, or None if the
+            item has no history
+        """
+        state = self._state
+        rows = self._rows(state, item, location)
+        if not rows:
+            return None
+        np = _numpy()
+        lo, hi = self._columns(state, start, end, days)
+        block = np.asarray(state.matrix[rows, lo:hi], dtype=np.float64)
+        window = window or max(1, hi - lo - 1)
+
+        with warnings.catch_warnings():
+            # All-NaN rows are expected for mandis with no quotes in the window
+            warnings.simplefilter("ignore", category=RuntimeWarning)
+            mins = np.nanmin(block, axis=1) if block.size else np.full(len(rows), np.nan)
+            maxs = np.nanmax(block, axis=1) if block.size else np.full(len(rows), np.nan)
+            means = np.nanmean(block, axis=1) if block.size else np.full(len(rows), np.nan)
+            medians = np.nanmedian(block, axis=1) if block.size else np.full(len(rows), np.nan)
+            counts = np.count_nonzero(~np.isnan(block), axis=1)
+            lasts = _last_valid(block)
+            bases = _last_valid(block[:, : max(0, block.shape[1] - window)])
+            changes = lasts - bases
+            pct = changes / bases * 100.0
+
+            overall = {
+                "min": _num(np.nanmin(block)) if counts.sum() else None,
+                "max": _num(np.nanmax(block)) if counts.sum() else None,
+                "mean": _num(np.nanmean(block)) if counts.sum() else None,
+                "median": _num(np.nanmedian(block)) if counts.sum() else None,
+                "count": int(counts.sum()),
+            }
+
+        return {
+            "item": state.series[rows[0]][0],
+            "from": (state.start + timedelta(days=lo)).isoformat() if hi > lo else None,
+            "to": (state.start + timedelta(days=hi - 1)).isoformat() if hi > lo else None,
+            "window": window,
+            "overall": overall,
+            "mandis": [
+                {
+                    "location": state.series[row][1],
+                    "min": _num(mins[i]),
+                    "max": _num(maxs[i]),
+                    "mean": _num(means[i]),
+                    "median": _num(medians[i]),
+                    "last": _num(lasts[i]),
+                    "change": _num(changes[i]),
+                    "change_pct": _num(pct[i]),
+                    "count": int(counts[i]),
+                }
+                for i, row in enumerate(rows)
+            ],
+        }
+
+    def trends(self, window: int = TREND_WINDOW, threshold: float = TREND_THRESHOLD) -> dict:
+        """
+        Computes up/down/stable for every series in one vectorized pass.
+
+        Returns:
+            Dict mapping (item, location) lowercase keys to a trend string;
+            series without enough data are omitted
+        """
+        state = self._state
+        if not state.series or state.days < 2:
+            return {}
+        np = _numpy()
+        recent = np.asarray(state.matrix[:, -window:], dtype=np.float64)
+        prior = np.asarray(state.matrix[:, -2 * window : -window], dtype=np.float64)
+        if prior.shape[1] == 0:
+            return {}
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", category=RuntimeWarning)
+            move = (np.nanmean(recent, axis=1) - np.nanmean(prior, axis=1)) / np.nanmean(prior, axis=1)
+        labels = np.where(move > threshold, "up", np.where(move < -threshold, "down", "stable"))
+        return {
+            _series_key(*state.series[row]): str(labels[row])
+            for row in np.flatnonzero(~np.isnan(move))
+        }
+
+
+# ===== Vectorized helpers =====
+
+def _rolling_change(values, window: int):
+    """Change vs `window` days earlier, NaN where either side is missing."""
+    np = _numpy()
+    out = np.full(values.shape, np.nan)
+    if window < values.shape[-1]:
+        out[..., window:] = values[..., window:] - values[..., :-window]
+    return out
+
+
+def _last_valid(block):
+    """Last non-NaN value of each row (NaN for empty rows)."""
+    np = _numpy()
+    if block.shape[1] == 0:
+        return np.full(block.shape[0], np.nan)
+    valid = ~np.isnan(block)
+    last_col = block.shape[1] - 1 - np.argmax(valid[:, ::-1], axis=1)
+    values = block[np.arange(block.shape[0]), last_col]
+    return np.where(valid.any(axis=1), values, np.nan)
+
+
+def _num(value) -> Optional[float]:
+    value = float(value)
+    return None if math.isnan(value) or math.isinf(value) else round(value, 2)
+
+
+def _to_list(values) -> list:
+    return [None if math.isnan(v) else round(float(v), 2) for v in values]
+
+
+# Shared history used by the API
+price_history = PriceHistory()
+
+
+if __name__ == "__main__":
+    # Build or extend the store from a CSV with date,item,location,price columns
+    import csv
+
+    if len(sys.argv) != 3 or sys.argv[1] != "import":
+        print("Usage: python price_history.py import <history.csv>")
+        sys.exit(1)
+    with open(sys.argv[2], newline="", encoding="utf-8") as f:
+        count = price_history.record_many(
+            (r["item"], r["location"], r["date"], r["price"]) for r in csv.DictReader(f)
+        )
+    price_history.save()
+    print(f"Imported {count} observations into {price_history.directory}")
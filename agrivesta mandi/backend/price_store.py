@@ -0,0 +1,484 @@
+"""
+In-memory Price Store for Multilingual Mandi.
+
+Loads data/prices.json once, keeps the parsed records together with a
+pre-serialized JSON body, and only touches the disk again when the
+file's mtime or size changes.
+
+Each snapshot also carries a PriceIndex (by item, city, location, trend,
+unit and numeric price) built once at load time, so filtered and paged
+queries never scan the whole file.
+
+WHY: /api/prices is polled on every page view. Re-reading and
+re-serializing the same file per request wastes disk and CPU, and
+without validators browsers cannot revalidate cheaply.
+"""
+import asyncio
+import csv
+import hashlib
+import io
+import json
+import os
+import re
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from email.utils import formatdate
+from pathlib import Path
+from typing import Optional
+
+from compression import compress
+from fast_json import dumps
+
+# Use relative path that works in both dev and production,
+# with the absolute fallback used by the Vercel deployment
+DEFAULT_PRICE_PATHS = (
+    Path(__file__).parent / "data" / "prices.json",
+    Path("backend/data/prices.json"),
+)
+
+# How often (seconds) to stat the file for changes.
+# WHY: Bounds metadata syscalls under heavy polling; 0 means every request.
+RELOAD_CHECK_INTERVAL = float(os.getenv("PRICE_RELOAD_INTERVAL", "1.0"))
+
+
+# Matches strings like "40/kg", "₹ 1,200 / quintal", "15.5/bunch"
+_PRICE_RE = re.compile(r"^\s*(?:₹|rs\.?)?\s*([0-9][0-9,]*(?:\.[0-9]+)?)\s*(?:/\s*(.+?))?\s*$", re.I)
+
+SORT_OPTIONS = ("price", "-price")
+MAX_PAGE_SIZE = 500
+
+# Columns of the CSV export; price_value/unit are parsed from "price"
+EXPORT_COLUMNS = ("item", "price", "location", "trend", "price_value", "unit")
+
+# Rows per streamed chunk - small enough for flat memory, large enough
+# to keep per-write overhead negligible
+EXPORT_CHUNK_ROWS = 500
+
+
+def parse_price(price) -> tuple:
+    """
+    Parses a display price like "40/kg" into its number and unit.
+
+    Args:
+        price: The raw price value from prices.json (string or number)
+
+    Returns:
+        (value, unit) where value is a float or None if unparseable,
+        and unit is a lowercase string or None
+    """
+    if isinstance(price, (int, float)) and not isinstance(price, bool):
+        return float(price), None
+    if not isinstance(price, str):
+        return None, None
+    match = _PRICE_RE.match(price)
+    if not match:
+        return None, None
+    value = float(match.group(1).replace(",", ""))
+    unit = match.group(2).strip().lower() if match.group(2) else None
+    return value, unit
+
+
+def _city_of(location: str) -> str:
+    """Returns the city part of a location like "Azadpur Mandi, Delhi"."""
+    return location.rsplit(",", 1)[-1].strip().lower()
+
+
+class PriceQueryError(ValueError):
+    """Raised for invalid query parameters (bad sort, cursor or range)."""
+
+
+class PriceIndex:
+    """
+    Secondary indexes over a list of price records.
+
+    Equality filters are answered from hash indexes of row ids, price
+    ranges by bisecting the price-sorted id list. Row ids are positions
+    in the original file, so the natural order is preserved.
+    """
+
+    __slots__ = (
+        "by_item", "by_city", "by_location", "by_trend", "by_unit",
+        "price_sorted", "price_keys", "price_rank", "values", "size",
+    )
+
+    def __init__(self, records: list):
+        self.by_item: dict = {}
+        self.by_city: dict = {}
+        self.by_location: dict = {}
+        self.by_trend: dict = {}
+        self.by_unit: dict = {}
+        self.values: list = []
+        self.size = len(records)
+
+        for row_id, record in enumerate(records):
+            if not isinstance(record, dict):
+                self.values.append(None)
+                continue
+            item = str(record.get("item", "")).strip().lower()
+            location = str(record.get("location", "")).strip()
+            trend = str(record.get("trend", "")).strip().lower()
+            value, unit = parse_price(record.get("price"))
+            self.values.append(value)
+
+            self.by_item.setdefault(item, []).append(row_id)
+            if location:
+                self.by_location.setdefault(location.lower(), []).append(row_id)
+                self.by_city.setdefault(_city_of(location), []).append(row_id)
+            if trend:
+                self.by_trend.setdefault(trend, []).append(row_id)
+            if unit:
+                self.by_unit.setdefault(unit, []).append(row_id)
+
+        # Priced rows first in ascending order, unpriced rows last
+        priced = sorted(
+            (i for i, v in enumerate(self.values) if v is not None),
+            key=lambda i: self.values[i],
+        )
+        unpriced = [i for i, v in enumerate(self.values) if v is None]
+        self.price_sorted = priced + unpriced
+        self.price_keys = [self.values[i] for i in priced]
+        self.price_rank = [0] * self.size
+        for rank, row_id in enumerate(self.price_sorted):
+            self.price_rank[row_id] = rank
+
+    def select(
+        self,
+        item: Optional[str] = None,
+        city: Optional[str] = None,
+        location: Optional[str] = None,
+        trend: Optional[str] = None,
+        unit: Optional[str] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        sort: Optional[str] = None,
+    ) -> list:
+        """
+        Returns the ordered row ids matching all given filters.
+
+        Raises:
+            PriceQueryError: On an unknown sort key or an inverted range
+        """
+        if sort is not None and sort not in SORT_OPTIONS:
+            raise PriceQueryError(f"sort must be one of {', '.join(SORT_OPTIONS)}")
+        if min_price is not None and max_price is not None and min_price > max_price:
+            raise PriceQueryError("min_price cannot be greater than max_price")
+
+        # Intersect equality filters, smallest posting list first
+        postings = []
+        for index, key in (
+            (self.by_item, item),
+            (self.by_city, city),
+            (self.by_location, location),
+            (self.by_trend, trend),
+            (self.by_unit, unit),
+        ):
+            if key is not None:
+                postings.append(index.get(key.strip().lower(), ()))
+        candidates = None
+        if postings:
+            postings.sort(key=len)
+            candidates = set(postings[0])
+            for other in postings[1:]:
+                if not candidates:
+                    break
+                candidates.intersection_update(other)
+
+        # Price range as a contiguous rank window in price_sorted
+        ranged = min_price is not None or max_price is not None
+        lo = bisect_left(self.price_keys, min_price) if min_price is not None else 0
+        hi = (
+            bisect_right(self.price_keys, max_price)
+            if max_price is not None
+            else (len(self.price_keys) if ranged else self.size)
+        )
+
+        if candidates is None:
+            if sort is not None or ranged:
+                ids = self.price_sorted[lo:hi]
+                if sort is None:
+                    ids.sort()
+            else:
+                # WHY: range() slices and len()s in O(1) for unfiltered pages
+                ids = range(self.size)
+        else:
+            rank = self.price_rank
+            if ranged:
+                ids = [i for i in candidates if lo <= rank[i] < hi]
+            else:
+                ids = list(candidates)
+            ids.sort(key=(lambda i: rank[i]) if sort is not None else None)
+
+        if sort == "-price":
+            # Descending by price, but unpriced rows stay at the end
+            n_priced = len(self.price_keys)
+            rank = self.price_rank
+            priced = [i for i in ids if rank[i] < n_priced]
+            priced.reverse()
+            ids = priced + [i for i in ids if rank[i] >= n_priced]
+        return ids
+
+
+def apply_trends(records: list, trends: dict) -> list:
+    """
+    Returns records with "trend" replaced by the computed value where known.
+
+    Args:
+        records: Raw records from prices.json (left untouched)
+        trends: Mapping of (item, location) lowercase keys to a trend string
+    """
+    if not trends:
+        return records
+    result = []
+    for record in records:
+        if isinstance(record, dict):
+            key = (
+                str(record.get("item", "")).strip().lower(),
+                str(record.get("location", "")).strip().lower(),
+            )
+            trend = trends.get(key)
+            if trend is not None and trend != record.get("trend"):
+                record = {**record, "trend": trend}
+        result.append(record)
+    return result
+
+
+class PriceSnapshot:
+    """An immutable, fully serialized view of the price file."""
+
+    __slots__ = (
+        "source", "records", "body", "etag", "last_modified",
+        "mtime_ns", "size", "history_version", "index", "_encoded",
+    )
+
+    def __init__(self, source: list, mtime_ns: int, size: int, trends: Optional[dict] = None,
+                 history_version: int = 0, modified_at: float = 0.0):
+        self.source = source
+        self.records = apply_trends(source, trends)
+        records = self.records
+        # Compact UTF-8, the same bytes as the API's JSON responses
+        self.body = dumps(records)
+        self.etag = '"' + hashlib.blake2b(self.body, digest_size=16).hexdigest() + '"'
+        self.last_modified = formatdate(max(mtime_ns / 1e9, modified_at), usegmt=True)
+        self.mtime_ns = mtime_ns
+        self.size = size
+        # Compressed copies of body by encoding, made on first request
+        self._encoded = {}
+        self.history_version = history_version
+        self.index = PriceIndex(records)
+
+    def encoded(self, encoding: str) -> bytes:
+        """
+        The body compressed with `encoding` ("br" or "gzip"), compressed
+        once per snapshot rather than per request.
+        """
+        data = self._encoded.get(encoding)
+        if data is None:
+            data = self._encoded[encoding] = compress(self.body, encoding)
+        return data
+
+    def query(self, limit: int = 50, cursor: Optional[str] = None, **filters) -> dict:
+        """
+        Runs a filtered, paginated query against the snapshot indexes.
+
+        Args:
+            limit: Maximum rows in this page (1..MAX_PAGE_SIZE)
+            cursor: Opaque cursor returned as next_cursor by a previous page
+            **filters: Keyword filters accepted by PriceIndex.select
+
+        Returns:
+            Dict with the page of items, total matches and next_cursor
+
+        Raises:
+            PriceQueryError: On invalid limit, cursor or filters
+        """
+        if limit < 1 or limit > MAX_PAGE_SIZE:
+            raise PriceQueryError(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+        offset = 0
+        if cursor:
+            try:
+                offset = int(cursor)
+            except ValueError:
+                raise PriceQueryError("Invalid cursor")
+            if offset < 0:
+                raise PriceQueryError("Invalid cursor")
+
+        ids = self.index.select(**filters)
+        end = offset + limit
+        return {
+            "items": [self.records[i] for i in ids[offset:end]],
+            "total": len(ids),
+            "next_cursor": str(end) if end < len(ids) else None,
+        }
+
+
+class PriceStore:
+    """
+    Thread-safe cache of the price file.
+
+    Readers get the current snapshot without locking; a reload builds a
+    new snapshot and swaps the reference, so a request never sees a
+    half-loaded file.
+
+    If a history source is attached (see price_history.PriceHistory), the
+    served "trend" values are computed from it and the snapshot is rebuilt
+    whenever the history changes.
+    """
+
+    def __init__(self, paths=DEFAULT_PRICE_PATHS, check_interval: float = RELOAD_CHECK_INTERVAL,
+                 history=None):
+        self.history = history
+        self._paths = tuple(Path(p) for p in paths)
+        self._check_interval = check_interval
+        self._snapshot: Optional[PriceSnapshot] = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+
+    def resolve_path(self) -> Path:
+        """Returns the first existing price file path."""
+        for path in self._paths:
+            if path.exists():
+                return path
+        raise FileNotFoundError(f"Price data not found in {[str(p) for p in self._paths]}")
+
+    def get(self) -> PriceSnapshot:
+        """
+        Returns the current snapshot, reloading if the file changed.
+
+        Raises:
+            FileNotFoundError: If no price file exists and nothing is cached
+            json.JSONDecodeError: If the first load finds malformed JSON
+        """
+        snapshot = self._snapshot
+        now = time.monotonic()
+        if snapshot is not None and now < self._next_check:
+            return snapshot
+
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is not None and now < self._next_check:
+                return snapshot
+            self._next_check = now + self._check_interval
+            try:
+                path = self.resolve_path()
+                stat = path.stat()
+                history = self.history
+                history_version = history.version if history is not None else 0
+                unchanged = (
+                    snapshot is not None
+                    and snapshot.mtime_ns == stat.st_mtime_ns
+                    and snapshot.size == stat.st_size
+                )
+                if unchanged and snapshot.history_version == history_version:
+                    return snapshot
+                if unchanged:
+                    records = snapshot.source
+                else:
+                    with open(path, "r", encoding="utf-8") as f:
+                        records = json.load(f)
+                self._snapshot = PriceSnapshot(
+                    records,
+                    stat.st_mtime_ns,
+                    stat.st_size,
+                    trends=history.trends() if history is not None else None,
+                    history_version=history_version,
+                    modified_at=history.updated_at if history is not None else 0.0,
+                )
+                return self._snapshot
+            except (OSError, ValueError) as e:
+                # WHY: A half-written or briefly missing file should not take
+                # the endpoint down if we already have good data in memory
+                if snapshot is None:
+                    raise
+                print(f"Price reload error (serving cached data): {e}")
+                return snapshot
+
+    async def aget(self) -> PriceSnapshot:
+        """
+        get() for async handlers: the stat and any reload run in a worker
+        thread, never on the event loop.
+
+        WHY: A reload (json.load, index build, pre-serialization) takes
+        long enough to stall every in-flight request, SSE streams
+        included. While one is running, other requests keep getting the
+        current snapshot instead of queueing behind it.
+        """
+        snapshot = self._snapshot
+        if snapshot is not None and (time.monotonic() < self._next_check or self._lock.locked()):
+            return snapshot
+        return await asyncio.to_thread(self.get)
+
+    def invalidate(self) -> None:
+        """Forces the next get() to re-stat the file."""
+        self._next_check = 0.0
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Checks an If-None-Match header against an ETag (weak comparison).
+
+    Args:
+        if_none_match: Raw header value, may list several tags or be "*"
+        etag: The quoted ETag of the current representation
+
+    Returns:
+        True if the client already has this representation
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag == etag:
+            return True
+    return False
+
+
+def export_chunks(records: list, ids, fmt: str = "ndjson", chunk_rows: int = EXPORT_CHUNK_ROWS):
+    """
+    Yields an export of the selected records as encoded chunks.
+
+    WHY: Only one chunk is ever serialized at a time, so memory stays
+    flat regardless of dataset size and the first bytes go out at once.
+
+    Args:
+        records: Snapshot records
+        ids: Ordered row ids to export (e.g. from PriceIndex.select)
+        fmt: "ndjson" or "csv"
+        chunk_rows: Rows per yielded chunk
+
+    Yields:
+        UTF-8 encoded bytes
+    """
+    if fmt == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator="\n")
+        writer.writerow(EXPORT_COLUMNS)
+        yield buffer.getvalue().encode("utf-8")
+    for start in range(0, len(ids), chunk_rows):
+        rows = (records[i] for i in ids[start : start + chunk_rows])
+        if fmt == "csv":
+            buffer.seek(0)
+            buffer.truncate()
+            for record in rows:
+                if not isinstance(record, dict):
+                    continue
+                value, unit = parse_price(record.get("price"))
+                writer.writerow((
+                    record.get("item", ""),
+                    record.get("price", ""),
+                    record.get("location", ""),
+                    record.get("trend", ""),
+                    "" if value is None else f"{value:g}",
+                    unit or "",
+                ))
+            yield buffer.getvalue().encode("utf-8")
+        else:
+            yield b"".join(dumps(record) + b"\n" for record in rows)
+
+
+# Shared store used by the API
+price_store = PriceStore()
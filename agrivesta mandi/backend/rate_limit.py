@@ -0,0 +1,348 @@
+"""
+Per-client rate limiting for Multilingual Mandi.
+
+Every API request is charged against a token bucket keyed by client
+(the X-API-Key if it is one listed in RATE_LIMIT_KEY_WEIGHTS, otherwise
+the client IP). Cheap endpoints (prices,
+health) and model-backed endpoints (translate, chat, ...) have separate
+budgets, configured as "rate_per_second:burst":
+
+    RATE_LIMITS="cheap=20:100,llm=2:20"
+
+Buckets live in process memory, or in a local SQLite file shared by all
+uvicorn workers with RATE_LIMIT_STORE=sqlite.
+
+The client identity and its weight are also published in a context
+variable, which admission.py uses to share model capacity fairly between
+clients (weighted fair queuing) when the queue is contended.
+
+WHY: One scraper calling /api/translate in a loop used to take every
+upstream slot, and everyone else's p99 went with it.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Optional
+
+from cache import DEFAULT_CACHE_DB
+from metrics import registry
+
+# WHY: Generous bursts, since a whole market stall can share one NAT IP
+DEFAULT_RATE_LIMITS = {
+    "cheap": (20.0, 100.0),
+    "llm": (2.0, 20.0),
+}
+
+# Token cost per request; batch translation does many translations at once
+ENDPOINT_COSTS = {
+    "/api/translate/batch": 5.0,
+}
+
+# Endpoints whose cost is a model call; other /api routes are "cheap".
+# detect-language asks the model whenever the local detector is unsure.
+LLM_ENDPOINTS = (
+    "/api/translate",
+    "/api/detect-language",
+    "/api/negotiate",
+    "/api/price-insight",
+    "/api/chat",
+    "/api/smart-phrases",
+)
+# Never limited: scrapers of our own metrics and the static frontend
+EXEMPT_ENDPOINTS = ("/api/metrics",)
+
+RATE_LIMIT_STORE = os.getenv("RATE_LIMIT_STORE", "memory")
+# Use the first X-Forwarded-For hop as the client IP (only behind a trusted proxy)
+TRUST_FORWARDED_FOR = os.getenv("TRUST_FORWARDED_FOR", "0") == "1"
+
+RATE_LIMITED = registry.counter(
+    "mandi_rate_limited_total",
+    "Requests rejected with 429 by the per-client rate limiter.",
+    ("budget",),
+)
+
+# (client id, fair-share weight) of the request being served
+_client: ContextVar[tuple] = ContextVar("mandi_client", default=("anonymous", 1.0))
+
+
+def current_client() -> tuple:
+    """(client id, weight) for the current request, used by fair queuing."""
+    return _client.get()
+
+
+def _parse_limits(spec: str) -> dict:
+    """Parses "cheap=20:100,llm=2:20" into {budget: (rate, burst)}."""
+    limits = dict(DEFAULT_RATE_LIMITS)
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        try:
+            budget, values = part.split("=", 1)
+            rate, _, burst = values.partition(":")
+            limits[budget.strip()] = (float(rate), float(burst or rate))
+        except ValueError:
+            print(f"Ignoring invalid RATE_LIMITS entry: {part}")
+    return limits
+
+
+def _parse_weights(spec: str) -> dict:
+    """Parses "key1=4,key2=2" into {hashed client id: weight}."""
+    weights = {}
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        key, _, weight = part.rpartition("=")
+        try:
+            weights[_key_id(key.strip())] = float(weight)
+        except ValueError:
+            print("Ignoring invalid RATE_LIMIT_KEY_WEIGHTS entry")
+    return weights
+
+
+def _key_id(api_key: str) -> str:
+    # WHY: Raw keys never reach memory dumps, the SQLite file or metrics
+    return "key:" + hashlib.sha256(api_key.encode()).hexdigest()[:16]
+
+
+def budget_of(path: str) -> Optional[str]:
+    """Budget name for a request path, or None if it is not limited."""
+    if not path.startswith("/api/") or path in EXEMPT_ENDPOINTS:
+        return None
+    for prefix in LLM_ENDPOINTS:
+        if path == prefix or path.startswith(prefix + "/"):
+            return "llm"
+    return "cheap"
+
+
+class MemoryBuckets:
+    """Token buckets in a dict, pruned of idle clients."""
+
+    # Drop buckets idle for this long (they would be full again anyway)
+    IDLE_SECONDS = 600
+
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._ops = 0
+
+    def take(self, key: str, rate: float, burst: float, cost: float) -> tuple:
+        """
+        Returns:
+            (allowed, tokens_left, seconds_until_enough_tokens)
+        """
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            self._buckets[key] = (tokens, now)
+            self._ops += 1
+            if self._ops % 1000 == 0:
+                cutoff = now - self.IDLE_SECONDS
+                self._buckets = {k: v for k, v in self._buckets.items() if v[1] >= cutoff}
+        wait = 0.0 if allowed else (cost - tokens) / rate if rate > 0 else float("inf")
+        return allowed, tokens, wait
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+class SQLiteBuckets:
+    """
+    Token buckets in a local SQLite file so all workers share one budget.
+
+    Each take() is one short IMMEDIATE transaction; on any database
+    error the request is allowed (fail open) rather than rejected.
+    """
+
+    PRUNE_EVERY = 1000
+    IDLE_SECONDS = 600
+
+    def __init__(self, path: Path = DEFAULT_CACHE_DB):
+        self.path = Path(path)
+        self._local = threading.local()
+        self._ops = 0
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), timeout=2, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS rate_buckets ("
+                " key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+            )
+            self._local.conn = conn
+        return conn
+
+    def take(self, key: str, rate: float, burst: float, cost: float) -> tuple:
+        now = time.time()
+        try:
+            conn = self._conn()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT tokens, updated FROM rate_buckets WHERE key = ?", (key,)
+                ).fetchone()
+                tokens = burst if row is None else min(burst, row[0] + max(0.0, now - row[1]) * rate)
+                allowed = tokens >= cost
+                if allowed:
+                    tokens -= cost
+                conn.execute(
+                    "INSERT OR REPLACE INTO rate_buckets (key, tokens, updated) VALUES (?, ?, ?)",
+                    (key, tokens, now),
+                )
+                self._ops += 1
+                if self._ops % self.PRUNE_EVERY == 0:
+                    conn.execute("DELETE FROM rate_buckets WHERE updated < ?", (now - self.IDLE_SECONDS,))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        except sqlite3.Error as e:
+            print(f"Rate limit store error: {e}")
+            return True, burst, 0.0
+        wait = 0.0 if allowed else (cost - tokens) / rate if rate > 0 else float("inf")
+        return allowed, tokens, wait
+
+    def __len__(self) -> int:
+        try:
+            return self._conn().execute("SELECT COUNT(*) FROM rate_buckets").fetchone()[0]
+        except sqlite3.Error:
+            return 0
+
+
+class RateLimiter:
+    """
+    Token-bucket limiter over a bucket store.
+
+    Args:
+        limits: {budget: (tokens per second, burst)}
+        store: MemoryBuckets or SQLiteBuckets
+        weights: {client id: fair-share weight}; also the allowlist of API
+            keys, since unlisted keys are identified by IP and weigh 1
+    """
+
+    def __init__(self, limits: dict, store, weights: Optional[dict] = None):
+        self.limits = limits
+        self.store = store
+        self.weights = weights or {}
+        self._blocking = isinstance(store, SQLiteBuckets)
+        self.stats = {budget: {"allowed": 0, "limited": 0} for budget in limits}
+
+    def identify(self, scope: dict) -> str:
+        """
+        Client id: hashed API key if it is a configured one, otherwise
+        the client IP.
+
+        WHY: Unknown keys are ignored rather than trusted; otherwise a
+        client could send a fresh random key per request and get a full
+        bucket (and its own fair-share slot) every time.
+        """
+        headers = dict(scope.get("headers") or ())
+        api_key = headers.get(b"x-api-key")
+        if api_key:
+            key_id = _key_id(api_key.decode("latin-1"))
+            if key_id in self.weights:
+                return key_id
+        if TRUST_FORWARDED_FOR:
+            forwarded = headers.get(b"x-forwarded-for")
+            if forwarded:
+                return "ip:" + forwarded.decode("latin-1").split(",")[0].strip()
+        client = scope.get("client")
+        return "ip:" + (client[0] if client else "unknown")
+
+    async def take(self, client: str, budget: str, cost: float = 1.0) -> tuple:
+        """
+        Charges one request.
+
+        Returns:
+            (allowed, limit, tokens_left, retry_after_seconds)
+        """
+        rate, burst = self.limits[budget]
+        key = f"{budget}|{client}"
+        if self._blocking:
+            allowed, left, wait = await asyncio.to_thread(self.store.take, key, rate, burst, cost)
+        else:
+            allowed, left, wait = self.store.take(key, rate, burst, cost)
+        self.stats[budget]["allowed" if allowed else "limited"] += 1
+        return allowed, burst, left, wait
+
+    def snapshot(self) -> dict:
+        return {
+            "store": "sqlite" if self._blocking else "memory",
+            "limits": {b: {"rate_per_s": r, "burst": bu} for b, (r, bu) in self.limits.items()},
+            "clients": len(self.store),
+            "budgets": self.stats,
+        }
+
+
+class RateLimitMiddleware:
+    """
+    Pure ASGI middleware charging each /api request to its client's
+    bucket and answering 429 with Retry-After when it is empty.
+    """
+
+    def __init__(self, app, limiter: "RateLimiter" = None):
+        self.app = app
+        self.limiter = limiter or rate_limiter
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        path = scope.get("path", "")
+        budget = budget_of(path)
+        if budget is None or scope.get("method") == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+
+        client = self.limiter.identify(scope)
+        allowed, limit, left, wait = await self.limiter.take(
+            client, budget, ENDPOINT_COSTS.get(path, 1.0)
+        )
+        if not allowed:
+            RATE_LIMITED.inc(budget)
+            retry_after = str(max(1, int(wait + 0.999)))
+            body = json.dumps({"detail": "Too many requests. Please slow down."}).encode()
+            await send({
+                "type": "http.response.start",
+                "status": 429,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"retry-after", retry_after.encode()),
+                    (b"x-ratelimit-limit", str(int(limit)).encode()),
+                    (b"x-ratelimit-remaining", b"0"),
+                ],
+            })
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        token = _client.set((client, self.limiter.weights.get(client, 1.0)))
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _client.reset(token)
+
+
+def _build_limiter() -> RateLimiter:
+    if RATE_LIMIT_STORE == "sqlite":
+        store = SQLiteBuckets(Path(os.getenv("RATE_LIMIT_DB_PATH", str(DEFAULT_CACHE_DB))))
+    else:
+        store = MemoryBuckets()
+    return RateLimiter(
+        _parse_limits(os.getenv("RATE_LIMITS", "")),
+        store,
+        _parse_weights(os.getenv("RATE_LIMIT_KEY_WEIGHTS", "")),
+    )
+
+
+# Shared limiter used by the middleware
+rate_limiter = _build_limiter()
@@ -0,0 +1,280 @@
+"""
+Upstream resilience for Multilingual Mandi: circuit breaker and hedging.
+
+- CircuitBreaker: trips OPEN when too many recent Gemini calls failed or
+  were slow, rejects calls instantly with CircuitOpen while open, then
+  lets a few probe calls through (HALF-OPEN) to detect recovery.
+- Hedger: starts a second attempt when the first has not answered
+  within the recent p95 latency; the first success wins.
+
+Latency is tracked per kind of call: FULL for a whole non-streamed
+answer, FIRST_CHUNK for a stream's time to first chunk. The two differ
+by the length of the answer, so each has its own p95 and slow-call
+threshold.
+
+WHY: During a Gemini outage every request used to wait for the SDK to
+give up before returning its canned fallback, so the whole app stalled.
+With the breaker open the existing fallbacks are returned immediately.
+"""
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Awaitable, Callable, Optional
+
+# Deadline for one upstream call, in seconds
+GEMINI_TIMEOUT = float(os.getenv("GEMINI_TIMEOUT", "20"))
+
+# Breaker trips when, over the last BREAKER_WINDOW seconds and at least
+# BREAKER_MIN_CALLS calls, the failure or slow-call ratio passes its limit
+BREAKER_WINDOW = float(os.getenv("BREAKER_WINDOW", "30"))
+BREAKER_MIN_CALLS = int(os.getenv("BREAKER_MIN_CALLS", "10"))
+BREAKER_FAILURE_RATIO = float(os.getenv("BREAKER_FAILURE_RATIO", "0.5"))
+BREAKER_SLOW_CALL = float(os.getenv("BREAKER_SLOW_CALL", "8"))
+# Slow-call threshold for a stream's first chunk
+BREAKER_SLOW_FIRST_CHUNK = float(os.getenv("BREAKER_SLOW_FIRST_CHUNK", "4"))
+BREAKER_SLOW_RATIO = float(os.getenv("BREAKER_SLOW_RATIO", "0.8"))
+# Seconds to stay open before probing, and probes allowed while half-open
+BREAKER_OPEN_FOR = float(os.getenv("BREAKER_OPEN_FOR", "15"))
+BREAKER_PROBES = int(os.getenv("BREAKER_PROBES", "2"))
+
+# Hedged requests are opt-in: they trade extra upstream calls for a shorter tail
+GEMINI_HEDGE = os.getenv("GEMINI_HEDGE", "0") == "1"
+# Never hedge sooner than this, and never more than this share of calls
+HEDGE_MIN_DELAY = float(os.getenv("GEMINI_HEDGE_MIN_DELAY", "0.5"))
+HEDGE_MAX_RATIO = float(os.getenv("GEMINI_HEDGE_MAX_RATIO", "0.1"))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Kinds of call, each with its own latency window
+FULL = "full"
+FIRST_CHUNK = "first_chunk"
+
+
+class CircuitOpen(Exception):
+    """Raised instead of calling upstream while the breaker is open."""
+
+    def __init__(self, name: str, retry_in: float):
+        super().__init__(f"{name} circuit open, retry in {retry_in:.1f}s")
+        self.name = name
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    """
+    Rolling-window circuit breaker with half-open probing.
+
+    Callers check allow() before calling upstream and report the outcome
+    with record(), passing back the generation allow() returned. Outcomes
+    older than `window` seconds are forgotten.
+
+    The generation changes on every state transition, and outcomes from
+    an older one are ignored: a call admitted before a trip that finishes
+    after the next half-open began must not count as that round's probe.
+    """
+
+    def __init__(self, name: str, window: float = BREAKER_WINDOW, min_calls: int = BREAKER_MIN_CALLS,
+                 failure_ratio: float = BREAKER_FAILURE_RATIO, slow_call: float = BREAKER_SLOW_CALL,
+                 slow_ratio: float = BREAKER_SLOW_RATIO, open_for: float = BREAKER_OPEN_FOR,
+                 probes: int = BREAKER_PROBES, slow_first_chunk: float = BREAKER_SLOW_FIRST_CHUNK):
+        self.name = name
+        self.window = window
+        self.min_calls = min_calls
+        self.failure_ratio = failure_ratio
+        self.slow_calls = {FULL: slow_call, FIRST_CHUNK: slow_first_chunk}
+        self.slow_ratio = slow_ratio
+        self.open_for = open_for
+        self.probes = probes
+        self.state = CLOSED
+        self.generation = 0
+        self.opened_at = 0.0
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+        # (timestamp, ok, slow) per call inside the window
+        self._outcomes: deque = deque()
+        # Recent successful latencies per kind, for p95 and hedging
+        self._latencies = {FULL: deque(maxlen=512), FIRST_CHUNK: deque(maxlen=512)}
+        self.rejected = 0
+        self.trips = 0
+
+    def _trim(self, now: float) -> None:
+        while self._outcomes and self._outcomes[0][0] < now - self.window:
+            self._outcomes.popleft()
+
+    def _enter(self, state: str) -> None:
+        self.state = state
+        self.generation += 1
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+
+    def _trip(self, now: float) -> None:
+        if self.state != OPEN:
+            self.trips += 1
+            print(f"Circuit {self.name} OPEN")
+        self._enter(OPEN)
+        self.opened_at = now
+
+    def allow(self) -> int:
+        """
+        Admits one upstream call or raises.
+
+        Returns:
+            The generation to pass to record() or release()
+
+        Raises:
+            CircuitOpen: While open, or when half-open probes are used up
+        """
+        if self.state == CLOSED:
+            return self.generation
+        now = time.monotonic()
+        if self.state == OPEN:
+            retry_in = self.opened_at + self.open_for - now
+            if retry_in > 0:
+                self.rejected += 1
+                raise CircuitOpen(self.name, retry_in)
+            self._enter(HALF_OPEN)
+            print(f"Circuit {self.name} HALF-OPEN")
+        if self._probes_in_flight >= self.probes:
+            self.rejected += 1
+            raise CircuitOpen(self.name, 1)
+        self._probes_in_flight += 1
+        return self.generation
+
+    def record(self, ok: bool, duration: float, generation: int, kind: str = FULL) -> None:
+        """
+        Reports the outcome of a call admitted by allow().
+
+        Args:
+            ok: Whether the call succeeded
+            duration: Seconds until the answer (FULL) or first chunk (FIRST_CHUNK)
+            generation: What allow() returned for this call
+            kind: Which latency window and slow-call threshold apply
+        """
+        now = time.monotonic()
+        slow = duration >= self.slow_calls[kind]
+        if ok:
+            # Latency samples stay valid whatever the state has become
+            self._latencies[kind].append(duration)
+        if generation != self.generation:
+            # Admitted before the last state change (e.g. a probe from an
+            # earlier half-open); its outcome says nothing about this one
+            return
+
+        if self.state == HALF_OPEN:
+            self._probes_in_flight = max(0, self._probes_in_flight - 1)
+            if not ok or slow:
+                self._trip(now)
+                return
+            self._probe_successes += 1
+            if self._probe_successes >= self.probes:
+                print(f"Circuit {self.name} CLOSED")
+                self._enter(CLOSED)
+                self._outcomes.clear()
+            return
+
+        self._outcomes.append((now, ok, slow))
+        self._trim(now)
+        calls = len(self._outcomes)
+        if calls < self.min_calls:
+            return
+        failures = sum(1 for _, good, _ in self._outcomes if not good)
+        slow_calls = sum(1 for _, _, was_slow in self._outcomes if was_slow)
+        if failures / calls >= self.failure_ratio or slow_calls / calls >= self.slow_ratio:
+            self._trip(now)
+
+    def release(self, generation: int) -> None:
+        """Frees a half-open probe whose call ended without an outcome (cancelled)."""
+        if self.state == HALF_OPEN and generation == self.generation:
+            self._probes_in_flight = max(0, self._probes_in_flight - 1)
+
+    def p95(self, kind: str = FULL) -> Optional[float]:
+        """95th percentile of recent successful latencies of a kind, or None if too few."""
+        latencies = self._latencies[kind]
+        if len(latencies) < 20:
+            return None
+        ordered = sorted(latencies)
+        return ordered[int(len(ordered) * 0.95) - 1]
+
+    def snapshot(self) -> dict:
+        """State and counters for the health endpoint."""
+        now = time.monotonic()
+        self._trim(now)
+        calls = len(self._outcomes)
+        p95 = self.p95(FULL)
+        p95_first_chunk = self.p95(FIRST_CHUNK)
+        return {
+            "state": self.state,
+            "window_calls": calls,
+            "window_failure_ratio": round(
+                sum(1 for _, ok, _ in self._outcomes if not ok) / calls, 4
+            ) if calls else 0.0,
+            "trips": self.trips,
+            "rejected": self.rejected,
+            "open_remaining_s": round(max(0.0, self.opened_at + self.open_for - now), 1)
+            if self.state == OPEN else 0.0,
+            "p95_latency_s": round(p95, 3) if p95 is not None else None,
+            "p95_first_chunk_s": round(p95_first_chunk, 3) if p95_first_chunk is not None else None,
+        }
+
+
+class Hedger:
+    """
+    Runs a call and, if it is still pending after `delay`, a second copy.
+
+    The first attempt to succeed wins and the other is cancelled. If one
+    attempt fails, the other keeps running. Hedges are capped at
+    max_ratio of all calls so a slow upstream is not doubled in load.
+    """
+
+    def __init__(self, enabled: bool = GEMINI_HEDGE, min_delay: float = HEDGE_MIN_DELAY,
+                 max_ratio: float = HEDGE_MAX_RATIO):
+        self.enabled = enabled
+        self.min_delay = min_delay
+        self.max_ratio = max_ratio
+        self.calls = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    async def run(self, fn: Callable[[], Awaitable], delay: Optional[float]):
+        """
+        Args:
+            fn: Zero-argument coroutine function performing one attempt
+            delay: Seconds before hedging (e.g. the p95); None disables it
+        """
+        self.calls += 1
+        if not self.enabled or delay is None:
+            return await fn()
+        tasks = [asyncio.ensure_future(fn())]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=max(delay, self.min_delay))
+            if done or self.hedges >= self.calls * self.max_ratio:
+                return await tasks[0]
+
+            self.hedges += 1
+            tasks.append(asyncio.ensure_future(fn()))
+            pending = set(tasks)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is tasks[1]:
+                            self.hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            # The loser, or every attempt if our caller was cancelled
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    def snapshot(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "calls": self.calls,
+            "hedged": self.hedges,
+            "hedge_wins": self.hedge_wins,
+        }
@@ -10,21 +10,52 @@ Features:
 - Graceful error handling with fallbacks
 
 Updated to use google-genai SDK with gemini-3-flash-preview (2026)
+Model calls go through the SDK's native async client, with per-endpoint
+admission control (admission.py) and in-flight coalescing (singleflight.py).
+The SDK is imported and the client built on first use (get_client), so
+endpoints that never call the model start without paying for it.
 """
 import os
+import re
+import json
 import asyncio
-from google import genai
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
 from dotenv import load_dotenv
 
+from fair_price import describe_verdict, describe_band
+from cache import LRUCache, SQLiteCache, TieredCache, normalize_text
+from lang_detect import detect_language_local
+from singleflight import SingleFlight
+from admission import admission, Overloaded
+from phrase_bank import phrase_bank, phrase_key
+from fuzzy_cache import FuzzyAnswerCache
+from resilience import CircuitBreaker, Hedger, GEMINI_TIMEOUT, CLOSED, FIRST_CHUNK, FULL
+from metrics import upstream_span, set_language, mark_cache, record_fallback
+from chat_sessions import chat_sessions, fallback_summary, Session, CHAT_SUMMARY_TOKENS
+
 load_dotenv()
 
-# Initialize the Gemini client
-# WHY: Using the new google-genai SDK as recommended by Google
-client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
+# Gemini client, created by get_client() on first use
+_client = None
+_client_lock = threading.Lock()
 
 # Model to use - gemini-3-flash-preview for best performance (per Google docs 2026)
 MODEL_NAME = "gemini-3-flash-preview"
 
+# Execution mode: "async" (native async client) or "threads" (sized pool)
+GEMINI_EXECUTOR = os.getenv("GEMINI_EXECUTOR", "async")
+_executor = (
+    ThreadPoolExecutor(
+        max_workers=int(os.getenv("GEMINI_THREADS", "64")),
+        thread_name_prefix="gemini"
+    )
+    if GEMINI_EXECUTOR == "threads"
+    else None
+)
+
 # Supported languages with their native scripts
 SUPPORTED_LANGUAGES = {
     "Hindi": "हिंदी",
@@ -38,14 +69,82 @@ SUPPORTED_LANGUAGES = {
     "English": "English"
 }
 
+# Below this local confidence, language detection asks Gemini instead
+LANG_DETECT_MIN_CONFIDENCE = float(os.getenv("LANG_DETECT_MIN_CONFIDENCE", "0.9"))
+
+# Translation memory: in-process LRU in front of a shared SQLite tier
+# WHY: Market phrases repeat constantly; a hit skips the Gemini round trip
+translation_memory = TieredCache(
+    "translation",
+    LRUCache(
+        max_entries=int(os.getenv("TRANSLATION_CACHE_SIZE", "5000")),
+        ttl=float(os.getenv("TRANSLATION_CACHE_TTL", "86400")),
+    ),
+    SQLiteCache(
+        "translation",
+        ttl=float(os.getenv("TRANSLATION_DB_TTL", str(30 * 86400))),
+        max_rows=int(os.getenv("TRANSLATION_DB_MAX_ROWS", "200000")),
+    ),
+)
+
+
+def get_client():
+    """
+    Returns the Gemini client, importing the SDK and creating it on first use.
+    WHY: Importing google.genai and building its HTTP transport takes
+    ~0.6 s, which every serverless cold start used to pay even for
+    /api/health and /api/prices. The HTTP timeout also frees "threads"
+    mode workers that asyncio cannot cancel.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from google import genai
+                _client = genai.Client(
+                    api_key=os.getenv("GEMINI_API_KEY"),
+                    http_options={"timeout": int(GEMINI_TIMEOUT * 1000)}
+                )
+    return _client
+
+
+async def _async_client():
+    """get_client() for coroutines; the first call builds it off the event loop."""
+    if _client is not None:
+        return _client
+    return await asyncio.to_thread(get_client)
+
 
 def _sync_generate(prompt: str) -> str:
     """
     Synchronous wrapper for Gemini API call.
-    WHY: The google-genai SDK is synchronous, we wrap it for async endpoints.
+    WHY: Used by the "threads" executor mode, which runs the sync client
+    in a dedicated, sized pool instead of the default executor.
+    """
+    try:
+        response = get_client().models.generate_content(
+            model=MODEL_NAME,
+            contents=prompt
+        )
+        return response.text.strip()
+    except Exception as e:
+        print(f"Gemini API error: {e}")
+        raise
+
+
+async def _call_model(prompt: str) -> str:
+    """
+    Performs one upstream Gemini call.
+    WHY: The SDK's native async client keeps thousands of calls in flight
+    without tying up threads; GEMINI_EXECUTOR=threads switches to a sized
+    pool for environments where the async transport misbehaves.
     """
+    if _executor is not None:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_executor, _sync_generate, prompt)
     try:
-        response = client.models.generate_content(
+        client = await _async_client()
+        response = await client.aio.models.generate_content(
             model=MODEL_NAME,
             contents=prompt
         )
@@ -55,6 +154,161 @@ def _sync_generate(prompt: str) -> str:
         raise
 
 
+# Identical prompts in flight at the same time share one upstream call
+prompt_flight = SingleFlight()
+
+# Trips on upstream errors or slowness so callers fall back at once
+gemini_breaker = CircuitBreaker("gemini")
+# Optional second attempt for calls slower than the recent p95
+gemini_hedger = Hedger()
+
+
+async def _attempt(prompt: str) -> str:
+    """One upstream call bounded by GEMINI_TIMEOUT."""
+    try:
+        return await asyncio.wait_for(_call_model(prompt), timeout=GEMINI_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise TimeoutError(f"Gemini call exceeded {GEMINI_TIMEOUT:g}s deadline")
+
+
+async def _guarded_call(prompt: str) -> str:
+    """
+    Upstream call through the circuit breaker, with an optional hedge.
+    
+    Raises:
+        CircuitOpen: Immediately while the breaker is open, so the caller
+            returns its fallback without waiting on a failing upstream
+    """
+    generation = gemini_breaker.allow()
+    started = time.monotonic()
+    hedge_after = gemini_breaker.p95(FULL) if gemini_breaker.state == CLOSED else None
+    try:
+        result = await gemini_hedger.run(lambda: _attempt(prompt), hedge_after)
+    except asyncio.CancelledError:
+        gemini_breaker.release(generation)
+        raise
+    except Exception:
+        gemini_breaker.record(False, time.monotonic() - started, generation, FULL)
+        raise
+    gemini_breaker.record(True, time.monotonic() - started, generation, FULL)
+    return result
+
+
+async def _generate(prompt: str, kind: str = "chat") -> str:
+    """
+    Async entry point for every Gemini call.
+    WHY: Coalesces concurrent identical prompts into one upstream call,
+    then admits it through the bulkhead of its endpoint class and the
+    circuit breaker. Errors (including Overloaded) propagate to every
+    waiter.
+    
+    Args:
+        prompt: Full model prompt
+        kind: Endpoint class for admission control (see admission.py)
+    """
+    def call():
+        return admission.run(kind, lambda: _timed_call(prompt))
+
+    if prompt_flight.running(prompt):
+        # Joining another request's call, which already holds or awaits its
+        # slot: the whole wait is on that call
+        with upstream_span():
+            return await prompt_flight.do(prompt, call)
+    # Our own call: upstream time starts once the slot is granted
+    return await prompt_flight.do(prompt, call)
+
+
+async def _timed_call(prompt: str) -> str:
+    """_guarded_call() counted as upstream time; queue wait is metered separately."""
+    with upstream_span():
+        return await _guarded_call(prompt)
+
+
+async def _stream_model(prompt: str, kind: str):
+    """
+    Streams one Gemini completion, holding an admission slot throughout.
+    
+    Closing this generator (e.g. on client disconnect) closes the
+    upstream stream, which cancels the model call.
+    
+    Yields:
+        Text chunks as they arrive
+    """
+    async with admission.slot(kind):
+        if _executor is not None:
+            # The sync client cannot stream across threads; send it whole
+            yield await _timed_call(prompt)
+            return
+        # Counted from the granted slot, so queue wait is not upstream time
+        with upstream_span():
+            generation = gemini_breaker.allow()
+            started = time.monotonic()
+            first_chunk = None
+            try:
+                client = await _async_client()
+                stream = await asyncio.wait_for(
+                    client.aio.models.generate_content_stream(
+                        model=MODEL_NAME,
+                        contents=prompt
+                    ),
+                    timeout=GEMINI_TIMEOUT
+                )
+                try:
+                    chunks = stream.__aiter__()
+                    while True:
+                        # The deadline applies to each gap between chunks
+                        try:
+                            chunk = await asyncio.wait_for(chunks.__anext__(), timeout=GEMINI_TIMEOUT)
+                        except StopAsyncIteration:
+                            break
+                        if first_chunk is None:
+                            first_chunk = time.monotonic() - started
+                        if chunk.text:
+                            yield chunk.text
+                finally:
+                    aclose = getattr(stream, "aclose", None)
+                    if aclose is not None:
+                        await aclose()
+            except (asyncio.CancelledError, GeneratorExit):
+                gemini_breaker.release(generation)
+                raise
+            except Exception:
+                gemini_breaker.record(False, time.monotonic() - started, generation, FIRST_CHUNK)
+                raise
+            # Time to first chunk is what users feel, so the breaker judges that
+            # (against its own window, not full answer times)
+            duration = first_chunk if first_chunk is not None else time.monotonic() - started
+            gemini_breaker.record(True, duration, generation, FIRST_CHUNK)
+
+
+async def _stream_with_fallback(prompt: str, kind: str, fallback: str):
+    """
+    Streams a completion, degrading to the canned fallback on failure.
+    
+    Yields:
+        ("delta", text) per chunk. If the stream fails - before or after
+        the first chunk - ("fallback", fallback) follows, and the client
+        should replace whatever it has shown with that text.
+    
+    Raises:
+        Overloaded: If no admission slot is available (before any output)
+    """
+    try:
+        async for text in _stream_model(prompt, kind):
+            yield ("delta", text)
+    except Overloaded:
+        raise
+    except Exception as e:
+        print(f"Gemini stream error: {e}")
+        record_fallback(kind)
+        yield ("fallback", fallback)
+
+
+def _translation_key(text: str, target_lang: str) -> str:
+    """Translation memory key: target language + normalized text."""
+    return f"{target_lang}\x1f{normalize_text(text)}"
+
+
 async def translate_text(text: str, target_lang: str) -> str:
     """
     Translates input text to the target Indian regional language.
@@ -72,6 +326,13 @@ async def translate_text(text: str, target_lang: str) -> str:
     # Validate target language
     if target_lang not in SUPPORTED_LANGUAGES:
         return f"[Unsupported language: {target_lang}]"
+    set_language(target_lang)
+    
+    cache_key = _translation_key(text, target_lang)
+    cached = await translation_memory.get(cache_key)
+    mark_cache("translation", cached is not None)
+    if cached is not None:
+        return cached
     
     native_name = SUPPORTED_LANGUAGES[target_lang]
     
@@ -92,34 +353,190 @@ Text to translate:
 {text}"""
 
     try:
-        result = await asyncio.to_thread(_sync_generate, prompt)
+        result = await _generate(prompt, "translate")
         # Clean up any quotes or prefixes that might slip through
         result = result.strip('"\'')
         if result.lower().startswith("translation:"):
             result = result[12:].strip()
+        if result:
+            await translation_memory.set(cache_key, result)
         return result
+    except Overloaded:
+        # WHY: Shed load with a fast 503 instead of a canned answer
+        raise
     except Exception as e:
         print(f"Translation error: {e}")
+        record_fallback("translate")
         # WHY: Graceful degradation - return original text with error marker
         return f"[Translation failed] {text}"
 
 
-async def get_negotiation_advice(item: str, vendor_price: str, market_price: str, language: str = "Hinglish") -> str:
+# Batch translation packing limits
+# WHY: Bounded outputs per call keep responses well inside the model's
+# output budget, so a 50 x 8 catalogue needs ~4 calls instead of 400
+BATCH_MAX_OUTPUTS_PER_CALL = int(os.getenv("BATCH_MAX_OUTPUTS_PER_CALL", "120"))
+BATCH_MAX_CHARS_PER_CALL = int(os.getenv("BATCH_MAX_CHARS_PER_CALL", "8000"))
+BATCH_RETRIES = int(os.getenv("BATCH_RETRIES", "2"))
+
+_JSON_FENCE_RE = re.compile(r"^```(?:json)?\s*|\s*```$")
+
+
+def _pack_batches(jobs: list) -> list:
     """
-    Provides fair price advice and negotiation strategies in the specified language.
+    Groups (text_id, text, [langs]) jobs into calls within the limits.
+
+    A job whose languages exceed one call is split across calls.
+    """
+    calls, current, outputs, chars = [], [], 0, 0
+    for text_id, text, langs in jobs:
+        for i in range(0, len(langs), BATCH_MAX_OUTPUTS_PER_CALL):
+            part = langs[i : i + BATCH_MAX_OUTPUTS_PER_CALL]
+            if current and (
+                outputs + len(part) > BATCH_MAX_OUTPUTS_PER_CALL
+                or chars + len(text) > BATCH_MAX_CHARS_PER_CALL
+            ):
+                calls.append(current)
+                current, outputs, chars = [], 0, 0
+            current.append((text_id, text, part))
+            outputs += len(part)
+            chars += len(text)
+    if current:
+        calls.append(current)
+    return calls
+
+
+async def _translate_packed(call: list) -> dict:
+    """
+    Translates one packed call with a single model request.
+
+    Returns:
+        Dict mapping (text_id, lang) to a translation for every entry the
+        model returned valid output for; missing entries are left out
+    """
+    langs = sorted({lang for _, _, ls in call for lang in ls})
+    lang_list = ", ".join(f"{lang} ({SUPPORTED_LANGUAGES[lang]})" for lang in langs)
+    entries = {
+        str(text_id): {"text": text, "languages": ls} for text_id, text, ls in call
+    }
+    prompt = f"""You are an expert translator specializing in Indian regional languages for market/trade contexts.
+
+Translate each entry below into every language listed in its "languages" field.
+Languages used: {lang_list}
+
+CRITICAL RULES:
+1. Preserve the original meaning, tone, and intent precisely
+2. Use natural, conversational language as spoken by native speakers in markets
+3. Keep numbers as numerals (don't spell them out)
+4. For market/trade terms, use commonly understood local vocabulary
+5. Maintain any pricing format (₹50/kg stays as ₹50/kg with translated unit if needed)
+
+OUTPUT FORMAT:
+Return ONLY a JSON object, no markdown, no explanations. Use the entry ids as keys,
+each mapping language name to the translated text, e.g. {{"0": {{"Hindi": "...", "Tamil": "..."}}}}
+
+Entries:
+{json.dumps(entries, ensure_ascii=False)}"""
+
+    raw = await _generate(prompt, "translate")
+    try:
+        parsed = json.loads(_JSON_FENCE_RE.sub("", raw.strip()))
+    except ValueError:
+        print("Batch translation error: model returned invalid JSON")
+        return {}
+    if not isinstance(parsed, dict):
+        return {}
+
+    results = {}
+    for text_id, _text, ls in call:
+        row = parsed.get(str(text_id))
+        if not isinstance(row, dict):
+            continue
+        for lang in ls:
+            value = row.get(lang)
+            if isinstance(value, str) and value.strip():
+                results[(text_id, lang)] = value.strip().strip('"\'')
+    return results
+
+
+async def translate_batch(texts: list, target_langs: list) -> dict:
+    """
+    Translates many texts into many languages with as few model calls
+    as possible.
     
-    WHY: Helping both vendors and buyers reach a fair deal by providing
-    market-aware suggestions in accessible format and their preferred language.
+    Cache hits are served per entry; misses are packed into delimited
+    JSON requests, validated and split, and only the entries that came
+    back missing or malformed are retried.
     
     Args:
-        item: The produce/item being negotiated
-        vendor_price: The price the vendor is asking
-        market_price: Reference market price (or "standard" to use AI's knowledge)
-        language: Language for the response
+        texts: Texts to translate
+        target_langs: Target language names
     
     Returns:
-        Negotiation advice in the specified language with native script
+        Dict with per-text translations and batch statistics
     """
+    set_language("multi" if len(target_langs) > 1 else (target_langs or [None])[0])
+    results = {}
+    stats = {"cached": 0, "translated": 0, "failed": 0, "upstream_calls": 0}
+    
+    pending = {}
+    for text_id, text in enumerate(texts):
+        for lang in target_langs:
+            if lang not in SUPPORTED_LANGUAGES:
+                results[(text_id, lang)] = f"[Unsupported language: {lang}]"
+                stats["failed"] += 1
+                continue
+            cached = await translation_memory.get(_translation_key(text, lang))
+            mark_cache("translation", cached is not None)
+            if cached is not None:
+                results[(text_id, lang)] = cached
+                stats["cached"] += 1
+            else:
+                pending.setdefault(text_id, []).append(lang)
+    
+    for _attempt in range(1 + BATCH_RETRIES):
+        if not pending:
+            break
+        calls = _pack_batches([(i, texts[i], langs) for i, langs in pending.items()])
+        stats["upstream_calls"] += len(calls)
+        outcomes = await asyncio.gather(
+            *(_translate_packed(call) for call in calls), return_exceptions=True
+        )
+        for outcome in outcomes:
+            if isinstance(outcome, Overloaded):
+                raise outcome
+            if isinstance(outcome, Exception):
+                print(f"Batch translation error: {outcome}")
+                continue
+            for (text_id, lang), translated in outcome.items():
+                if lang not in pending.get(text_id, ()):
+                    continue
+                results[(text_id, lang)] = translated
+                stats["translated"] += 1
+                pending[text_id].remove(lang)
+                await translation_memory.set(_translation_key(texts[text_id], lang), translated)
+        pending = {i: langs for i, langs in pending.items() if langs}
+    
+    for text_id, langs in pending.items():
+        for lang in langs:
+            # WHY: Graceful degradation - same marker as translate_text
+            results[(text_id, lang)] = f"[Translation failed] {texts[text_id]}"
+            stats["failed"] += 1
+    
+    return {
+        "translations": [
+            {
+                "text": text,
+                "translations": {lang: results[(text_id, lang)] for lang in target_langs},
+            }
+            for text_id, text in enumerate(texts)
+        ],
+        "stats": stats,
+    }
+
+
+def _negotiation_prompt(item: str, vendor_price: str, market_price: str, language: str,
+                        assessment: Optional[dict] = None) -> str:
+    """Builds the negotiation prompt shared by the buffered and streaming paths."""
     lang_instruction = ""
     if language == "Hinglish":
         lang_instruction = """Respond in Hinglish (natural mix of Hindi and English, written in Roman script).
@@ -160,17 +577,26 @@ Use respectful terms like 'ਭਾਜੀ' (bhaji) or 'ਵੀਰੇ' (veere) for v
     else:
         lang_instruction = "Respond in simple, friendly English suitable for Indian markets."
     
+    if assessment:
+        # WHY: The verdict is computed locally from real mandi data;
+        # the model must phrase it, not second-guess it
+        market_reference = f"{describe_verdict(item, assessment)} This verdict is final - do not change it."
+        verdict_step = f"1. Quick verdict: say the price is {assessment['verdict']} (1 line)"
+    else:
+        market_reference = market_price if market_price != "standard" else "Use your knowledge of typical January 2026 Indian market prices for this item"
+        verdict_step = "1. Quick verdict: Is this price fair, slightly high, or overpriced? (1 line)"
+    
     prompt = f"""You are a friendly, street-smart market expert helping with price negotiations at an Indian mandi (local vegetable/fruit market).
 
 SCENARIO:
 - Item: {item}
 - Vendor's asking price: {vendor_price}
-- Market reference: {market_price if market_price != "standard" else "Use your knowledge of typical January 2026 Indian market prices for this item"}
+- Market reference: {market_reference}
 
 {lang_instruction}
 
 Provide PRACTICAL negotiation advice:
-1. Quick verdict: Is this price fair, slightly high, or overpriced? (1 line)
+{verdict_step}
 2. A ready-to-use negotiation phrase the buyer can say directly to the vendor (make it natural!)
 3. One smart tip (bulk discount, quality check, timing, etc.)
 
@@ -180,19 +606,73 @@ STYLE:
 - NO markdown, NO bullet points, NO asterisks
 - Write as flowing text, like someone speaking
 - Remember: respectful bargaining is an art form in Indian markets! 🙏"""
+    return prompt
+
+
+def _negotiation_fallback(language: str, item: Optional[str] = None) -> str:
+    """
+    Advice used when the model call fails: a banked "high price" phrase
+    for the item when we have one, otherwise canned text.
+    """
+    if item:
+        banked = phrase_bank.get(phrase_key(item, "high price", language))
+        if banked:
+            return banked.strip().splitlines()[0]
+    if language == "Hindi":
+        return "भाई साहब, थोड़ा कम कर दीजिए। बाज़ार में देखकर आया हूँ, ₹10-15 कम में मिल रहा है। रोज़ का ग्राहक बनूँगा! 🙏"
+    elif language == "Tamil":
+        return "அண்ணா, கொஞ்சம் குறைங்க. தினமும் வாங்குவேன். நல்ல விலைக்கு கொடுங்க! 🙏"
+    else:
+        return "Bhaiya, thoda kam kar do na. Market mein dekh ke aaya hoon, ₹10-15 kam mein mil raha hai. Regular customer ban jayenge! 🙏"
+
+
+async def get_negotiation_advice(item: str, vendor_price: str, market_price: str, language: str = "Hinglish",
+                                 assessment: Optional[dict] = None) -> str:
+    """
+    Provides fair price advice and negotiation strategies in the specified language.
+    
+    WHY: Helping both vendors and buyers reach a fair deal by providing
+    market-aware suggestions in accessible format and their preferred language.
+    
+    Args:
+        item: The produce/item being negotiated
+        vendor_price: The price the vendor is asking
+        market_price: Reference market price (or "standard" to use AI's knowledge)
+        language: Language for the response
+        assessment: Local verdict from fair_price.FairPriceEngine.assess; when
+            given, the model only phrases it instead of judging the price
+    
+    Returns:
+        Negotiation advice in the specified language with native script
+    """
+    set_language(language)
+    prompt = _negotiation_prompt(item, vendor_price, market_price, language, assessment)
 
     try:
-        result = await asyncio.to_thread(_sync_generate, prompt)
+        result = await _generate(prompt, "negotiate")
         return result
+    except Overloaded:
+        raise
     except Exception as e:
         print(f"Negotiation advice error: {e}")
+        record_fallback("negotiate")
         # WHY: Fallback advice when API fails
-        if language == "Hindi":
-            return "भाई साहब, थोड़ा कम कर दीजिए। बाज़ार में देखकर आया हूँ, ₹10-15 कम में मिल रहा है। रोज़ का ग्राहक बनूँगा! 🙏"
-        elif language == "Tamil":
-            return "அண்ணா, கொஞ்சம் குறைங்க. தினமும் வாங்குவேன். நல்ல விலைக்கு கொடுங்க! 🙏"
-        else:
-            return "Bhaiya, thoda kam kar do na. Market mein dekh ke aaya hoon, ₹10-15 kam mein mil raha hai. Regular customer ban jayenge! 🙏"
+        return _negotiation_fallback(language, item)
+
+
+async def stream_negotiation_advice(item: str, vendor_price: str, market_price: str, language: str = "Hinglish",
+                                    assessment: Optional[dict] = None):
+    """
+    Streaming variant of get_negotiation_advice.
+    
+    Yields:
+        ("delta", text) chunks as the model produces them, then possibly
+        ("fallback", text) if the stream fails - see _stream_with_fallback
+    """
+    set_language(language)
+    prompt = _negotiation_prompt(item, vendor_price, market_price, language, assessment)
+    async for event in _stream_with_fallback(prompt, "negotiate", _negotiation_fallback(language, item)):
+        yield event
 
 
 async def detect_language(text: str) -> str:
@@ -208,6 +688,13 @@ async def detect_language(text: str) -> str:
     Returns:
         Detected language name
     """
+    # WHY: Script ranges + a bundled n-gram model settle almost every
+    # input locally; Gemini is only asked when that guess is uncertain
+    local_lang, confidence = detect_language_local(text)
+    if local_lang and confidence >= LANG_DETECT_MIN_CONFIDENCE:
+        return local_lang
+    fallback = local_lang or "Hindi"
+    
     prompt = f"""Identify the language of this text. 
 Respond with ONLY ONE word - the language name from this exact list:
 Hindi, Tamil, Telugu, Bengali, Marathi, Kannada, Gujarati, Punjabi, English
@@ -217,63 +704,80 @@ Just the language name, nothing else. No punctuation.
 Text: {text}"""
 
     try:
-        result = await asyncio.to_thread(_sync_generate, prompt)
+        result = await _generate(prompt, "detect")
         detected = result.strip()
         # Validate response - clean up any extra text
         for lang in SUPPORTED_LANGUAGES:
             if lang.lower() in detected.lower():
                 return lang
-        return "Hindi"  # Default fallback
+        return fallback
     except Exception as e:
         print(f"Language detection error: {e}")
-        return "Hindi"
+        record_fallback("detect")
+        return fallback
 
 
-async def get_price_insight(item: str, location: str = "India") -> str:
+async def get_price_insight(item: str, location: str = "India", band: Optional[dict] = None) -> str:
     """
     Gets AI-powered insights about commodity prices.
     
     Args:
         item: The item to get insights for
         location: The market location
+        band: Local fair-price band from fair_price.FairPriceEngine.band;
+            when given, the model uses it instead of estimating prices
     
     Returns:
         Price insight and tips
     """
+    if band:
+        price_step = f"1. Today's mandi data: {describe_band(item, band)} State this range as-is."
+        estimate_rule = "Use only the price figures given above."
+    else:
+        price_step = "1. What's the typical retail price range per kg?"
+        estimate_rule = "If you're unsure about exact prices, give a reasonable estimate based on typical Indian market prices."
+    
     prompt = f"""You are a market analyst expert for Indian agricultural markets and mandis.
 
 For the item "{item}" in {location} markets (January 2026 season):
 
-1. What's the typical retail price range per kg?
+{price_step}
 2. Is it currently in season or off-season?
 3. One insider buying tip for getting the best deal
 
 Keep response under 60 words, conversational tone.
 No markdown formatting.
-If you're unsure about exact prices, give a reasonable estimate based on typical Indian market prices."""
+{estimate_rule}"""
 
     try:
-        result = await asyncio.to_thread(_sync_generate, prompt)
+        result = await _generate(prompt, "insight")
         return result
+    except Overloaded:
+        raise
     except Exception as e:
         print(f"Price insight error: {e}")
+        record_fallback("insight")
+        if band:
+            return describe_band(item, band)
         return "Price data temporarily unavailable. Generally, buy seasonal produce in the morning for freshest quality and best prices!"
 
 
-async def chat_with_assistant(message: str, language: str = "Hinglish") -> str:
-    """
-    AI-powered vendor/buyer assistant for market-related queries.
-    
-    WHY: Provides a conversational interface for any market-related
-    questions in the user's preferred language.
-    
-    Args:
-        message: User's question or message
-        language: Preferred language for response
-    
-    Returns:
-        Helpful response in the specified language
-    """
+def _chat_history(session: Optional[Session]) -> str:
+    """Conversation so far for the prompt: rolling summary plus recent turns."""
+    if session is None or session.is_empty:
+        return ""
+    summary, turns = session.context()
+    lines = ["Conversation so far:"]
+    if summary:
+        lines.append(f"(Summary of earlier messages) {summary}")
+    for turn in turns:
+        lines.append(f"User: {turn.user}")
+        lines.append(f"Assistant: {turn.assistant}")
+    return "\n".join(lines) + "\n\n"
+
+
+def _chat_prompt(message: str, language: str, session: Optional[Session] = None) -> str:
+    """Builds the assistant prompt shared by the buffered and streaming paths."""
     lang_instruction = ""
     if language == "Hinglish":
         lang_instruction = "Respond in Hinglish (natural mix of Hindi and English in Roman script)."
@@ -296,35 +800,142 @@ You can help with:
 - Market locations and timings
 - Any other market-related questions
 
-User's question: {message}
+{_chat_history(session)}User's question: {message}
 
 Provide a helpful, practical response. Keep it under 100 words.
 Be friendly and conversational, like a knowledgeable friend who works in the market.
 No markdown formatting."""
+    return prompt
+
+
+CHAT_FALLBACK = "Sorry, I couldn't process that. Please try asking again!"
 
+# Near-duplicate answer cache in front of the chat model
+chat_cache = FuzzyAnswerCache()
+
+
+# Background summary tasks, referenced so they are not garbage collected
+_fold_tasks = set()
+
+
+def _summary_prompt(summary: str, turns: list) -> str:
+    """Builds the prompt that folds older turns into the rolling summary."""
+    transcript = "\n".join(f"User: {t.user}\nAssistant: {t.assistant}" for t in turns)
+    return f"""Update the running summary of a conversation between a market vendor/buyer and an assistant.
+
+Current summary: {summary or "(none)"}
+
+New messages:
+{transcript}
+
+Write the updated summary in under {CHAT_SUMMARY_TOKENS // 2} words, in English.
+Keep items, prices, quantities, places and decisions the user mentioned.
+Plain text, no markdown."""
+
+
+async def _fold_session(session: Session, turns: list) -> None:
+    """Summarizes folded turns into the session summary, or falls back to topics."""
     try:
-        result = await asyncio.to_thread(_sync_generate, prompt)
-        return result
+        summary = await _generate(_summary_prompt(session.summary, turns), "chat")
+    except asyncio.CancelledError:
+        chat_sessions.cancel_fold(session)
+        raise
     except Exception as e:
-        print(f"Chat assistant error: {e}")
-        return "Sorry, I couldn't process that. Please try asking again!"
+        print(f"Chat summary error: {e}")
+        summary = fallback_summary(session.summary, turns)
+    chat_sessions.apply_summary(session, turns, summary)
 
 
-async def generate_smart_phrases(item: str, context: str, language: str = "Hinglish") -> str:
+def _remember_turn(session: Optional[Session], message: str, answer: str) -> None:
+    """Stores a completed turn and starts a background fold if it is due."""
+    if session is None:
+        return
+    chat_sessions.record(session, message, answer)
+    turns = chat_sessions.take_fold(session)
+    if turns:
+        task = asyncio.get_running_loop().create_task(_fold_session(session, turns))
+        _fold_tasks.add(task)
+        task.add_done_callback(_fold_tasks.discard)
+
+
+async def chat_with_assistant(message: str, language: str = "Hinglish",
+                              session: Optional[Session] = None) -> str:
     """
-    Generates culturally appropriate bargaining phrases.
+    AI-powered vendor/buyer assistant for market-related queries.
     
-    WHY: Pre-made phrases help non-native speakers or shy buyers
-    negotiate confidently in the local style.
+    WHY: Provides a conversational interface for any market-related
+    questions in the user's preferred language.
     
     Args:
-        item: The item being purchased
-        context: The negotiation context (e.g., "high price", "bulk buy")
-        language: Target language for phrases
+        message: User's question or message
+        language: Preferred language for response
+        session: Conversation to continue (see chat_sessions.py); its
+            summary and recent turns are included in the prompt
     
     Returns:
-        Ready-to-use negotiation phrases
+        Helpful response in the specified language
+    """
+    set_language(language)
+    # WHY: A cached answer only fits a question asked without prior context
+    fresh = session is None or session.is_empty
+    cached = chat_cache.get(message, language) if fresh else None
+    mark_cache("chat", cached is not None)
+    if cached is not None:
+        _remember_turn(session, message, cached)
+        return cached
+
+    prompt = _chat_prompt(message, language, session)
+
+    try:
+        result = await _generate(prompt, "chat")
+        if fresh:
+            chat_cache.set(message, language, result)
+        _remember_turn(session, message, result)
+        return result
+    except Overloaded:
+        raise
+    except Exception as e:
+        print(f"Chat assistant error: {e}")
+        record_fallback("chat")
+        return CHAT_FALLBACK
+
+
+async def stream_chat_with_assistant(message: str, language: str = "Hinglish",
+                                     session: Optional[Session] = None):
+    """
+    Streaming variant of chat_with_assistant.
+    
+    Yields:
+        ("delta", text) chunks, then possibly ("fallback", text). A cached
+        answer is sent as a single delta.
     """
+    set_language(language)
+    fresh = session is None or session.is_empty
+    cached = chat_cache.get(message, language) if fresh else None
+    mark_cache("chat", cached is not None)
+    if cached is not None:
+        _remember_turn(session, message, cached)
+        yield "delta", cached
+        return
+
+    parts = []
+    prompt = _chat_prompt(message, language, session)
+    async for kind, text in _stream_with_fallback(prompt, "chat", CHAT_FALLBACK):
+        if kind == "delta":
+            parts.append(text)
+        else:
+            parts = None
+        yield kind, text
+    # Only complete model answers are cached or remembered, never the fallback
+    if parts:
+        answer = "".join(parts)
+        if fresh:
+            chat_cache.set(message, language, answer)
+        _remember_turn(session, message, answer)
+
+
+def _phrases_prompt(item: str, context: str, language: str) -> str:
+    """Builds the smart phrases prompt."""
     lang_instruction = ""
     if language == "Hinglish":
         lang_instruction = "Generate phrases in Hinglish (Hindi-English mix in Roman script)."
@@ -334,7 +945,7 @@ async def generate_smart_phrases(item: str, context: str, language: str = "Hingl
     else:
         lang_instruction = "Generate phrases in simple English with Indian cultural context."
     
-    prompt = f"""Generate 3 natural, ready-to-use bargaining phrases for buying {item} at an Indian mandi.
+    return f"""Generate 3 natural, ready-to-use bargaining phrases for buying {item} at an Indian mandi.
 
 Context: {context}
 {lang_instruction}
@@ -344,11 +955,57 @@ Make them sound natural - like what a local would actually say.
 Include the warm, respectful tone typical of Indian market interactions.
 No numbering, no explanations, just the phrases."""
 
+
+async def generate_phrases_from_model(item: str, context: str, language: str = "Hinglish") -> str:
+    """
+    Asks the model for fresh phrases, raising on failure.
+    
+    Used for bank misses and by the phrase bank warm-up, which must never
+    store a canned fallback.
+    """
+    result = (await _generate(_phrases_prompt(item, context, language), "phrases")).strip()
+    if not result:
+        raise ValueError("empty phrases response")
+    return result
+
+
+async def generate_smart_phrases(item: str, context: str, language: str = "Hinglish") -> str:
+    """
+    Generates culturally appropriate bargaining phrases.
+    
+    WHY: Pre-made phrases help non-native speakers or shy buyers
+    negotiate confidently in the local style.
+    
+    Served from the phrase bank (phrase_bank.py) when the combination is
+    known, rotating between its variants; only unseen combinations call
+    the model, and their answer is added to the bank while the other
+    variants are generated in the background.
+    
+    Args:
+        item: The item being purchased
+        context: The negotiation context (e.g., "high price", "bulk buy")
+        language: Target language for phrases
+    
+    Returns:
+        Ready-to-use negotiation phrases
+    """
+    set_language(language)
+    key = phrase_key(item, context, language)
+    banked = phrase_bank.get(key)
+    mark_cache("phrase_bank", banked is not None)
+    if banked is not None:
+        return banked
+
     try:
-        result = await asyncio.to_thread(_sync_generate, prompt)
+        result = await generate_phrases_from_model(item, context, language)
+        phrase_bank.add(key, result)
+        phrase_bank.top_up_later(generate_phrases_from_model, (item, context, language))
         return result
+    except Overloaded:
+        raise
     except Exception as e:
         print(f"Smart phrases error: {e}")
+        record_fallback("phrases")
         if language == "Hinglish":
             return """Bhaiya, aaj rate kya hai? Thoda fresh wala dikhao na.
 Itna mehnga? Woh saamne wale bhaiya se 5 rupaye kam mein mil raha hai!
@@ -360,6 +1017,4 @@ Okay, I'll take 2 kg, can you give a small discount?"""
 
 # ===== TODO =====
 # TODO: Add response caching with Redis for production
-# TODO: Implement rate limiting per user
 # TODO: Add support for text-to-speech audio generation
-# NEXT_DEVELOPER: Consider adding translation memory for repeated phrases
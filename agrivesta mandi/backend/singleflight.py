@@ -0,0 +1,69 @@
+"""
+In-flight request coalescing for Multilingual Mandi.
+
+Concurrent callers asking for the same key share one running call:
+the first caller starts it, the rest await the same task, and its
+result or exception is delivered to all of them.
+
+WHY: During market rush many users ask for "Tomato" insights or the
+same smart phrases within the same second. Without coalescing each
+one pays for its own identical upstream model call.
+"""
+import asyncio
+from typing import Awaitable, Callable, Hashable
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent async calls by key.
+
+    The shared call runs as its own task and callers await it through
+    asyncio.shield, so one client disconnecting does not cancel the call
+    for everyone else waiting on it.
+    """
+
+    def __init__(self):
+        self._inflight = {}
+        self.calls = 0
+        self.executions = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable]):
+        """
+        Runs fn() once per key at a time and returns its result.
+
+        Args:
+            key: Identity of the call (e.g. the prompt text)
+            fn: Zero-argument coroutine function performing the call
+
+        Raises:
+            Whatever fn() raised, for every caller sharing the call
+        """
+        self.calls += 1
+        task = self._inflight.get(key)
+        if task is None:
+            self.executions += 1
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t, k=key: self._done(k, t))
+        return await asyncio.shield(task)
+
+    def running(self, key: Hashable) -> bool:
+        """Whether a call for key is in flight, i.e. do(key, ...) would join it."""
+        return key in self._inflight
+
+    def _done(self, key: Hashable, task: asyncio.Task) -> None:
+        self._inflight.pop(key, None)
+        # Mark the exception retrieved in case every waiter went away
+        if not task.cancelled():
+            task.exception()
+
+    def snapshot(self) -> dict:
+        """Counters and coalescing ratio (share of calls that were shared)."""
+        coalesced = self.calls - self.executions
+        return {
+            "calls": self.calls,
+            "upstream_calls": self.executions,
+            "coalesced": coalesced,
+            "coalescing_ratio": round(coalesced / self.calls, 4) if self.calls else 0.0,
+            "in_flight": len(self._inflight),
+        }
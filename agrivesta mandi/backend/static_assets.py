@@ -0,0 +1,220 @@
+"""
+Frontend asset build and serving for Multilingual Mandi.
+
+`python static_assets.py build` writes frontend/dist/:
+- every asset renamed with a content hash (app.3f2a9c1b7d.js), and the
+  HTML rewritten to reference the hashed names
+- .gz (and .br, if brotli is installed) next to each file, at maximum
+  compression
+- asset-manifest.json mapping source names to hashed names, with the
+  source hashes used to detect a stale build
+
+PrecompressedStaticFiles serves the precompressed variant the client
+accepts, with Vary: Accept-Encoding. Hashed files are cached for a year
+as immutable; HTML and unhashed files are revalidated on every load.
+
+WHY: Browsers on 2G re-downloaded ~65 KB of uncompressed JS/CSS on every
+visit. With hashed names they keep it until it actually changes, and
+compression happens once at build time instead of per request.
+"""
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+import shutil
+import sys
+from pathlib import Path
+from typing import Optional
+
+from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse
+from starlette.staticfiles import NotModifiedResponse
+
+from compression import available_encodings, compress, negotiate
+
+FRONTEND_DIR = Path(__file__).parent.parent / "frontend"
+DIST_DIR_NAME = "dist"
+MANIFEST_NAME = "asset-manifest.json"
+
+# Files smaller than this are not worth a compressed variant
+PRECOMPRESS_MIN_SIZE = 256
+
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE = "no-cache"
+
+# name.<10 hex>.ext, as written by build()
+_HASHED_RE = re.compile(r"\.[0-9a-f]{10}\.[A-Za-z0-9]+$")
+# src="..." / href="..." attributes pointing at local files
+_REF_RE = re.compile(r'''(\b(?:src|href)\s*=\s*["'])([^"'#?]+)([^"']*["'])''')
+
+_SUFFIXES = {"br": ".br", "gzip": ".gz"}
+
+
+def _digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _source_files(source: Path) -> list:
+    dist = source / DIST_DIR_NAME
+    return sorted(
+        p for p in source.rglob("*")
+        if p.is_file() and dist not in p.parents and not p.name.startswith(".")
+    )
+
+
+def _write_variants(path: Path, data: bytes) -> dict:
+    """Writes precompressed siblings of a built file; returns their sizes."""
+    sizes = {"identity": len(data)}
+    if len(data) < PRECOMPRESS_MIN_SIZE:
+        return sizes
+    for encoding in available_encodings():
+        packed = compress(data, encoding, best=True)
+        if len(packed) < len(data):
+            path.with_name(path.name + _SUFFIXES[encoding]).write_bytes(packed)
+            sizes[encoding] = len(packed)
+    return sizes
+
+
+def build(source: Path = FRONTEND_DIR) -> dict:
+    """
+    Builds hashed, precompressed assets into source/dist.
+
+    Returns:
+        The manifest that was written
+    """
+    source = Path(source)
+    dist = source / DIST_DIR_NAME
+    tmp = source / (DIST_DIR_NAME + ".tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+
+    files = _source_files(source)
+    assets, sources, sizes = {}, {}, {}
+    # Assets first, so HTML can be rewritten to their hashed names
+    for path in files:
+        rel = path.relative_to(source).as_posix()
+        data = path.read_bytes()
+        sources[rel] = _digest(data)
+        if path.suffix == ".html":
+            continue
+        hashed = f"{path.stem}.{sources[rel][:10]}{path.suffix}"
+        hashed_rel = (Path(rel).parent / hashed).as_posix()
+        target = tmp / hashed_rel
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_bytes(data)
+        assets[rel] = hashed_rel
+        sizes[hashed_rel] = _write_variants(target, data)
+
+    for path in files:
+        if path.suffix != ".html":
+            continue
+        rel = path.relative_to(source).as_posix()
+        base = posixpath.dirname(rel)
+
+        def rewrite(match):
+            ref = match.group(2)
+            if ref.startswith("//") or ":" in ref:
+                return match.group(0)
+            if ref.startswith("/"):
+                hashed = assets.get(ref.lstrip("/"))
+                new_ref = "/" + hashed if hashed else None
+            else:
+                hashed = assets.get(posixpath.normpath(posixpath.join(base, ref)))
+                new_ref = posixpath.relpath(hashed, base or ".") if hashed else None
+            if new_ref is None:
+                return match.group(0)
+            return match.group(1) + new_ref + match.group(3)
+
+        html = _REF_RE.sub(rewrite, path.read_text(encoding="utf-8")).encode("utf-8")
+        target = tmp / rel
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_bytes(html)
+        sizes[rel] = _write_variants(target, html)
+
+    manifest = {"assets": assets, "sources": sources, "sizes": sizes}
+    with open(tmp / MANIFEST_NAME, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    shutil.rmtree(dist, ignore_errors=True)
+    os.replace(tmp, dist)
+    return manifest
+
+
+def frontend_directory(source: Path = FRONTEND_DIR) -> Path:
+    """
+    The directory to serve: source/dist if it was built from the current
+    sources, otherwise the sources themselves.
+
+    WHY: A build left over from an older checkout would serve a stale UI.
+    """
+    source = Path(source)
+    dist = source / DIST_DIR_NAME
+    try:
+        with open(dist / MANIFEST_NAME, "r", encoding="utf-8") as f:
+            built = json.load(f)["sources"]
+    except FileNotFoundError:
+        return source
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Ignoring unreadable frontend build: {e}")
+        return source
+    current = {
+        p.relative_to(source).as_posix(): _digest(p.read_bytes())
+        for p in _source_files(source)
+    }
+    if current != built:
+        print("Frontend build is stale; serving unbuilt files (run: python static_assets.py build)")
+        return source
+    return dist
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """
+    StaticFiles that serves .br/.gz siblings by Accept-Encoding and sets
+    Cache-Control by whether the file name is content-hashed.
+    """
+
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200):
+        name = os.path.basename(str(full_path))
+        encoding = self._pick_variant(str(full_path), Headers(scope=scope))
+        if encoding is not None:
+            variant = str(full_path) + _SUFFIXES[encoding]
+            response = FileResponse(
+                variant,
+                status_code=status_code,
+                stat_result=os.stat(variant),
+                # Content type of the original, not of the .gz/.br file
+                media_type=mimetypes.guess_type(name)[0] or "text/plain",
+            )
+            response.headers["Content-Encoding"] = encoding
+        else:
+            response = FileResponse(full_path, status_code=status_code, stat_result=stat_result)
+        response.headers["Vary"] = "Accept-Encoding"
+        response.headers["Cache-Control"] = IMMUTABLE_CACHE if _HASHED_RE.search(name) else REVALIDATE_CACHE
+        if self.is_not_modified(response.headers, Headers(scope=scope)):
+            return NotModifiedResponse(response.headers)
+        return response
+
+    @staticmethod
+    def _pick_variant(full_path: str, request_headers: Headers) -> Optional[str]:
+        accepted = request_headers.get("accept-encoding")
+        if not accepted:
+            return None
+        offered = tuple(
+            encoding for encoding, suffix in _SUFFIXES.items()
+            if os.path.isfile(full_path + suffix)
+        )
+        return negotiate(accepted, offered) if offered else None
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "build":
+        print("Usage: python static_assets.py build [frontend_dir]")
+        sys.exit(1)
+    result = build(Path(sys.argv[2]) if len(sys.argv) > 2 else FRONTEND_DIR)
+    for rel, hashed in sorted(result["assets"].items()):
+        print(f"{rel} -> {hashed} {result['sizes'][hashed]}")
+    for rel, sizes in sorted(result["sizes"].items()):
+        if rel.endswith(".html"):
+            print(f"{rel} {sizes}")
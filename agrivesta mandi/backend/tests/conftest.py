@@ -0,0 +1,20 @@
+"""
+Test setup for the Multilingual Mandi backend.
+
+Backend modules are flat and import each other by name (as uvicorn runs
+them from this directory), so the directory is put on sys.path. Caches,
+logs and data files go to a scratch directory, never to backend/data.
+"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+_scratch = Path(tempfile.mkdtemp(prefix="mandi-tests-"))
+os.environ.setdefault("GEMINI_API_KEY", "test-key")
+os.environ.setdefault("CACHE_DB_PATH", str(_scratch / "cache.sqlite3"))
+os.environ.setdefault("PHRASE_BANK_PATH", str(_scratch / "phrase_bank.json"))
+os.environ.setdefault("INGEST_LOG_PATH", str(_scratch / "ingest.log"))
@@ -0,0 +1,103 @@
+import asyncio
+
+import pytest
+
+import rate_limit
+from admission import Bulkhead, Overloaded
+
+
+async def _use(bulkhead: Bulkhead, client: str, order: list, gate: asyncio.Event, weight: float = 1.0):
+    rate_limit._client.set((client, weight))
+    async with bulkhead.slot():
+        order.append(client)
+        await gate.wait()
+
+
+async def _settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_queued_client_is_not_stuck_behind_a_busy_one():
+    async def main():
+        bulkhead = Bulkhead("chat", limit=1, max_queue=20)
+        order = []
+        gate = asyncio.Event()
+        gate.set()
+        hold = asyncio.Event()
+        tasks = [asyncio.ensure_future(_use(bulkhead, "holder", order, hold))]
+        await _settle()
+        tasks += [asyncio.ensure_future(_use(bulkhead, "busy", order, gate)) for _ in range(5)]
+        await _settle()
+        tasks.append(asyncio.ensure_future(_use(bulkhead, "quiet", order, gate)))
+        await _settle()
+        hold.set()
+        await asyncio.gather(*tasks)
+        return order
+
+    order = asyncio.run(main())
+    assert order[0] == "holder"
+    # FIFO would serve "quiet" last; fair queuing serves it within the first round
+    assert order.index("quiet") <= 2
+    assert order.count("busy") == 5
+
+
+def test_weight_gives_proportional_share():
+    async def main():
+        bulkhead = Bulkhead("chat", limit=1, max_queue=20)
+        order = []
+        gate = asyncio.Event()
+        gate.set()
+        hold = asyncio.Event()
+        tasks = [asyncio.ensure_future(_use(bulkhead, "holder", order, hold))]
+        await _settle()
+        tasks += [asyncio.ensure_future(_use(bulkhead, "light", order, gate)) for _ in range(4)]
+        tasks += [asyncio.ensure_future(_use(bulkhead, "heavy", order, gate, weight=3.0)) for _ in range(6)]
+        await _settle()
+        hold.set()
+        await asyncio.gather(*tasks)
+        return order[1:]
+
+    served = asyncio.run(main())
+    first_four = served[:4]
+    assert first_four.count("heavy") == 3
+    assert first_four.count("light") == 1
+
+
+def test_full_queue_rejects_at_once():
+    async def main():
+        bulkhead = Bulkhead("chat", limit=1, max_queue=1)
+        order = []
+        hold = asyncio.Event()
+        tasks = [asyncio.ensure_future(_use(bulkhead, "a", order, hold)) for _ in range(2)]
+        await _settle()
+        with pytest.raises(Overloaded) as rejected:
+            await _use(bulkhead, "b", order, hold)
+        hold.set()
+        await asyncio.gather(*tasks)
+        return bulkhead, rejected.value
+
+    bulkhead, error = asyncio.run(main())
+    assert error.reason == "queue full"
+    assert error.retry_after >= 1
+    assert bulkhead.rejected == 1
+    assert bulkhead.active == 0
+
+
+def test_queue_timeout_rejects_and_frees_the_queue():
+    async def main():
+        bulkhead = Bulkhead("chat", limit=1, max_queue=4, queue_timeout=0.01)
+        order = []
+        hold = asyncio.Event()
+        holder = asyncio.ensure_future(_use(bulkhead, "a", order, hold))
+        await _settle()
+        with pytest.raises(Overloaded) as rejected:
+            await _use(bulkhead, "b", order, hold)
+        hold.set()
+        await holder
+        return bulkhead, rejected.value
+
+    bulkhead, error = asyncio.run(main())
+    assert error.reason == "queue timeout"
+    assert bulkhead.waiting == 0
+    assert bulkhead.active == 0
@@ -0,0 +1,85 @@
+import asyncio
+import time
+
+import pytest
+
+import services
+from cache import LRUCache, SQLiteCache, TieredCache, normalize_text
+
+
+def make_cache(tmp_path, max_entries=16):
+    return TieredCache("test", LRUCache(max_entries), SQLiteCache("test", tmp_path / "cache.sqlite3"))
+
+
+def test_normalize_text_folds_case_width_and_spaces():
+    assert normalize_text("  Thoda   KAM karo ") == "thoda kam karo"
+    assert normalize_text("ＡＢＣ") == "abc"
+
+
+def test_lru_evicts_least_recently_used_and_expired(monkeypatch):
+    cache = LRUCache(max_entries=2, ttl=10)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+
+    now = cache._data["a"][1]
+    monkeypatch.setattr("cache.time.monotonic", lambda: now + 1)
+    assert cache.get("a") is None
+    assert len(cache) == 1
+
+
+def test_sqlite_tier_round_trips_and_expires(tmp_path, monkeypatch):
+    cache = SQLiteCache("test", tmp_path / "cache.sqlite3", ttl=60)
+    cache.set("hello", {"Hindi": "नमस्ते"})
+    assert SQLiteCache("test", tmp_path / "cache.sqlite3").get("hello") == {"Hindi": "नमस्ते"}
+    # Namespaces do not see each other's keys
+    assert SQLiteCache("other", tmp_path / "cache.sqlite3").get("hello") is None
+
+    later = time.time() + 120
+    monkeypatch.setattr("cache.time.time", lambda: later)
+    assert cache.get("hello") is None
+
+
+def test_sqlite_prune_keeps_the_newest_rows(tmp_path, monkeypatch):
+    cache = SQLiteCache("test", tmp_path / "cache.sqlite3", max_rows=2)
+    start = time.time()
+    for n in range(4):
+        monkeypatch.setattr("cache.time.time", lambda: start + n)
+        cache.set(f"k{n}", n)
+    cache.prune()
+    assert [cache.get(f"k{n}") for n in range(4)] == [None, None, 2, 3]
+
+
+def test_tiered_cache_promotes_disk_hits(tmp_path):
+    async def main():
+        writer = make_cache(tmp_path)
+        await writer.set("key", "value")
+        reader = make_cache(tmp_path)
+        results = [await reader.get("key"), await reader.get("key"), await reader.get("missing")]
+        return reader, results
+
+    reader, results = asyncio.run(main())
+    assert results == ["value", "value", None]
+    assert reader.stats == {"l1_hits": 1, "l2_hits": 1, "misses": 1, "writes": 0}
+    assert reader.snapshot()["hit_ratio"] == pytest.approx(2 / 3, abs=1e-4)
+
+
+def test_translate_text_is_served_from_translation_memory(tmp_path, monkeypatch):
+    monkeypatch.setattr(services, "translation_memory", make_cache(tmp_path))
+    calls = []
+
+    async def fake_generate(prompt, kind="chat"):
+        calls.append(prompt)
+        return '"नमस्ते"'
+
+    monkeypatch.setattr(services, "_generate", fake_generate)
+
+    async def main():
+        first = await services.translate_text("Hello", "Hindi")
+        return first, await services.translate_text("  hello ", "Hindi")
+
+    assert asyncio.run(main()) == ("नमस्ते", "नमस्ते")
+    assert len(calls) == 1
@@ -0,0 +1,83 @@
+from chat_sessions import SessionStore, Turn, estimate_tokens, fallback_summary
+
+
+def fill(store, session, count, start=0):
+    for n in range(start, start + count):
+        store.record(session, f"question {n}", f"answer {n}")
+
+
+def test_token_estimate_counts_indic_script_double():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("abcdefgh") == 2
+    assert estimate_tokens("टमाटर") == 3
+
+
+def test_unknown_ids_get_a_fresh_session():
+    store = SessionStore()
+    session = store.resolve(None)
+    assert store.resolve(session.id) is session
+    assert store.resolve("made-up").id != "made-up"
+    assert store.stats["created"] == 2 and store.stats["resumed"] == 1
+
+
+def test_context_keeps_the_newest_turns_within_budget():
+    store = SessionStore(max_turns=10, history_tokens=10_000)
+    session = store.resolve(None)
+    fill(store, session, 5)
+    summary, turns = session.context(budget=2 * session.turns[0].tokens)
+    assert summary == ""
+    assert [turn.user for turn in turns] == ["question 3", "question 4"]
+
+
+def test_fold_replaces_old_turns_with_the_summary():
+    store = SessionStore(max_turns=20, history_tokens=30)
+    session = store.resolve(None)
+    fill(store, session, 6)
+    folded = store.take_fold(session)
+    assert folded and store.take_fold(session) is None
+
+    store.apply_summary(session, folded, "Asked about onions.")
+    assert session.summary == "Asked about onions."
+    assert session.turns[0].seq == folded[-1].seq + 1
+    assert not session.folding
+    assert session.tokens == sum(turn.tokens for turn in session.turns)
+
+
+def test_turns_dropped_during_a_fold_survive_its_summary():
+    store = SessionStore(max_turns=4, history_tokens=30)
+    session = store.resolve(None)
+    fill(store, session, 4)
+    folded = store.take_fold(session)
+    assert [turn.seq for turn in folded] == [0, 1, 2]
+
+    # The model is slow; the turn cap drops turns beyond the fold meanwhile
+    fill(store, session, 4, start=4)
+    assert "question 3" in session.summary
+
+    store.apply_summary(session, folded, "Asked about onion prices in Pune.")
+    assert session.summary.startswith("Asked about onion prices in Pune.")
+    assert "question 3" in session.summary
+    # The folded turns are covered by the model summary, not repeated
+    assert "question 2" not in session.summary
+    assert session.spilled == []
+
+
+def test_fallback_summary_extends_instead_of_nesting():
+    first = fallback_summary("Talked about rice.", [Turn(0, "onion rate?", "")])
+    second = fallback_summary(first, [Turn(1, "tomato rate?", ""), Turn(2, "onion rate?", "")])
+    assert second == "Talked about rice. Earlier the user asked: onion rate?; tomato rate?."
+
+
+def test_memory_budget_evicts_least_recently_used():
+    store = SessionStore()
+    old, recent, newest = (store.resolve(None) for _ in range(3))
+    for session in (old, recent, newest):
+        fill(store, session, 1)
+    store.resolve(old.id)
+    store.max_bytes = store.snapshot()["memory_bytes"]
+
+    fill(store, newest, 1, start=1)
+    assert recent.id not in store._sessions
+    assert store.resolve(old.id) is old
+    assert store.stats["evicted"] == 1
+    assert store.snapshot()["memory_bytes"] <= store.max_bytes
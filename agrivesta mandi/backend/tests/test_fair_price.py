@@ -0,0 +1,83 @@
+import asyncio
+import json
+
+import pytest
+
+from fair_price import FairPriceEngine, build_bands, describe_verdict, parse_unit_price
+from price_store import PriceStore
+
+
+@pytest.fixture
+def engine(tmp_path):
+    path = tmp_path / "prices.json"
+    path.write_text(json.dumps([
+        {"item": "Tomato", "price": "40/kg", "location": "Pune"},
+        {"item": "Tomato", "price": "₹4400 per quintal", "location": "Nashik"},
+        {"item": "Tomato", "price": "36/kg", "location": "Delhi"},
+        {"item": "Banana", "price": "60/dozen", "location": "Pune"},
+    ]), encoding="utf-8")
+    return FairPriceEngine(PriceStore(paths=(path,), check_interval=60))
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("40/kg", (40.0, "weight", "kg")),
+    ("₹4000 per quintal", (40.0, "weight", "kg")),
+    ("20 per 250g", (80.0, "weight", "kg")),
+    ("5 per piece", (60.0, "count", "dozen")),
+    ("50 rs", (50.0, None, None)),
+    (45, (45.0, None, None)),
+    ("free", (None, None, None)),
+])
+def test_parse_unit_price(text, expected):
+    value, family, unit = parse_unit_price(text)
+    assert (value and round(value, 2), family, unit) == expected
+
+
+def test_bands_compare_across_units():
+    band = build_bands([
+        {"item": "Tamatar", "price": "40/kg", "location": "Pune"},
+        {"item": "Tomato", "price": "4400/quintal", "location": "Nashik"},
+    ])["tomato"]
+    assert band["median"] == 42.0
+    assert band["unit"] == "kg"
+    assert band["mandis"] == ["Pune", "Nashik"]
+
+
+@pytest.mark.parametrize("asking, verdict", [
+    ("30/kg", "below market"),
+    ("41/kg", "fair"),
+    ("47", "slightly high"),
+    ("₹6000 per quintal", "overpriced"),
+])
+def test_verdicts(engine, asking, verdict):
+    assessment = engine.assess("tamatar", asking)
+    assert assessment["verdict"] == verdict
+    assert assessment["unit"] == "kg"
+
+
+def test_overpriced_suggests_the_median(engine):
+    assessment = engine.assess("Tomato", "60/kg")
+    assert assessment["suggested_offer"] == 40
+    assert "Offer around ₹40/kg" in describe_verdict("Tomato", assessment)
+
+
+def test_client_reference_and_unit_mismatch(engine):
+    assert engine.assess("Tomato", "50/kg", "50/kg")["fair_band"]["source"] == "client"
+    # A per-dozen price cannot be judged against per-kg quotes
+    assert engine.assess("Tomato", "50/dozen") is None
+    assert engine.assess("Mango", "50/kg") is None
+
+
+def test_async_variants_read_the_async_snapshot(engine, monkeypatch):
+    def blocking_get():
+        raise AssertionError("get() called from an async handler")
+
+    async def main():
+        # Warm the store's snapshot the way the server does, off the loop
+        await asyncio.to_thread(engine.store.get)
+        monkeypatch.setattr(engine.store, "get", blocking_get)
+        return await engine.aassess("Tomato", "41/kg"), await engine.aband("Banana")
+
+    assessment, band = asyncio.run(main())
+    assert assessment["verdict"] == "fair"
+    assert band["unit"] == "dozen"
@@ -0,0 +1,63 @@
+from fuzzy_cache import FuzzyAnswerCache, fold_question
+
+
+def make_cache():
+    return FuzzyAnswerCache(threshold=0.6, max_entries=100, ttl=60, price_ttl=60)
+
+
+def test_similar_question_hits():
+    cache = make_cache()
+    cache.set("should I sell my potatoes now", "English", "Yes, sell")
+    assert cache.get("should i sell my potato now", "English") == "Yes, sell"
+
+
+def test_negation_is_never_matched_to_affirmative():
+    cache = make_cache()
+    cache.set("should I sell my potatoes now", "English", "Yes, sell")
+    assert cache.get("should I not sell my potatoes now", "English") is None
+    assert cache.get("shouldn't I sell my potatoes now", "English") is None
+
+
+def test_affirmative_is_never_matched_to_negation():
+    cache = make_cache()
+    cache.set("aloo abhi mat becho kya", "Hinglish", "Ruk jao")
+    assert cache.get("aloo abhi becho kya", "Hinglish") is None
+    assert cache.get("aloo abhi mat becho kya", "Hinglish") == "Ruk jao"
+
+
+def test_na_is_kept_as_negation():
+    assert "na" in fold_question("aloo abhi na bechu")
+    cache = make_cache()
+    cache.set("aloo abhi bechu", "Hinglish", "Haan")
+    assert cache.get("aloo abhi na bechu", "Hinglish") is None
+
+
+def test_numbers_must_match():
+    cache = make_cache()
+    cache.set("rate for 2 kg tomato", "English", "40")
+    assert cache.get("rate for 20 kg tomato", "English") is None
+
+
+def test_intent_must_match():
+    cache = FuzzyAnswerCache()
+    cache.set("is it better to buy onions in the morning or evening at Lasalgaon mandi", "English", "Morning")
+    assert cache.get("is it better to sell onions in the morning or evening at Lasalgaon mandi",
+                     "English") is None
+    cache.set("tamatar kab kharidu", "Hinglish", "Subah")
+    assert cache.get("tamatar kab bechu", "Hinglish") is None
+    cache.set("aaj pyaz sasta hai kya", "Hinglish", "Haan")
+    assert cache.get("aaj pyaz mehenga hai kya", "Hinglish") is None
+
+
+def test_commodity_must_match():
+    cache = FuzzyAnswerCache()
+    cache.set("how should I store tomatoes and onions", "English", "Cool and dry")
+    assert cache.get("how should I store potatoes and onions", "English") is None
+    assert cache.get("how should I store tomato and onions", "English") == "Cool and dry"
+
+
+def test_canonical_and_romanized_words_are_not_mangled():
+    assert fold_question("kaise rakhe tamaatar") == ["how", "store", "tomato"]
+    assert fold_question("how to store tomatoes") == ["how", "store", "tomato"]
+    # Only commodity plurals are stripped
+    assert fold_question("bees kilo")[0] != fold_question("bee kilo")[0]
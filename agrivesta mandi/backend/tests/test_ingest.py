@@ -0,0 +1,133 @@
+import json
+
+import pytest
+
+from ingest import PriceIngestor, normalize_update
+from price_history import PriceHistory
+from price_store import PriceStore
+
+
+@pytest.fixture
+def prices(tmp_path):
+    path = tmp_path / "prices.json"
+    path.write_text(json.dumps([
+        {"item": "Onion", "price": "30/kg", "location": "Pune", "trend": "stable"},
+        {"item": "Rice", "price": "50/kg", "location": "Delhi", "trend": "up"},
+    ]), encoding="utf-8")
+    return path
+
+
+def make_ingestor(tmp_path, prices):
+    store = PriceStore(paths=(prices,), check_interval=0)
+    history = PriceHistory(tmp_path / "history")
+    return PriceIngestor(tmp_path / "data" / "ingest.log", store, history)
+
+
+def write_log(path, updates, torn=""):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        for update in updates:
+            f.write(json.dumps(update) + "\n")
+        f.write(torn)
+
+
+def read_prices(path):
+    return {(r["item"], r["location"]): r for r in json.loads(path.read_text(encoding="utf-8"))}
+
+
+def update(item, location, price, day, **extra):
+    return normalize_update({"item": item, "location": location, "price": price, "date": day, **extra})
+
+
+def test_compact_applies_updates_and_clears_the_log(tmp_path, prices):
+    ingestor = make_ingestor(tmp_path, prices)
+    ingestor.append([update("Onion", "Pune", "34/kg", "2026-10-01", trend="up")])
+    ingestor.append([update("Tomato", "Nashik", 20, "2026-10-01")])
+
+    assert ingestor.compact() == 2
+    records = read_prices(prices)
+    assert records[("Onion", "Pune")]["price"] == "34/kg"
+    assert records[("Onion", "Pune")]["trend"] == "up"
+    assert records[("Rice", "Delhi")]["price"] == "50/kg"
+    assert records[("Tomato", "Nashik")] == {
+        "item": "Tomato", "price": "20/kg", "location": "Nashik", "trend": "stable",
+    }
+    assert not ingestor.log_path.exists() or ingestor.log_path.stat().st_size == 0
+    assert ingestor.compact() == 0
+
+
+def test_compact_keeps_the_newest_price_date(tmp_path, prices):
+    ingestor = make_ingestor(tmp_path, prices)
+    ingestor.append([
+        update("Onion", "Pune", "36/kg", "2026-10-05"),
+        # A late backfill for an older day
+        update("Onion", "Pune", "31/kg", "2026-10-02"),
+        update("Rice", "Delhi", "52/kg", "2026-10-05"),
+        # Same day: the later line wins
+        update("Rice", "Delhi", "53/kg", "2026-10-05"),
+    ])
+    ingestor.compact()
+    records = read_prices(prices)
+    assert records[("Onion", "Pune")]["price"] == "36/kg"
+    assert records[("Rice", "Delhi")]["price"] == "53/kg"
+
+
+def test_recover_replays_logs_left_by_a_crash(tmp_path, prices):
+    ingestor = make_ingestor(tmp_path, prices)
+    # A compaction was interrupted after rotating, then more batches arrived,
+    # and the process died in the middle of writing a line
+    write_log(ingestor.log_path.with_suffix(".log.compacting"),
+              [update("Onion", "Pune", "32/kg", "2026-10-01")])
+    write_log(ingestor.log_path,
+              [update("Onion", "Pune", "33/kg", "2026-10-02"),
+               update("Rice", "Delhi", "55/kg", "2026-10-02")],
+              torn='{"item": "Rice", "loc')
+
+    restarted = make_ingestor(tmp_path, prices)
+    assert restarted.recover() == 3
+    records = read_prices(prices)
+    assert records[("Onion", "Pune")]["price"] == "33/kg"
+    assert records[("Rice", "Delhi")]["price"] == "55/kg"
+    assert not ingestor.log_path.with_suffix(".log.compacting").exists()
+    assert not ingestor.log_path.exists()
+
+    series = restarted.history.series("Onion", "Pune", start="2026-10-01", end="2026-10-02")
+    assert series[0]["prices"] == [32.0, 33.0]
+
+
+def test_recover_without_logs_does_nothing(tmp_path, prices):
+    ingestor = make_ingestor(tmp_path, prices)
+    before = prices.read_text(encoding="utf-8")
+    assert ingestor.recover() == 0
+    assert prices.read_text(encoding="utf-8") == before
+
+
+def test_appends_after_a_compaction_go_to_a_fresh_log(tmp_path, prices):
+    ingestor = make_ingestor(tmp_path, prices)
+    ingestor.append([update("Onion", "Pune", "34/kg", "2026-10-01")])
+    ingestor.compact()
+    ingestor.append([update("Onion", "Pune", "35/kg", "2026-10-02")])
+    assert ingestor.compact() == 1
+    assert read_prices(prices)[("Onion", "Pune")]["price"] == "35/kg"
+
+
+def test_workers_sharing_a_directory_keep_each_others_history(tmp_path, prices):
+    # Two uvicorn workers: separate ingestors and histories, same files
+    first = make_ingestor(tmp_path, prices)
+    second = make_ingestor(tmp_path, prices)
+
+    second.append([update("Rice", "Delhi", "51/kg", "2026-10-01")])
+    first.append([update("Onion", "Pune", "34/kg", "2026-10-01")])
+    assert first.compact() == 2
+    second.append([update("Tomato", "Nashik", "20/kg", "2026-10-02")])
+    assert second.compact() == 1
+    # The first worker has nothing left to fold, but picks up the save
+    assert first.compact() == 0
+
+    saved = PriceHistory(tmp_path / "history")
+    for history in (saved, first.history, second.history):
+        assert history.series("Rice", "Delhi")[0]["prices"][0] == 51.0
+        assert history.series("Onion", "Pune")[0]["prices"][0] == 34.0
+        assert history.series("Tomato", "Nashik")[0]["prices"][-1] == 20.0
+    assert read_prices(prices)[("Tomato", "Nashik")]["price"] == "20/kg"
+
@@ -0,0 +1,52 @@
+import asyncio
+
+import pytest
+
+import services
+from lang_detect import detect_language_local, detect_script
+
+
+@pytest.mark.parametrize("text, language", [
+    ("வணக்கம், தக்காளி என்ன விலை?", "Tamil"),
+    ("ಟೊಮೆಟೊ ಬೆಲೆ ಎಷ್ಟು?", "Kannada"),
+    ("ਸਤ ਸ੍ਰੀ ਅਕਾਲ", "Punjabi"),
+    ("नमस्ते भाई, टमाटर कितने का है", "Hindi"),
+    ("मला दोन किलो कांदे हवे आहेत", "Marathi"),
+    ("bhaiya tamatar kitne ka hai", "Hinglish"),
+    ("how much are the onions today", "English"),
+])
+def test_detects_supported_languages_offline(text, language):
+    detected, confidence = detect_language_local(text)
+    assert detected == language
+    assert confidence >= services.LANG_DETECT_MIN_CONFIDENCE
+
+
+def test_text_without_letters_is_undetected():
+    assert detect_language_local("₹ 40 / 2") == (None, 0.0)
+    assert detect_script("") == (None, 0.0)
+
+
+def test_mixed_script_lowers_the_confidence():
+    script, share = detect_script("टमाटर tomatoes")
+    assert script == "Latin"
+    assert share == pytest.approx(8 / 13)
+    assert detect_language_local("टमाटर tomatoes")[1] < services.LANG_DETECT_MIN_CONFIDENCE
+
+
+def test_model_is_only_asked_when_unsure(monkeypatch):
+    prompts = []
+
+    async def fake_generate(prompt, kind="chat"):
+        prompts.append(kind)
+        return "Bengali."
+
+    monkeypatch.setattr(services, "_generate", fake_generate)
+
+    async def main():
+        return (
+            await services.detect_language("வணக்கம்"),
+            await services.detect_language("টমেটো tomato tomato"),
+        )
+
+    assert asyncio.run(main()) == ("Tamil", "Bengali")
+    assert prompts == ["detect"]
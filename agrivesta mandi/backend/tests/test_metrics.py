@@ -0,0 +1,119 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import metrics
+import services
+from admission import AdmissionController
+from metrics import Histogram, MetricsMiddleware, RequestStats, set_language, upstream_span
+
+
+def request_stats(path="/api/chat"):
+    return RequestStats({"type": "http", "path": path, "route": SimpleNamespace(path=path)})
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("latency_seconds", "Latency.", ("endpoint",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 2.0):
+        histogram.observe(value, "/api/chat")
+
+    lines = histogram.render()
+    assert 'latency_seconds_bucket{endpoint="/api/chat",le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{endpoint="/api/chat",le="1.0"} 2' in lines
+    assert 'latency_seconds_bucket{endpoint="/api/chat",le="+Inf"} 3' in lines
+    assert 'latency_seconds_count{endpoint="/api/chat"} 3' in lines
+    assert 'latency_seconds_sum{endpoint="/api/chat"} 2.55' in lines
+
+
+def test_overlapping_spans_count_once(monkeypatch):
+    stats = request_stats()
+    token = metrics._current.set(stats)
+    clock = iter([10.0, 14.0])
+    monkeypatch.setattr(metrics.time, "perf_counter", lambda: next(clock))
+    try:
+        with upstream_span():
+            with upstream_span():
+                pass
+    finally:
+        metrics._current.reset(token)
+    assert stats.upstream == 4.0
+
+
+def test_queue_wait_is_not_upstream_time(monkeypatch):
+    monkeypatch.setattr(services, "admission", AdmissionController({"chat": (1, 4)}))
+    monkeypatch.setattr(services, "prompt_flight", services.SingleFlight())
+    queue_wait = Histogram("queue_wait", "", metrics.QUEUE_WAIT_SECONDS.labelnames)
+    monkeypatch.setattr(metrics, "QUEUE_WAIT_SECONDS", queue_wait)
+
+    async def fake_call(prompt):
+        await asyncio.sleep(0.05)
+        return "answer"
+
+    monkeypatch.setattr(services, "_guarded_call", fake_call)
+    stats = request_stats()
+
+    async def main():
+        async def hold_slot():
+            async with services.admission.slot("chat"):
+                await asyncio.sleep(0.3)
+
+        holder = asyncio.ensure_future(hold_slot())
+        await asyncio.sleep(0)
+        metrics._current.set(stats)
+        set_language("Hindi")
+        answer = await services._generate("prompt", "chat")
+        await holder
+        return answer
+
+    assert asyncio.run(main()) == "answer"
+    assert stats.upstream == pytest.approx(0.05, abs=0.04)
+    # The queue wait is recorded against the request that waited
+    assert queue_wait._series[("/api/chat", "Hindi", "chat")][-1] == pytest.approx(0.3, abs=0.1)
+
+
+def test_coalesced_callers_count_the_shared_call(monkeypatch):
+    monkeypatch.setattr(services, "prompt_flight", services.SingleFlight())
+
+    async def fake_call(prompt):
+        await asyncio.sleep(0.05)
+        return "answer"
+
+    monkeypatch.setattr(services, "_guarded_call", fake_call)
+    leader, follower = request_stats(), request_stats()
+
+    async def ask(stats):
+        metrics._current.set(stats)
+        return await services._generate("prompt", "chat")
+
+    async def main():
+        first = asyncio.ensure_future(ask(leader))
+        await asyncio.sleep(0)
+        return await asyncio.gather(first, ask(follower))
+
+    assert asyncio.run(main()) == ["answer", "answer"]
+    assert leader.upstream > 0.03
+    assert follower.upstream > 0.03
+
+
+def test_middleware_labels_requests_by_route_template():
+    app = FastAPI()
+
+    @app.get("/api/items/{item}")
+    async def item(item: str):
+        set_language("Tamil")
+        with upstream_span():
+            await asyncio.sleep(0.01)
+        return {"item": item}
+
+    app.add_middleware(MetricsMiddleware)
+    client = TestClient(app)
+    client.get("/api/items/onion")
+    client.get("/api/items/rice")
+
+    rendered = metrics.registry.render()
+    assert ('mandi_http_request_duration_seconds_count{endpoint="/api/items/{item}",'
+            'method="GET",status="200",language="Tamil"} 2') in rendered
+    assert 'mandi_upstream_duration_seconds_count{endpoint="/api/items/{item}",language="Tamil"} 2' in rendered
@@ -0,0 +1,89 @@
+import asyncio
+import itertools
+import json
+
+import pytest
+
+import services
+from phrase_bank import PhraseBank, default_combos, phrase_key, warm_up
+
+
+@pytest.fixture
+def bank(tmp_path):
+    return PhraseBank(tmp_path / "phrase_bank.json", max_variants=3)
+
+
+def numbered_phrases():
+    counter = itertools.count(1)
+
+    async def generate(item, context, language):
+        await asyncio.sleep(0)
+        return f"{item} phrase {next(counter)}"
+
+    return generate
+
+
+def test_variants_rotate_and_duplicates_are_skipped(bank):
+    key = phrase_key("Tamatar", "high price", "Hinglish")
+    assert key == phrase_key("tomato", "High Price", "Hinglish")
+    assert bank.get(key) is None
+
+    assert bank.add(key, "Bhaiya, thoda kam karo")
+    assert not bank.add(key, "  BHAIYA,  thoda kam karo")
+    bank.add(key, "Itna mehnga?")
+    assert [bank.get(key) for _ in range(3)] == ["Bhaiya, thoda kam karo", "Itna mehnga?", "Bhaiya, thoda kam karo"]
+    assert bank.stats == {"hits": 3, "misses": 1, "added": 2}
+
+
+def test_save_merges_other_workers_variants(bank, tmp_path):
+    other = PhraseBank(bank.path, max_variants=3)
+    other.add("onion|bulk buy|Hindi", "from the other worker")
+    other.save()
+    bank.add("rice|end of day|Tamil", "ours")
+    assert bank.save()
+
+    stored = json.loads(bank.path.read_text(encoding="utf-8"))["entries"]
+    assert stored == {"onion|bulk buy|Hindi": ["from the other worker"], "rice|end of day|Tamil": ["ours"]}
+    # Nothing new to write
+    assert not bank.save()
+
+
+def test_warm_up_fills_every_combination(bank):
+    combos = default_combos(["Tomato", "tamatar", "Onion"], ["Hindi"], contexts=("bulk buy",))
+    assert combos == [("tomato", "bulk buy", "Hindi"), ("onion", "bulk buy", "Hindi")]
+
+    assert asyncio.run(warm_up(bank, numbered_phrases(), combos)) == 6
+    assert bank.missing(combos) == []
+    assert len(PhraseBank(bank.path).variants(phrase_key("onion", "bulk buy", "Hindi"))) == 3
+
+
+def test_a_miss_is_topped_up_in_the_background(bank, monkeypatch):
+    monkeypatch.setattr(services, "phrase_bank", bank)
+    monkeypatch.setattr(services, "generate_phrases_from_model", numbered_phrases())
+    key = phrase_key("Okra", "quality check", "Hinglish")
+
+    async def main():
+        first = await services.generate_smart_phrases("Okra", "quality check")
+        # A second miss while the top-up runs does not start another one
+        bank.top_up_later(services.generate_phrases_from_model, ("Okra", "quality check", "Hinglish"))
+        assert len(bank._filling) == 1
+        await asyncio.gather(*bank._filling.values())
+        return first, [await services.generate_smart_phrases("Okra", "quality check") for _ in range(3)]
+
+    first, later = asyncio.run(main())
+    assert first == "Okra phrase 1"
+    assert len(bank.variants(key)) == 3
+    assert sorted(later) == ["Okra phrase 1", "Okra phrase 2", "Okra phrase 3"]
+
+
+def test_failed_top_up_stops_quietly(bank):
+    async def failing(item, context, language):
+        raise RuntimeError("model down")
+
+    async def main():
+        bank.top_up_later(failing, ("Rice", "bulk buy", "Hindi"))
+        await asyncio.gather(*bank._filling.values())
+
+    asyncio.run(main())
+    assert bank.variants(phrase_key("Rice", "bulk buy", "Hindi")) == []
+    assert bank._filling == {}
@@ -0,0 +1,77 @@
+import subprocess
+import sys
+from datetime import date, timedelta
+
+import pytest
+
+from conftest import BACKEND_DIR
+from price_history import PriceHistory
+
+
+@pytest.fixture
+def history(tmp_path):
+    history = PriceHistory(tmp_path / "history")
+    start = date(2026, 10, 1)
+    history.record_many(
+        ("Onion", "Pune", start + timedelta(days=d), 30 + d) for d in range(10)
+    )
+    history.record_many([
+        ("Onion", "Nashik", start, "28/kg"),
+        ("Onion", "Nashik", start + timedelta(days=9), "34/kg"),
+    ])
+    return history
+
+
+def test_series_with_rolling_change(history):
+    series = history.series("onion", "pune", days=3, window=2)
+    assert series[0]["dates"] == ["2026-10-08", "2026-10-09", "2026-10-10"]
+    assert series[0]["prices"] == [37.0, 38.0, 39.0]
+    assert series[0]["change"] == [2.0, 2.0, 2.0]
+
+
+def test_aggregate_per_mandi_and_overall(history):
+    stats = history.aggregate("Onion")
+    by_mandi = {m["location"]: m for m in stats["mandis"]}
+    assert by_mandi["Pune"]["min"] == 30.0
+    assert by_mandi["Pune"]["max"] == 39.0
+    assert by_mandi["Pune"]["median"] == 34.5
+    assert by_mandi["Nashik"]["count"] == 2
+    assert by_mandi["Nashik"]["last"] == 34.0
+    assert stats["overall"]["count"] == 12
+    assert stats["from"] == "2026-10-01" and stats["to"] == "2026-10-10"
+
+
+def test_later_observation_overwrites_the_same_day(history):
+    history.record("Onion", "Pune", "2026-10-10", "45/kg")
+    assert history.series("Onion", "Pune", days=1)[0]["prices"] == [45.0]
+
+
+def test_save_and_reload(history, tmp_path):
+    history.save()
+    reloaded = PriceHistory(tmp_path / "history")
+    assert reloaded.series("Onion", "Pune") == history.series("Onion", "Pune")
+
+
+def test_trends(tmp_path):
+    history = PriceHistory(tmp_path / "history")
+    start = date(2026, 10, 1)
+    history.record_many(("Tomato", "Pune", start + timedelta(days=d), 20 + 2 * d) for d in range(14))
+    history.record_many(("Rice", "Delhi", start + timedelta(days=d), 50) for d in range(14))
+    assert history.trends(window=7) == {("tomato", "pune"): "up", ("rice", "delhi"): "stable"}
+
+
+def test_unknown_item_and_empty_history(tmp_path, history):
+    assert history.series("Mango") == []
+    assert history.aggregate("Mango") is None
+    with pytest.raises(ValueError):
+        history.series("Onion", start="yesterday")
+
+
+def test_empty_history_never_imports_numpy(tmp_path):
+    code = (
+        "import sys; from pathlib import Path; from price_history import PriceHistory; "
+        f"h = PriceHistory(Path({str(tmp_path / 'none')!r})); "
+        "assert h.series('Onion') == [] and h.aggregate('Onion') is None and h.trends() == {}; "
+        "assert 'numpy' not in sys.modules"
+    )
+    subprocess.run([sys.executable, "-c", code], cwd=BACKEND_DIR, check=True)
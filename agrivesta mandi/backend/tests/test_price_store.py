@@ -0,0 +1,165 @@
+import asyncio
+import json
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+
+from price_store import PriceIndex, PriceQueryError, PriceStore, etag_matches, parse_price
+
+RECORDS = [
+    {"item": "Onion", "price": "30/kg", "location": "Lasalgaon Mandi, Nashik", "trend": "stable"},
+    {"item": "Tomato", "price": "₹40/kg", "location": "Azadpur Mandi, Delhi", "trend": "up"},
+    {"item": "Banana", "price": "60/dozen", "location": "Market Yard, Pune", "trend": "down"},
+    {"item": "Onion", "price": "28/kg", "location": "Azadpur Mandi, Delhi", "trend": "down"},
+    {"item": "Saffron", "price": "on request", "location": "Pampore, Srinagar", "trend": "stable"},
+]
+
+
+def write_prices(path, records, mtime_ns=None):
+    path.write_text(json.dumps(records), encoding="utf-8")
+    if mtime_ns is not None:
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+@pytest.fixture
+def prices(tmp_path):
+    path = tmp_path / "prices.json"
+    write_prices(path, RECORDS)
+    return path
+
+
+@pytest.mark.parametrize("raw, expected", [
+    ("40/kg", (40.0, "kg")),
+    ("₹1,200 / Quintal", (1200.0, "quintal")),
+    ("Rs. 35", (35.0, None)),
+    (12, (12.0, None)),
+    (True, (None, None)),
+    ("on request", (None, None)),
+])
+def test_parse_price(raw, expected):
+    assert parse_price(raw) == expected
+
+
+def test_reloads_only_when_the_file_changes(prices):
+    store = PriceStore(paths=(prices,), check_interval=0)
+    first = store.get()
+    assert store.get() is first
+
+    write_prices(prices, RECORDS[:2], mtime_ns=first.mtime_ns + 10**9)
+    second = store.get()
+    assert second is not first
+    assert len(second.records) == 2
+    assert second.etag != first.etag
+    assert json.loads(second.body) == RECORDS[:2]
+
+
+def test_keeps_serving_the_last_good_snapshot(prices):
+    store = PriceStore(paths=(prices,), check_interval=0)
+    good = store.get()
+    prices.write_text('[{"item": "Onion", "pri', encoding="utf-8")
+    assert store.get() is good
+
+    broken = PriceStore(paths=(prices,), check_interval=0)
+    with pytest.raises(json.JSONDecodeError):
+        broken.get()
+    with pytest.raises(FileNotFoundError):
+        PriceStore(paths=(prices.with_name("missing.json"),)).get()
+
+
+def test_aget_reloads_off_the_event_loop(prices):
+    store = PriceStore(paths=(prices,), check_interval=60)
+
+    async def main():
+        return await store.aget(), await store.aget()
+
+    first, second = asyncio.run(main())
+    assert first is second is store.get()
+
+
+@pytest.mark.parametrize("header, matches", [
+    (None, False),
+    ('"abc"', True),
+    ('W/"abc"', True),
+    ('"xyz", "abc"', True),
+    ("*", True),
+    ('"xyz"', False),
+])
+def test_etag_matches(header, matches):
+    assert etag_matches(header, '"abc"') is matches
+
+
+def test_prices_endpoint_revalidates_with_etag(monkeypatch, prices):
+    import main
+
+    monkeypatch.setattr(main, "price_store", PriceStore(paths=(prices,), check_interval=60))
+    client = TestClient(main.app)
+    response = client.get("/api/prices")
+    assert response.status_code == 200
+    assert response.json() == RECORDS
+    etag = response.headers["etag"]
+
+    cached = client.get("/api/prices", headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.headers["etag"] == etag
+    assert cached.content == b""
+
+
+def items(ids):
+    return [(RECORDS[i]["item"], RECORDS[i]["price"]) for i in ids]
+
+
+def test_index_filters_intersect_case_insensitively():
+    index = PriceIndex(RECORDS)
+    assert list(index.select()) == [0, 1, 2, 3, 4]
+    assert index.select(item="onion") == [0, 3]
+    assert index.select(item="ONION", city="delhi") == [3]
+    assert index.select(location="Azadpur Mandi, Delhi", trend="Up") == [1]
+    assert index.select(unit="dozen") == [2]
+    assert index.select(item="onion", city="pune") == []
+
+
+def test_index_price_ranges_and_sorting():
+    index = PriceIndex(RECORDS)
+    # Natural order unless a sort is asked for
+    assert items(index.select(min_price=28, max_price=40)) == [
+        ("Onion", "30/kg"), ("Tomato", "₹40/kg"), ("Onion", "28/kg"),
+    ]
+    assert items(index.select(unit="kg", sort="price")) == [
+        ("Onion", "28/kg"), ("Onion", "30/kg"), ("Tomato", "₹40/kg"),
+    ]
+    # Unpriced rows stay last either way
+    assert index.select(sort="price")[-1] == 4
+    assert index.select(sort="-price") == [2, 1, 0, 3, 4]
+    assert index.select(max_price=100) == [0, 1, 2, 3]
+
+
+@pytest.mark.parametrize("filters", [{"sort": "item"}, {"min_price": 50, "max_price": 10}])
+def test_index_rejects_bad_queries(filters):
+    with pytest.raises(PriceQueryError):
+        PriceIndex(RECORDS).select(**filters)
+
+
+def test_query_pages_with_cursors(prices):
+    snapshot = PriceStore(paths=(prices,)).get()
+    first = snapshot.query(limit=2, sort="price")
+    assert first["total"] == 5
+    assert [r["price"] for r in first["items"]] == ["28/kg", "30/kg"]
+    second = snapshot.query(limit=2, cursor=first["next_cursor"], sort="price")
+    last = snapshot.query(limit=2, cursor=second["next_cursor"], sort="price")
+    assert [r["price"] for r in second["items"]] == ["₹40/kg", "60/dozen"]
+    assert last["items"] == [RECORDS[4]] and last["next_cursor"] is None
+
+    for bad in ({"limit": 0}, {"cursor": "abc"}, {"cursor": "-2"}):
+        with pytest.raises(PriceQueryError):
+            snapshot.query(**bad)
+
+
+def test_prices_endpoint_pages_filtered_results(monkeypatch, prices):
+    import main
+
+    monkeypatch.setattr(main, "price_store", PriceStore(paths=(prices,), check_interval=60))
+    client = TestClient(main.app)
+    page = client.get("/api/prices", params={"item": "onion", "sort": "-price", "limit": 1}).json()
+    assert page == {"items": [RECORDS[0]], "total": 2, "next_cursor": "1"}
+    assert client.get("/api/prices", params={"sort": "name"}).status_code == 400
@@ -0,0 +1,67 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+from rate_limit import MemoryBuckets, RateLimiter, _key_id, budget_of
+
+
+def scope(api_key=None, ip="10.0.0.1"):
+    headers = [(b"x-api-key", api_key.encode())] if api_key else []
+    return {"type": "http", "headers": headers, "client": (ip, 1234)}
+
+
+def test_model_backed_endpoints_use_the_llm_budget():
+    assert budget_of("/api/chat") == "llm"
+    assert budget_of("/api/translate/batch") == "llm"
+    assert budget_of("/api/detect-language") == "llm"
+    assert budget_of("/api/prices") == "cheap"
+    assert budget_of("/api/metrics") is None
+    assert budget_of("/index.html") is None
+
+
+def test_only_configured_keys_identify_a_client():
+    limiter = RateLimiter({"cheap": (1, 1)}, MemoryBuckets(), {_key_id("partner"): 4.0})
+    assert limiter.identify(scope("partner")) == _key_id("partner")
+    assert limiter.identify(scope("made-up")) == "ip:10.0.0.1"
+    assert limiter.identify(scope()) == "ip:10.0.0.1"
+
+
+def test_bucket_refuses_once_the_burst_is_spent():
+    limiter = RateLimiter({"llm": (0.5, 2)}, MemoryBuckets())
+
+    async def main():
+        return [await limiter.take("ip:1", "llm") for _ in range(3)]
+
+    results = asyncio.run(main())
+    assert [allowed for allowed, _, _, _ in results] == [True, True, False]
+    # Refills at 0.5 tokens/s, so the next token is about two seconds away
+    assert results[-1][3] == pytest.approx(2.0, abs=0.1)
+    assert limiter.stats["llm"] == {"allowed": 2, "limited": 1}
+
+
+def test_costly_endpoints_take_more_tokens():
+    limiter = RateLimiter({"llm": (0.1, 5)}, MemoryBuckets())
+
+    async def main():
+        first = await limiter.take("ip:1", "llm", 5.0)
+        second = await limiter.take("ip:1", "llm", 1.0)
+        return first[0], second[0]
+
+    assert asyncio.run(main()) == (True, False)
+
+
+def test_rejections_carry_cors_and_retry_after(monkeypatch):
+    import main
+
+    monkeypatch.setattr(main.rate_limiter, "store", MemoryBuckets())
+    monkeypatch.setitem(main.rate_limiter.limits, "cheap", (0.01, 1.0))
+    client = TestClient(main.app)
+    headers = {"Origin": "http://localhost:3000"}
+    client.get("/api/not-a-route", headers=headers)
+    response = client.get("/api/not-a-route", headers=headers)
+
+    assert response.status_code == 429
+    assert response.headers["access-control-allow-origin"]
+    assert int(response.headers["retry-after"]) >= 1
+    assert "retry-after" in response.headers["access-control-expose-headers"].lower()
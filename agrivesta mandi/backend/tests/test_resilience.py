@@ -0,0 +1,111 @@
+import pytest
+
+from resilience import CLOSED, FIRST_CHUNK, FULL, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpen
+
+
+def make_breaker(**kwargs):
+    options = dict(window=60, min_calls=4, failure_ratio=0.5, slow_call=8, slow_ratio=0.8,
+                   open_for=0, probes=2, slow_first_chunk=2)
+    options.update(kwargs)
+    return CircuitBreaker("test", **options)
+
+
+def fail(breaker, times=1):
+    for _ in range(times):
+        breaker.record(False, 0.1, breaker.allow())
+
+
+def test_trips_after_enough_failures():
+    breaker = make_breaker(open_for=60)
+    fail(breaker, 3)
+    assert breaker.state == CLOSED
+    fail(breaker)
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpen):
+        breaker.allow()
+    assert breaker.rejected == 1
+    assert breaker.trips == 1
+
+
+def test_half_open_limits_probes_and_closes_on_success():
+    breaker = make_breaker()
+    fail(breaker, 4)
+    first = breaker.allow()
+    assert breaker.state == HALF_OPEN
+    second = breaker.allow()
+    with pytest.raises(CircuitOpen):
+        breaker.allow()
+    breaker.record(True, 0.1, first)
+    assert breaker.state == HALF_OPEN
+    breaker.record(True, 0.1, second)
+    assert breaker.state == CLOSED
+
+
+def test_failed_or_slow_probe_reopens():
+    breaker = make_breaker()
+    fail(breaker, 4)
+    breaker.record(False, 0.1, breaker.allow())
+    assert breaker.state == OPEN
+    breaker.record(True, 9, breaker.allow())
+    assert breaker.state == OPEN
+    assert breaker.trips == 3
+
+
+def test_stale_probe_cannot_close_a_later_round():
+    breaker = make_breaker()
+    fail(breaker, 4)
+    stale, other = breaker.allow(), breaker.allow()
+    # The round fails while the first probe is still running
+    breaker.record(False, 0.1, other)
+    assert breaker.state == OPEN
+    current = breaker.allow()
+    assert breaker.state == HALF_OPEN
+
+    breaker.record(True, 0.1, stale)
+    breaker.release(stale)
+    assert breaker.state == HALF_OPEN
+    # The stale probe neither counted as a success nor freed a slot
+    last = breaker.allow()
+    with pytest.raises(CircuitOpen):
+        breaker.allow()
+
+    breaker.record(True, 0.1, current)
+    assert breaker.state == HALF_OPEN
+    breaker.record(True, 0.1, last)
+    assert breaker.state == CLOSED
+
+
+def test_call_admitted_before_trip_is_ignored():
+    breaker = make_breaker(open_for=60)
+    late = breaker.allow()
+    fail(breaker, 4)
+    breaker.record(True, 0.1, late)
+    assert breaker.state == OPEN
+
+
+def test_release_frees_a_cancelled_probe():
+    breaker = make_breaker(probes=1)
+    fail(breaker, 4)
+    breaker.release(breaker.allow())
+    breaker.record(True, 0.1, breaker.allow())
+    assert breaker.state == CLOSED
+
+
+def test_latency_windows_are_kept_per_kind():
+    breaker = make_breaker()
+    for _ in range(20):
+        breaker.record(True, 6.0, breaker.allow(), FULL)
+        breaker.record(True, 0.5, breaker.allow(), FIRST_CHUNK)
+    assert breaker.p95(FULL) == 6.0
+    assert breaker.p95(FIRST_CHUNK) == 0.5
+
+
+def test_slow_threshold_depends_on_kind():
+    breaker = make_breaker(min_calls=5, failure_ratio=1.0, slow_ratio=0.8)
+    # 3s is normal for a full answer but slow for a first chunk
+    for _ in range(5):
+        breaker.record(True, 3.0, breaker.allow(), FULL)
+    assert breaker.state == CLOSED
+    for _ in range(20):
+        breaker.record(True, 3.0, breaker.allow(), FIRST_CHUNK)
+    assert breaker.state == OPEN
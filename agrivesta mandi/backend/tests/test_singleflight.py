@@ -0,0 +1,78 @@
+import asyncio
+
+import pytest
+
+from singleflight import SingleFlight
+
+
+def test_concurrent_callers_share_one_call():
+    flight = SingleFlight()
+    calls = 0
+
+    async def fetch():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return "answer"
+
+    async def main():
+        return await asyncio.gather(*(flight.do("tomato", fetch) for _ in range(5)))
+
+    assert asyncio.run(main()) == ["answer"] * 5
+    assert calls == 1
+    assert flight.snapshot()["coalesced"] == 4
+
+
+def test_error_reaches_every_waiter():
+    flight = SingleFlight()
+    calls = 0
+
+    async def fetch():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream down")
+
+    async def main():
+        return await asyncio.gather(*(flight.do("tomato", fetch) for _ in range(3)),
+                                    return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert calls == 1
+    assert all(isinstance(r, RuntimeError) and str(r) == "upstream down" for r in results)
+    assert flight.snapshot()["in_flight"] == 0
+
+
+def test_failed_call_is_not_reused():
+    flight = SingleFlight()
+    outcomes = [RuntimeError("first"), "second"]
+
+    async def fetch():
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    async def main():
+        with pytest.raises(RuntimeError):
+            await flight.do("onion", fetch)
+        return await flight.do("onion", fetch)
+
+    assert asyncio.run(main()) == "second"
+
+
+def test_cancelled_waiter_does_not_cancel_the_call():
+    flight = SingleFlight()
+
+    async def fetch():
+        await asyncio.sleep(0.02)
+        return "answer"
+
+    async def main():
+        leaving = asyncio.ensure_future(flight.do("rice", fetch))
+        staying = asyncio.ensure_future(flight.do("rice", fetch))
+        await asyncio.sleep(0)
+        leaving.cancel()
+        return await staying
+
+    assert asyncio.run(main()) == "answer"
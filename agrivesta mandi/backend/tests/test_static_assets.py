@@ -0,0 +1,110 @@
+import gzip
+import json
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import static_assets
+from compression import compress, negotiate
+from fast_json import dumps
+from static_assets import PrecompressedStaticFiles, build, frontend_directory
+
+SCRIPT = "console.log('mandi');\n" * 40
+
+
+@pytest.mark.parametrize("header, offered, expected", [
+    ("gzip, deflate, br", ("br", "gzip"), "br"),
+    ("gzip, br;q=0.5", ("br", "gzip"), "gzip"),
+    ("br;q=0, gzip;q=0", ("br", "gzip"), None),
+    ("*", ("gzip",), "gzip"),
+    ("identity", ("br", "gzip"), None),
+    (None, ("gzip",), None),
+    ("br", ("gzip",), None),
+])
+def test_negotiate(header, offered, expected):
+    assert negotiate(header, offered) == expected
+
+
+def test_gzip_is_deterministic():
+    data = SCRIPT.encode()
+    assert compress(data, "gzip") == compress(data, "gzip")
+    assert gzip.decompress(compress(data, "gzip", best=True)) == data
+    with pytest.raises(ValueError):
+        compress(data, "zstd")
+
+
+def test_dumps_is_compact_utf8():
+    assert dumps({"item": "टमाटर", "price": [40, 42.5]}) == '{"item":"टमाटर","price":[40,42.5]}'.encode()
+    with pytest.raises(TypeError):
+        dumps({"when": object()})
+
+
+@pytest.fixture
+def frontend(tmp_path):
+    source = tmp_path / "frontend"
+    (source / "js").mkdir(parents=True)
+    (source / "js" / "app.js").write_text(SCRIPT, encoding="utf-8")
+    (source / "index.html").write_text(
+        '<script src="js/app.js"></script><a href="https://example.com/x.js">x</a>', encoding="utf-8"
+    )
+    return source
+
+
+def test_build_hashes_assets_and_rewrites_html(frontend):
+    manifest = build(frontend)
+    hashed = manifest["assets"]["js/app.js"]
+    dist = frontend / "dist"
+
+    assert hashed.startswith("js/app.") and hashed.endswith(".js") and hashed != "js/app.js"
+    html = (dist / "index.html").read_text(encoding="utf-8")
+    assert f'src="{hashed}"' in html
+    assert 'href="https://example.com/x.js"' in html
+    assert gzip.decompress((dist / (hashed + ".gz")).read_bytes()) == SCRIPT.encode()
+    assert json.loads((dist / "asset-manifest.json").read_text())["assets"] == manifest["assets"]
+
+
+def test_stale_builds_are_not_served(frontend):
+    assert frontend_directory(frontend) == frontend
+    build(frontend)
+    assert frontend_directory(frontend) == frontend / "dist"
+    (frontend / "js" / "app.js").write_text(SCRIPT + "// changed\n", encoding="utf-8")
+    assert frontend_directory(frontend) == frontend
+
+
+def test_serves_precompressed_variants_with_cache_headers(frontend, monkeypatch):
+    # Only gzip, so the test does not depend on brotli being installed
+    monkeypatch.setattr(static_assets, "available_encodings", lambda: ("gzip",))
+    hashed = build(frontend)["assets"]["js/app.js"]
+    app = FastAPI()
+    app.mount("/", PrecompressedStaticFiles(directory=str(frontend / "dist"), html=True))
+    client = TestClient(app)
+
+    asset = client.get("/" + hashed, headers={"Accept-Encoding": "gzip"})
+    assert asset.headers["content-encoding"] == "gzip"
+    assert asset.headers["content-type"].startswith(("text/javascript", "application/javascript"))
+    assert asset.headers["cache-control"] == static_assets.IMMUTABLE_CACHE
+    assert asset.headers["vary"] == "Accept-Encoding"
+    assert asset.text == SCRIPT
+
+    plain = client.get("/" + hashed, headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers
+    page = client.get("/")
+    assert page.headers["cache-control"] == static_assets.REVALIDATE_CACHE
+    revalidated = client.get("/", headers={"If-None-Match": page.headers["etag"]})
+    assert revalidated.status_code == 304
+
+
+def test_full_price_list_is_sent_compressed(monkeypatch, tmp_path):
+    import main
+    from price_store import PriceStore
+
+    prices = tmp_path / "prices.json"
+    prices.write_text(json.dumps([{"item": "Onion", "price": "30/kg", "location": "Pune"}] * 50))
+    monkeypatch.setattr(main, "price_store", PriceStore(paths=(prices,), check_interval=60))
+    monkeypatch.setattr(main, "available_encodings", lambda: ("gzip",))
+    response = TestClient(main.app).get("/api/prices", headers={"Accept-Encoding": "gzip"})
+
+    assert response.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert len(response.json()) == 50
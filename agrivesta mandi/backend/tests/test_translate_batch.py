@@ -0,0 +1,92 @@
+import asyncio
+import json
+
+import pytest
+
+import services
+from admission import Overloaded
+from cache import LRUCache, TieredCache
+
+
+@pytest.fixture(autouse=True)
+def memory(monkeypatch):
+    cache = TieredCache("test", LRUCache(64))
+    monkeypatch.setattr(services, "translation_memory", cache)
+    return cache
+
+
+def entries_of(prompt):
+    return json.loads(prompt.rsplit("Entries:\n", 1)[1])
+
+
+def fake_model(monkeypatch, skip=()):
+    """Translates every entry as "<lang>:<text>", leaving out `skip` on the first call."""
+    calls = []
+
+    async def generate(prompt, kind="chat"):
+        calls.append(entries_of(prompt))
+        answer = {
+            text_id: {lang: f"{lang}:{entry['text']}" for lang in entry["languages"]
+                      if len(calls) > 1 or (text_id, lang) not in skip}
+            for text_id, entry in calls[-1].items()
+        }
+        return "```json\n" + json.dumps(answer, ensure_ascii=False) + "\n```"
+
+    monkeypatch.setattr(services, "_generate", generate)
+    return calls
+
+
+def test_one_call_translates_every_text_and_language(monkeypatch):
+    calls = fake_model(monkeypatch)
+    result = asyncio.run(services.translate_batch(["Onion", "Rice"], ["Hindi", "Tamil"]))
+
+    assert len(calls) == 1
+    assert result["translations"][1] == {"text": "Rice", "translations": {"Hindi": "Hindi:Rice", "Tamil": "Tamil:Rice"}}
+    assert result["stats"] == {"cached": 0, "translated": 4, "failed": 0, "upstream_calls": 1}
+
+
+def test_only_missing_entries_are_retried(monkeypatch):
+    calls = fake_model(monkeypatch, skip={("1", "Tamil")})
+    result = asyncio.run(services.translate_batch(["Onion", "Rice"], ["Hindi", "Tamil"]))
+
+    assert calls[1] == {"1": {"text": "Rice", "languages": ["Tamil"]}}
+    assert result["translations"][1]["translations"]["Tamil"] == "Tamil:Rice"
+    assert result["stats"]["upstream_calls"] == 2
+
+
+def test_cached_and_unsupported_entries_skip_the_model(monkeypatch, memory):
+    calls = fake_model(monkeypatch)
+    asyncio.run(memory.set(services._translation_key("Onion", "Hindi"), "प्याज"))
+    result = asyncio.run(services.translate_batch(["onion "], ["Hindi", "Klingon"]))
+
+    assert calls == []
+    assert result["translations"][0]["translations"] == {
+        "Hindi": "प्याज", "Klingon": "[Unsupported language: Klingon]",
+    }
+    assert result["stats"]["cached"] == 1 and result["stats"]["failed"] == 1
+
+
+def test_entries_still_missing_after_retries_fail_gracefully(monkeypatch):
+    async def broken(prompt, kind="chat"):
+        return "not json"
+
+    monkeypatch.setattr(services, "_generate", broken)
+    result = asyncio.run(services.translate_batch(["Onion"], ["Hindi"]))
+    assert result["translations"][0]["translations"]["Hindi"] == "[Translation failed] Onion"
+    assert result["stats"]["upstream_calls"] == 1 + services.BATCH_RETRIES
+
+
+def test_overload_is_not_swallowed(monkeypatch):
+    async def overloaded(prompt, kind="chat"):
+        raise Overloaded("translate", 2)
+
+    monkeypatch.setattr(services, "_generate", overloaded)
+    with pytest.raises(Overloaded):
+        asyncio.run(services.translate_batch(["Onion"], ["Hindi"]))
+
+
+def test_packing_respects_the_output_limit(monkeypatch):
+    monkeypatch.setattr(services, "BATCH_MAX_OUTPUTS_PER_CALL", 3)
+    langs = ["Hindi", "Tamil", "Telugu", "Bengali"]
+    calls = services._pack_batches([(0, "Onion", langs), (1, "Rice", ["Hindi"])])
+    assert calls == [[(0, "Onion", langs[:3])], [(0, "Onion", langs[3:]), (1, "Rice", ["Hindi"])]]
@@ -592,6 +592,9 @@ document.addEventListener('keydown', (e) => {
 });
 
 // ===== AI CHAT ASSISTANT =====
+// Server-side conversation id, so follow-up questions keep their context
+let chatSessionId = null;
+
 async function sendChatMessage() {
     const message = DOM.chatInput?.value.trim();
     const language = DOM.chatLang?.value || 'Hinglish';
@@ -622,7 +625,9 @@ async function sendChatMessage() {
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify({
                 message,
-                language
+                language,
+                session: true,
+                session_id: chatSessionId
             })
         });
 
@@ -635,6 +640,7 @@ async function sendChatMessage() {
         }
 
         const data = await res.json();
+        chatSessionId = data.session_id || chatSessionId;
         addChatMessage(data.response, 'ai');
 
     } catch (err) {
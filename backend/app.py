@@ -1,18 +1,33 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
 import os
 import requests
 
+from upstream import (
+    AI_MODEL,
+    OPENROUTER_API_KEY,
+    OPENROUTER_URL,
+    SSE_HEADERS,
+    UPSTREAM_TIMEOUT,
+    ProxyError,
+    StreamRelay,
+    build_payload,
+    extract_content,
+    sse_error,
+    upstream_error,
+    upstream_headers,
+    wants_stream,
+)
+from response_cache import cache_headers, cache_key, is_cacheable, response_cache
+from routing import model_router
+
 app = Flask(__name__)
-CORS(app)  # Allow Flutter app to call this
+CORS(app, expose_headers=["X-Cache", "X-Cache-Tier", "X-Model", "Retry-After"])  # Allow Flutter app to call this
 
-# ── OpenRouter Configuration ──────────────────────────────────────────────────
-# Set these environment variables before running:
-#   set OPENROUTER_API_KEY=sk-or-v1-your-key-here
-#   set AI_MODEL=google/gemini-2.0-flash-exp
-OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY", "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")
-AI_MODEL = os.getenv("AI_MODEL", "deepseek/deepseek-r1:free")
-OPENROUTER_URL = "https://openrouter.ai/api/v1/chat/completions"
+# Keep-alive session shared by all requests, so repeat calls reuse the
+# TCP+TLS connection to OpenRouter instead of reconnecting every time.
+# For many concurrent users run the async mode instead: uvicorn asgi:app
+http = requests.Session()
 
 
 @app.route("/")
@@ -21,6 +36,8 @@ def index():
         "status": "ok",
         "message": "Agri Vista AI Proxy is running!",
         "model": AI_MODEL,
+        "cache": response_cache.snapshot(),
+        "routing": model_router.snapshot(),
     })
 
 
@@ -36,7 +53,10 @@ def api_chat():
                 {"role": "user", "content": "Hello"}
             ],
             "temperature": 0.7,    // optional
-            "max_tokens": 512      // optional
+            "max_tokens": 512,     // optional
+            "cache": true,         // optional; default: cached when temperature <= 0.3
+            "stream": false,       // optional, or send Accept: text/event-stream
+            "include_reasoning": false  // optional, streaming only
         }
     
     Response:
@@ -44,55 +64,119 @@ def api_chat():
             "success": true,
             "content": "AI response text here"
         }
+
+    Streaming response (text/event-stream), OpenRouter's chunk format:
+        data: {"choices": [{"delta": {"content": "AI "}}], ...}
+        data: {"choices": [{"delta": {"content": "response"}}], ...}
+        data: [DONE]
+    Errors before the first chunk are returned as JSON as above; later
+    ones arrive as data: {"error": {"message": "..."}}.
     """
     try:
         data = request.json
-        messages = data.get("messages", [])
-        temperature = data.get("temperature", 0.7)
-        max_tokens = data.get("max_tokens", 512)
+        stream = wants_stream(data, request.headers.get("Accept", ""))
+        try:
+            payload = build_payload(data, stream=stream)
+            if stream:
+                return _stream_chat(payload, data.get("include_reasoning", False))
+
+            # Which pool model answered; unknown for cache hits
+            answered = {}
+
+            def fetch():
+                answer, answered["model"] = model_router.run(lambda model: _complete(payload, model))
+                return answer
+
+            if is_cacheable(data, payload):
+                content, status, tier = response_cache.get_or_fetch(
+                    cache_key(payload, model_router.models), fetch, model_router.time_budget())
+            else:
+                response_cache.stats["bypassed"] += 1
+                (content, _), status, tier = fetch(), "BYPASS", None
+        except ProxyError as e:
+            headers = {"Retry-After": str(e.retry_after)} if e.retry_after else {}
+            return jsonify({"success": False, "error": e.error}), e.status, headers
+
+        headers = cache_headers(status, tier)
+        if "model" in answered:
+            headers["X-Model"] = answered["model"]
+        return jsonify({"success": True, "content": content}), 200, headers
+
+    except Exception as e:
+        print(f"Error in /api/chat: {str(e)}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+def _complete(payload, model):
+    """
+    Calls OpenRouter with one pool model and returns (answer text,
+    finish_reason).
+
+    Raises:
+        ProxyError: With OpenRouter's status code if it did not answer 200
+    """
+    response = http.post(
+        OPENROUTER_URL,
+        headers=upstream_headers(),
+        json={**payload, "model": model},
+        timeout=UPSTREAM_TIMEOUT,
+    )
+
+    if response.status_code != 200:
+        print(f"OpenRouter error ({model}): {response.status_code} {response.text}")
+        raise upstream_error(response)
+
+    return extract_content(response.json())
+
 
-        if not messages:
-            return jsonify({"success": False, "error": "No messages provided"}), 400
+def _stream_chat(payload, include_reasoning):
+    """
+    Relays OpenRouter's SSE deltas chunk by chunk without buffering.
 
-        if not OPENROUTER_API_KEY:
-            return jsonify({"success": False, "error": "API key not configured"}), 500
+    WHY: Reasoning models can take tens of seconds to finish; streaming
+    lets the app show the answer as it is written. When the client
+    disconnects, the generator is closed and the upstream connection
+    with it, which stops the generation.
 
-        # Call OpenRouter
-        response = requests.post(
+    Raises:
+        ProxyError: If every pool model failed before the first chunk
+    """
+    def open_stream(model):
+        response = http.post(
             OPENROUTER_URL,
-            headers={
-                "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-                "Content-Type": "application/json",
-            },
-            json={
-                "model": AI_MODEL,
-                "messages": messages,
-                "temperature": temperature,
-                "max_tokens": max_tokens,
-            },
-            timeout=30,
+            headers=upstream_headers(),
+            json={**payload, "model": model},
+            timeout=UPSTREAM_TIMEOUT,
+            stream=True,
         )
-
         if response.status_code != 200:
-            print(f"OpenRouter error: {response.status_code} {response.text}")
-            return jsonify({
-                "success": False,
-                "error": f"AI API error: {response.status_code}",
-            }), response.status_code
+            print(f"OpenRouter error ({model}): {response.status_code} {response.text}")
+            response.close()
+            raise upstream_error(response)
+        return response
 
-        result = response.json()
-        content = result["choices"][0]["message"]["content"]
+    response, model = model_router.run(open_stream, measure=False)
+    # SSE is UTF-8; without a charset requests would assume Latin-1
+    response.encoding = "utf-8"
 
-        return jsonify({"success": True, "content": content})
+    def relay():
+        events = StreamRelay(include_reasoning)
+        try:
+            for line in response.iter_lines(chunk_size=None, decode_unicode=True):
+                yield from events.feed(line)
+        except Exception as e:
+            print(f"Error in /api/chat stream: {str(e)}")
+            yield sse_error(str(e))
+        finally:
+            response.close()
+        yield from events.finish()
 
-    except Exception as e:
-        print(f"Error in /api/chat: {str(e)}")
-        return jsonify({"success": False, "error": str(e)}), 500
+    return Response(relay(), mimetype="text/event-stream", headers={**SSE_HEADERS, "X-Model": model})
 
 
 if __name__ == "__main__":
     port = int(os.getenv("PORT", 5000))
     print(f"🚀 Agri Vista AI Proxy starting on port {port}")
-    print(f"📡 Model: {AI_MODEL}")
+    print(f"📡 Models: {', '.join(model_router.models)}")
     print(f"🔑 API Key: {'✅ Set' if OPENROUTER_API_KEY else '❌ NOT SET'}")
     app.run(host="0.0.0.0", port=port, debug=True)
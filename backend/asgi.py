@@ -0,0 +1,181 @@
+"""
+Async serving mode for the Agri Vista AI proxy.
+
+Same routes and JSON contract as app.py (the Flutter app needs no
+changes), but each in-flight OpenRouter call is a coroutine rather than
+a blocked worker thread, and all calls share one keep-alive connection
+pool (HTTP/2 when h2 is installed).
+
+Run:
+    uvicorn asgi:app --host 0.0.0.0 --port 5000 --workers 2
+
+WHY: The Flask proxy holds a thread for the full LLM call (often several
+seconds), so a handful of slow answers exhausted the workers.
+"""
+import os
+from contextlib import AsyncExitStack, asynccontextmanager
+
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+from upstream import (
+    AI_MODEL,
+    OPENROUTER_API_KEY,
+    OPENROUTER_URL,
+    SSE_HEADERS,
+    ProxyError,
+    StreamRelay,
+    UpstreamPool,
+    build_payload,
+    extract_content,
+    sse_error,
+    upstream_error,
+    upstream_headers,
+    wants_stream,
+)
+from response_cache import cache_headers, cache_key, is_cacheable, response_cache
+from routing import model_router
+
+
+async def index(request: Request):
+    return JSONResponse({
+        "status": "ok",
+        "message": "Agri Vista AI Proxy is running!",
+        "model": AI_MODEL,
+        "pool": request.app.state.pool.snapshot(),
+        "cache": response_cache.snapshot(),
+        "routing": model_router.snapshot(),
+    })
+
+
+async def api_chat(request: Request):
+    """
+    Simple AI chat endpoint for the Flutter app (see app.py for the
+    request and response format).
+    """
+    try:
+        data = await request.json()
+        stream = wants_stream(data, request.headers.get("accept", ""))
+        try:
+            payload = build_payload(data, stream=stream)
+            if stream:
+                return await _stream_chat(request, payload, data.get("include_reasoning", False))
+            pool = request.app.state.pool
+            # Which pool model answered; unknown for cache hits
+            answered = {}
+
+            async def fetch():
+                answer, answered["model"] = await model_router.arun(
+                    lambda model: _complete(pool, payload, model))
+                return answer
+
+            if is_cacheable(data, payload):
+                content, status, tier = await response_cache.aget_or_fetch(
+                    cache_key(payload, model_router.models), fetch)
+            else:
+                response_cache.stats["bypassed"] += 1
+                (content, _), status, tier = await fetch(), "BYPASS", None
+        except ProxyError as e:
+            headers = {"Retry-After": str(e.retry_after)} if e.retry_after else None
+            return JSONResponse({"success": False, "error": e.error}, status_code=e.status, headers=headers)
+
+        headers = cache_headers(status, tier)
+        if "model" in answered:
+            headers["X-Model"] = answered["model"]
+        return JSONResponse({"success": True, "content": content}, headers=headers)
+
+    except Exception as e:
+        print(f"Error in /api/chat: {str(e)}")
+        return JSONResponse({"success": False, "error": str(e)}, status_code=500)
+
+
+async def _complete(pool: UpstreamPool, payload: dict, model: str) -> tuple:
+    """
+    Calls OpenRouter with one pool model and returns (answer text,
+    finish_reason).
+
+    Raises:
+        ProxyError: With OpenRouter's status code if it did not answer 200
+    """
+    response = await pool.post(OPENROUTER_URL, {**payload, "model": model}, upstream_headers())
+    if response.status_code != 200:
+        print(f"OpenRouter error ({model}): {response.status_code} {response.text}")
+        raise upstream_error(response)
+    return extract_content(response.json())
+
+
+async def _stream_chat(request: Request, payload: dict, include_reasoning: bool):
+    """
+    Relays OpenRouter's SSE deltas as they arrive.
+
+    WHY: Upstream errors arrive before the first byte, so they are still
+    answered with the usual JSON error and status code. Once streaming,
+    a client disconnect cancels relay(), whose exit stack closes the
+    upstream connection and stops the generation.
+
+    Raises:
+        ProxyError: If every pool model failed before the first chunk
+    """
+    async def open_stream(model: str):
+        stack = AsyncExitStack()
+        response = await stack.enter_async_context(request.app.state.pool.stream(
+            OPENROUTER_URL, {**payload, "model": model}, upstream_headers()))
+        if response.status_code != 200:
+            body = await response.aread()
+            await stack.aclose()
+            print(f"OpenRouter error ({model}): {response.status_code} {body.decode('utf-8', 'replace')}")
+            raise upstream_error(response)
+        return response, stack
+
+    (response, stack), model = await model_router.arun(open_stream, measure=False, hedge=False)
+
+    async def relay():
+        events = StreamRelay(include_reasoning)
+        async with stack:
+            try:
+                async for line in response.aiter_lines():
+                    for event in events.feed(line):
+                        yield event
+            except Exception as e:
+                print(f"Error in /api/chat stream: {str(e)}")
+                yield sse_error(str(e))
+            for event in events.finish():
+                yield event
+
+    return StreamingResponse(relay(), media_type="text/event-stream",
+                             headers={**SSE_HEADERS, "X-Model": model})
+
+
+@asynccontextmanager
+async def lifespan(app: Starlette):
+    # One pool per worker process, opened inside its event loop
+    app.state.pool = UpstreamPool()
+    print(f"📡 Models: {', '.join(model_router.models)}")
+    print(f"🔑 API Key: {'✅ Set' if OPENROUTER_API_KEY else '❌ NOT SET'}")
+    print(f"🔌 Upstream pool: HTTP/{'2' if app.state.pool.http2 else '1.1'} keep-alive")
+    yield
+    await app.state.pool.aclose()
+
+
+app = Starlette(
+    routes=[
+        Route("/", index),
+        Route("/api/chat", api_chat, methods=["POST"]),
+    ],
+    # Allow Flutter app to call this
+    middleware=[Middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"],
+                           expose_headers=["X-Cache", "X-Cache-Tier", "X-Model", "Retry-After"])],
+    lifespan=lifespan,
+)
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    port = int(os.getenv("PORT", 5000))
+    print(f"🚀 Agri Vista AI Proxy (async) starting on port {port}")
+    uvicorn.run(app, host="0.0.0.0", port=port)
@@ -0,0 +1,355 @@
+"""
+Response cache for the Agri Vista AI proxy.
+
+Answers are keyed by a SHA-256 of the canonical JSON of (model pool,
+messages, temperature, max_tokens) and kept in two tiers:
+- memory: LRU with TTL, per worker process
+- disk:   SQLite (WAL) with TTL, shared by all workers and restarts
+
+Only deterministic-enough requests are cached: temperature at or below
+PROXY_CACHE_MAX_TEMPERATURE, or any request sending "cache": true
+("cache": false always bypasses). Only complete answers are stored:
+an empty answer, or one cut short (finish_reason other than "stop",
+e.g. "length"), is returned to the client but not cached. Concurrent
+identical misses share one upstream call, in both the Flask (threads)
+and async (tasks) modes.
+
+WHY: The app sends the same system prompt with the same handful of
+questions over and over; each repeat was a paid call taking seconds.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Optional
+
+from upstream import ProxyError
+
+PROXY_CACHE = os.getenv("PROXY_CACHE", "1") == "1"
+# Requests at or below this temperature are cached without asking
+PROXY_CACHE_MAX_TEMPERATURE = float(os.getenv("PROXY_CACHE_MAX_TEMPERATURE", "0.3"))
+PROXY_CACHE_ENTRIES = int(os.getenv("PROXY_CACHE_ENTRIES", "2048"))
+PROXY_CACHE_TTL = float(os.getenv("PROXY_CACHE_TTL", str(24 * 3600)))
+PROXY_CACHE_DB = Path(
+    os.getenv("PROXY_CACHE_DB", str(Path(__file__).parent / "data" / "proxy_cache.sqlite3"))
+)
+# Rows kept on disk; the oldest are pruned beyond this
+PROXY_CACHE_MAX_ROWS = int(os.getenv("PROXY_CACHE_MAX_ROWS", "50000"))
+
+
+def cache_key(payload: dict, pool: Optional[list] = None) -> str:
+    """
+    Canonical hash of the fields that determine an answer.
+
+    Keys are sorted and numbers normalized (0.2 and 0.20, 512 and 512.0
+    hash alike), so equivalent request bodies share an entry.
+
+    The key names the model pool, not the model that answered: routing
+    treats the pool's models as interchangeable for a request, so an
+    answer from a failover model is as good a hit as one from AI_MODEL.
+    Changing the pool starts a fresh set of keys.
+
+    Args:
+        payload: The OpenRouter payload
+        pool: Models the request may be routed to (default: payload's model)
+    """
+    canonical = json.dumps(
+        {
+            "models": list(pool) if pool else [payload["model"]],
+            "messages": payload["messages"],
+            "temperature": float(payload["temperature"]),
+            "max_tokens": int(payload["max_tokens"]),
+        },
+        sort_keys=True,
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def is_cacheable(data: dict, payload: dict) -> bool:
+    """Whether a request may be answered from (and stored in) the cache."""
+    if not PROXY_CACHE or payload.get("stream"):
+        return False
+    explicit = data.get("cache")
+    if explicit is not None:
+        return bool(explicit)
+    try:
+        return float(payload["temperature"]) <= PROXY_CACHE_MAX_TEMPERATURE
+    except (TypeError, ValueError):
+        return False
+
+
+def is_complete(content, finish_reason) -> bool:
+    """Whether an answer is worth caching: non-blank and finished normally."""
+    return isinstance(content, str) and bool(content.strip()) and finish_reason == "stop"
+
+
+class _Flight:
+    """One upstream call shared by concurrent identical misses (threads)."""
+
+    __slots__ = ("event", "value", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class ResponseCache:
+    """
+    LRU memory tier in front of a SQLite disk tier, with coalescing of
+    concurrent misses and hit/miss counters.
+
+    Lookups return (content, status) where status is what the X-Cache
+    header reports: HIT (with tier "memory" or "disk"), MISS, or
+    COALESCED for a miss that waited on an identical in-flight call.
+
+    Args:
+        max_entries: Memory tier size
+        ttl: Seconds an answer stays valid in both tiers
+        path: SQLite file, or None for memory only
+    """
+
+    # Prune expired/excess rows every N writes rather than on each one
+    PRUNE_EVERY = 200
+
+    def __init__(self, max_entries: int = PROXY_CACHE_ENTRIES, ttl: float = PROXY_CACHE_TTL,
+                 path: Optional[Path] = PROXY_CACHE_DB, max_rows: int = PROXY_CACHE_MAX_ROWS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = Path(path) if path else None
+        self.max_rows = max_rows
+        self._memory: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._disk_disabled = self.path is None
+        self._writes = 0
+        self._flights = {}
+        self._tasks = {}
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "coalesced": 0,
+                      "writes": 0, "bypassed": 0}
+
+    # ── Memory tier ──────────────────────────────────────────────────────────
+
+    def _memory_get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                return None
+            content, expires = entry
+            if expires < time.monotonic():
+                del self._memory[key]
+                return None
+            self._memory.move_to_end(key)
+            return content
+
+    def _memory_set(self, key: str, content: str, ttl: float) -> None:
+        with self._lock:
+            self._memory[key] = (content, time.monotonic() + ttl)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    # ── Disk tier ────────────────────────────────────────────────────────────
+
+    def _conn(self) -> Optional[sqlite3.Connection]:
+        if self._disk_disabled:
+            return None
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                conn = sqlite3.connect(str(self.path), timeout=5, isolation_level=None)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS responses ("
+                    " key TEXT PRIMARY KEY, content TEXT NOT NULL,"
+                    " expires REAL NOT NULL, updated REAL NOT NULL)"
+                )
+            except (OSError, sqlite3.Error) as e:
+                # WHY: Read-only filesystems (e.g. serverless) fall back to memory only
+                print(f"Proxy disk cache disabled: {e}")
+                self._disk_disabled = True
+                return None
+            self._local.conn = conn
+        return conn
+
+    def _disk_get(self, key: str) -> Optional[tuple]:
+        """Returns (content, seconds left) or None."""
+        conn = self._conn()
+        if conn is None:
+            return None
+        try:
+            row = conn.execute("SELECT content, expires FROM responses WHERE key = ?", (key,)).fetchone()
+        except sqlite3.Error as e:
+            print(f"Proxy disk cache read error: {e}")
+            return None
+        if row is None or row[1] < time.time():
+            return None
+        return row[0], row[1] - time.time()
+
+    def _disk_set(self, key: str, content: str) -> None:
+        conn = self._conn()
+        if conn is None:
+            return
+        now = time.time()
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, content, expires, updated) VALUES (?, ?, ?, ?)",
+                (key, content, now + self.ttl, now),
+            )
+            self._writes += 1
+            if self._writes % self.PRUNE_EVERY == 0:
+                conn.execute("DELETE FROM responses WHERE expires < ?", (now,))
+                conn.execute(
+                    "DELETE FROM responses WHERE key IN ("
+                    " SELECT key FROM responses ORDER BY updated DESC LIMIT -1 OFFSET ?)",
+                    (self.max_rows,),
+                )
+        except sqlite3.Error as e:
+            print(f"Proxy disk cache write error: {e}")
+
+    # ── Lookups ──────────────────────────────────────────────────────────────
+
+    def lookup(self, key: str) -> Optional[tuple]:
+        """Returns (content, tier) on a hit, else None (not counted as a miss)."""
+        content = self._memory_get(key)
+        if content is not None:
+            self.stats["memory_hits"] += 1
+            return content, "memory"
+        found = self._disk_get(key)
+        if found is not None:
+            content, remaining = found
+            self.stats["disk_hits"] += 1
+            # Promote, but never past the disk row's own expiry
+            self._memory_set(key, content, remaining)
+            return content, "disk"
+        return None
+
+    def store(self, key: str, content: str) -> None:
+        self._memory_set(key, content, self.ttl)
+        self._disk_set(key, content)
+        self.stats["writes"] += 1
+
+    def get_or_fetch(self, key: str, fetch: Callable[[], tuple], wait: float) -> tuple:
+        """
+        Cached answer for key, or fetch() once for all concurrent callers
+        (blocking, for the threaded Flask mode).
+
+        Args:
+            key: cache_key() of the request
+            fetch: Returns (content, finish_reason); the answer is stored
+                only if is_complete()
+            wait: Seconds a coalesced caller waits for the shared fetch()
+                before answering 504; fetch()'s own worst case, e.g.
+                ModelRouter.time_budget()
+
+        Returns:
+            (content, status, tier) with tier None unless status is HIT
+
+        Raises:
+            Whatever fetch() raised, for every caller sharing the call
+        """
+        hit = self.lookup(key)
+        if hit is not None:
+            return hit[0], "HIT", hit[1]
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+        if not leader:
+            self.stats["coalesced"] += 1
+            if not flight.event.wait(wait):
+                raise ProxyError(504, "AI API timed out")
+            if flight.error is not None:
+                raise flight.error
+            return flight.value, "COALESCED", None
+        self.stats["misses"] += 1
+        try:
+            flight.value, finish_reason = fetch()
+            if is_complete(flight.value, finish_reason):
+                self.store(key, flight.value)
+            return flight.value, "MISS", None
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.event.set()
+
+    async def aget_or_fetch(self, key: str, fetch) -> tuple:
+        """
+        Async variant of get_or_fetch(); fetch is a coroutine function
+        returning (content, finish_reason).
+
+        The shared call runs as its own task and callers await it through
+        asyncio.shield, so one client disconnecting does not cancel it for
+        the others. Disk access runs in a worker thread.
+        """
+        content = self._memory_get(key)
+        if content is not None:
+            self.stats["memory_hits"] += 1
+            return content, "HIT", "memory"
+        task = self._tasks.get(key)
+        if task is None:
+            hit = await asyncio.to_thread(self.lookup, key)
+            if hit is not None:
+                return hit[0], "HIT", hit[1]
+            # Another request may have started the call while we read disk
+            task = self._tasks.get(key)
+        if task is not None:
+            self.stats["coalesced"] += 1
+            return await asyncio.shield(task), "COALESCED", None
+
+        self.stats["misses"] += 1
+
+        async def run():
+            value, finish_reason = await fetch()
+            if is_complete(value, finish_reason):
+                self._memory_set(key, value, self.ttl)
+                self.stats["writes"] += 1
+                await asyncio.to_thread(self._disk_set, key, value)
+            return value
+
+        task = asyncio.ensure_future(run())
+        self._tasks[key] = task
+        task.add_done_callback(lambda t, k=key: self._task_done(k, t))
+        return await asyncio.shield(task), "MISS", None
+
+    def _task_done(self, key: str, task: asyncio.Task) -> None:
+        self._tasks.pop(key, None)
+        # Mark the exception retrieved in case every waiter went away
+        if not task.cancelled():
+            task.exception()
+
+    def snapshot(self) -> dict:
+        """Counters plus hit ratio, for the status endpoint."""
+        hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+        lookups = hits + self.stats["misses"] + self.stats["coalesced"]
+        return {
+            "enabled": PROXY_CACHE,
+            **self.stats,
+            "entries": len(self._memory),
+            "disk": not self._disk_disabled,
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+def cache_headers(status: str, tier: Optional[str]) -> dict:
+    headers = {"X-Cache": status}
+    if tier:
+        headers["X-Cache-Tier"] = tier
+    return headers
+
+
+# Shared cache used by both serving modes
+response_cache = ResponseCache()
@@ -0,0 +1,307 @@
+"""
+Latency-aware routing across a pool of OpenRouter models.
+
+The pool is AI_MODEL followed by AI_FALLBACK_MODELS. For each model the
+router keeps an EWMA of latency (and of its deviation) and of the error
+rate, and orders candidates by
+
+    score = latency * (1 + ROUTE_ERROR_PENALTY * error_rate)
+
+A 429, 5xx or transport error puts the model in a cooldown that doubles
+with consecutive failures (a 429's Retry-After is honored), and the
+request fails over to the next candidate. Cooling models are still
+tried last, so a pool of one behaves exactly like a pinned model.
+
+In the async mode a request can also be hedged: if the chosen model
+has not answered within its usual latency (EWMA + 4 deviations), the
+next candidate is started as well and the first answer wins.
+
+WHY: Free-tier models are often slow or rate limited. Pinned to one
+model, our p99 was that model's worst case; routing lets it follow the
+best model available at the time.
+"""
+import asyncio
+import os
+import random
+import threading
+import time
+from typing import Awaitable, Callable, Optional
+
+from upstream import AI_MODEL, UPSTREAM_TIMEOUT, ProxyError
+
+# Extra models tried after AI_MODEL, e.g. "meta-llama/llama-3.3-70b-instruct:free,google/gemma-3-27b-it:free"
+AI_FALLBACK_MODELS = os.getenv("AI_FALLBACK_MODELS", "")
+# Models tried per request (first choice plus failovers/hedges)
+ROUTE_MAX_ATTEMPTS = int(os.getenv("ROUTE_MAX_ATTEMPTS", "3"))
+ROUTE_EWMA_ALPHA = float(os.getenv("ROUTE_EWMA_ALPHA", "0.2"))
+ROUTE_ERROR_PENALTY = float(os.getenv("ROUTE_ERROR_PENALTY", "4"))
+# Assumed latency of a model with no samples yet, in seconds
+ROUTE_LATENCY_PRIOR = float(os.getenv("ROUTE_LATENCY_PRIOR", "5"))
+# Share of requests sent to a random healthy model to keep its stats fresh
+ROUTE_EXPLORE = float(os.getenv("ROUTE_EXPLORE", "0.05"))
+ROUTE_COOLDOWN = float(os.getenv("ROUTE_COOLDOWN", "10"))
+ROUTE_MAX_COOLDOWN = float(os.getenv("ROUTE_MAX_COOLDOWN", "300"))
+
+# Hedged requests are opt-in (async mode): they trade extra upstream calls for a shorter tail
+PROXY_HEDGE = os.getenv("PROXY_HEDGE", "0") == "1"
+# Fixed hedge delay in seconds; 0 uses each model's EWMA + 4 deviations
+PROXY_HEDGE_AFTER = float(os.getenv("PROXY_HEDGE_AFTER", "0"))
+# Never hedge sooner than this, and never more than this share of calls
+PROXY_HEDGE_MIN_DELAY = float(os.getenv("PROXY_HEDGE_MIN_DELAY", "1"))
+PROXY_HEDGE_MAX_RATIO = float(os.getenv("PROXY_HEDGE_MAX_RATIO", "0.1"))
+
+
+def pool_models() -> list:
+    """AI_MODEL followed by the fallbacks, without duplicates."""
+    models = [AI_MODEL]
+    for model in AI_FALLBACK_MODELS.split(","):
+        model = model.strip()
+        if model and model not in models:
+            models.append(model)
+    return models
+
+
+def is_retryable(error: Exception) -> bool:
+    """429/5xx answers and transport errors fail over; other 4xx do not."""
+    if isinstance(error, ProxyError):
+        return error.status == 429 or error.status >= 500
+    return True
+
+
+class ModelStats:
+    """Health of one model as seen by this worker."""
+
+    __slots__ = ("name", "latency", "deviation", "error_rate", "failures", "cooldown_until",
+                 "calls", "errors")
+
+    def __init__(self, name: str):
+        self.name = name
+        # EWMA of seconds per completed call, and of its absolute deviation
+        self.latency: Optional[float] = None
+        self.deviation = 0.0
+        # EWMA of failures (1) and successes (0)
+        self.error_rate = 0.0
+        self.failures = 0
+        self.cooldown_until = 0.0
+        self.calls = 0
+        self.errors = 0
+
+    def score(self) -> float:
+        latency = self.latency if self.latency is not None else ROUTE_LATENCY_PRIOR
+        return latency * (1 + ROUTE_ERROR_PENALTY * self.error_rate)
+
+    def observe_latency(self, seconds: float, alpha: float) -> None:
+        if self.latency is None:
+            self.latency, self.deviation = seconds, seconds / 2
+        else:
+            self.deviation += alpha * (abs(seconds - self.latency) - self.deviation)
+            self.latency += alpha * (seconds - self.latency)
+
+    def observe_lower_bound(self, seconds: float, alpha: float) -> None:
+        """Counts an unfinished call only if it already took longer than expected."""
+        expected = self.latency if self.latency is not None else ROUTE_LATENCY_PRIOR
+        if seconds > expected:
+            self.observe_latency(seconds, alpha)
+
+
+class ModelRouter:
+    """
+    Orders a pool of models by health and runs calls with failover (and,
+    in async mode, optional hedging).
+
+    Args:
+        models: Model ids, preferred first while there are no samples
+        max_attempts: Models tried per request
+        hedge: Start a second model when the first is slow (async only)
+    """
+
+    def __init__(self, models: Optional[list] = None, max_attempts: int = ROUTE_MAX_ATTEMPTS,
+                 hedge: bool = PROXY_HEDGE, alpha: float = ROUTE_EWMA_ALPHA):
+        self.models = {name: ModelStats(name) for name in (models or pool_models())}
+        self.max_attempts = max(1, max_attempts)
+        self.hedge = hedge
+        self.alpha = alpha
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "failovers": 0, "hedges": 0, "hedge_wins": 0}
+
+    def candidates(self) -> list:
+        """Models to try, best first; cooling models last, soonest available first."""
+        now = time.monotonic()
+        with self._lock:
+            # sorted() is stable, so ties keep the configured order
+            healthy = sorted((m for m in self.models.values() if m.cooldown_until <= now),
+                             key=ModelStats.score)
+            cooling = sorted((m for m in self.models.values() if m.cooldown_until > now),
+                             key=lambda m: m.cooldown_until)
+        if len(healthy) > 1 and random.random() < ROUTE_EXPLORE:
+            healthy.insert(0, healthy.pop(random.randrange(1, len(healthy))))
+        return [m.name for m in healthy + cooling][:self.max_attempts]
+
+    def record_success(self, model: str, latency: Optional[float]) -> None:
+        """latency is None for streams, where only time to headers is known."""
+        with self._lock:
+            stats = self.models[model]
+            stats.calls += 1
+            stats.failures = 0
+            stats.cooldown_until = 0.0
+            stats.error_rate *= 1 - self.alpha
+            if latency is not None:
+                stats.observe_latency(latency, self.alpha)
+
+    def record_failure(self, model: str, latency: float, error: Exception) -> None:
+        with self._lock:
+            stats = self.models[model]
+            stats.calls += 1
+            if not is_retryable(error):
+                # The request was at fault, not the model
+                return
+            stats.errors += 1
+            stats.error_rate += self.alpha * (1 - stats.error_rate)
+            stats.failures += 1
+            cooldown = min(ROUTE_COOLDOWN * 2 ** (stats.failures - 1), ROUTE_MAX_COOLDOWN)
+            if isinstance(error, ProxyError) and error.retry_after:
+                cooldown = max(cooldown, min(error.retry_after, ROUTE_MAX_COOLDOWN))
+            stats.cooldown_until = time.monotonic() + cooldown
+            # A timeout still tells us the model is at least this slow
+            # (a fast 429 says nothing about its speed)
+            stats.observe_lower_bound(latency, self.alpha)
+
+    def record_cancelled(self, model: str, latency: float) -> None:
+        """A hedge loser: its latency so far is a lower bound worth keeping."""
+        with self._lock:
+            self.models[model].observe_lower_bound(latency, self.alpha)
+
+    def hedge_delay(self, model: str) -> float:
+        if PROXY_HEDGE_AFTER > 0:
+            return PROXY_HEDGE_AFTER
+        stats = self.models[model]
+        if stats.latency is None:
+            return max(ROUTE_LATENCY_PRIOR, PROXY_HEDGE_MIN_DELAY)
+        return max(stats.latency + 4 * stats.deviation, PROXY_HEDGE_MIN_DELAY)
+
+    def time_budget(self) -> float:
+        """Longest a request can take: every attempt timing out in turn, plus slack."""
+        return min(self.max_attempts, len(self.models)) * UPSTREAM_TIMEOUT + 5
+
+    def run(self, call: Callable[[str], str], measure: bool = True) -> tuple:
+        """
+        Calls call(model) on the best model, failing over on 429/5xx and
+        transport errors (blocking, for the Flask mode).
+
+        Args:
+            call: Performs one attempt with the given model
+            measure: Record the call's duration as the model's latency
+                (False for streams, which return at the first byte)
+
+        Returns:
+            (result, model that answered)
+
+        Raises:
+            The last model's error if every attempt failed, or the first
+            non-retryable error
+        """
+        self.stats["requests"] += 1
+        error = None
+        for attempt, model in enumerate(self.candidates()):
+            if attempt:
+                self.stats["failovers"] += 1
+            started = time.monotonic()
+            try:
+                result = call(model)
+            except Exception as e:
+                self.record_failure(model, time.monotonic() - started, e)
+                if not is_retryable(e):
+                    raise
+                print(f"Model {model} failed ({e}), trying the next one")
+                error = e
+                continue
+            self.record_success(model, time.monotonic() - started if measure else None)
+            return result, model
+        raise error
+
+    async def arun(self, call: Callable[[str], Awaitable], measure: bool = True,
+                   hedge: Optional[bool] = None) -> tuple:
+        """
+        Async run(): failover as above, plus a hedge to the next model
+        when the current one is slower than usual.
+
+        Args:
+            hedge: Overrides the router's setting (streams must not hedge,
+                since a losing stream that already opened would leak)
+        """
+        hedge = self.hedge if hedge is None else hedge
+        self.stats["requests"] += 1
+        order = self.candidates()
+        pending = {}
+        error = None
+
+        def start(model: str, hedged: bool) -> None:
+            if hedged:
+                self.stats["hedges"] += 1
+            elif pending or error is not None:
+                self.stats["failovers"] += 1
+            pending[asyncio.ensure_future(self._attempt(call, model, measure))] = (model, hedged)
+
+        try:
+            start(order.pop(0), False)
+            while pending:
+                may_hedge = (hedge and order
+                             and self.stats["hedges"] < self.stats["requests"] * PROXY_HEDGE_MAX_RATIO)
+                newest = next(reversed(pending.values()))[0]
+                done, _ = await asyncio.wait(
+                    pending, timeout=self.hedge_delay(newest) if may_hedge else None,
+                    return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    start(order.pop(0), True)
+                    continue
+                for task in done:
+                    model, hedged = pending.pop(task)
+                    if task.exception() is None:
+                        if hedged:
+                            self.stats["hedge_wins"] += 1
+                        return task.result(), model
+                    error = task.exception()
+                    if not is_retryable(error):
+                        raise error
+                    print(f"Model {model} failed ({error}), trying the next one")
+                if not pending and order:
+                    start(order.pop(0), False)
+            raise error
+        finally:
+            # Losers, or every attempt if our caller was cancelled
+            for task in pending:
+                task.cancel()
+
+    async def _attempt(self, call, model: str, measure: bool):
+        started = time.monotonic()
+        try:
+            result = await call(model)
+        except asyncio.CancelledError:
+            self.record_cancelled(model, time.monotonic() - started)
+            raise
+        except Exception as e:
+            self.record_failure(model, time.monotonic() - started, e)
+            raise
+        self.record_success(model, time.monotonic() - started if measure else None)
+        return result
+
+    def snapshot(self) -> dict:
+        now = time.monotonic()
+        return {
+            **self.stats,
+            "hedging": self.hedge,
+            "models": {
+                m.name: {
+                    "latency_ms": round(m.latency * 1000, 1) if m.latency is not None else None,
+                    "error_rate": round(m.error_rate, 4),
+                    "cooling_for": round(max(0.0, m.cooldown_until - now), 1),
+                    "calls": m.calls,
+                    "errors": m.errors,
+                }
+                for m in self.models.values()
+            },
+        }
+
+
+# Shared router used by both serving modes
+model_router = ModelRouter()
@@ -0,0 +1,18 @@
+"""
+Test setup for the Agri Vista AI proxy.
+
+The proxy modules are flat and import each other by name, so this
+directory's parent is put on sys.path. The disk cache goes to a scratch
+directory, never to backend/data.
+"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+_scratch = Path(tempfile.mkdtemp(prefix="proxy-tests-"))
+os.environ.setdefault("OPENROUTER_API_KEY", "test-key")
+os.environ.setdefault("PROXY_CACHE_DB", str(_scratch / "proxy_cache.sqlite3"))
@@ -0,0 +1,68 @@
+import pytest
+
+import app
+from routing import ModelRouter
+from upstream import ProxyError
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(app, "model_router", ModelRouter(models=["a"]))
+    return app.app.test_client()
+
+
+def test_upstream_rate_limit_forwards_retry_after(client, monkeypatch):
+    def rate_limited(payload, model):
+        raise ProxyError(429, "AI API error: 429", retry_after=17)
+
+    monkeypatch.setattr(app, "_complete", rate_limited)
+    response = client.post("/api/chat", json={"messages": [{"role": "user", "content": "hi"}], "cache": False})
+
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "17"
+    assert response.get_json() == {"success": False, "error": "AI API error: 429"}
+
+
+def test_errors_without_retry_after_send_no_header(client, monkeypatch):
+    def failing(payload, model):
+        raise ProxyError(400, "AI API error: 400")
+
+    monkeypatch.setattr(app, "_complete", failing)
+    response = client.post("/api/chat", json={"messages": [{"role": "user", "content": "hi"}], "cache": False})
+
+    assert response.status_code == 400
+    assert "Retry-After" not in response.headers
+
+
+class FakeStream:
+    status_code = 200
+    encoding = None
+
+    def __init__(self, lines):
+        self.lines = lines
+        self.closed = False
+
+    def iter_lines(self, chunk_size=None, decode_unicode=False):
+        yield from self.lines
+
+    def close(self):
+        self.closed = True
+
+
+def test_streams_answers_without_reasoning(client, monkeypatch):
+    upstream = FakeStream([
+        ": OPENROUTER PROCESSING",
+        'data: {"choices": [{"delta": {"content": "<think>hmm</think>Onion is "}}]}',
+        "",
+        'data: {"choices": [{"delta": {"content": "30/kg"}, "finish_reason": "stop"}]}',
+        "data: [DONE]",
+    ])
+    monkeypatch.setattr(app.http, "post", lambda *args, **kwargs: upstream)
+    response = client.post("/api/chat", json={"messages": [{"role": "user", "content": "hi"}], "stream": True})
+
+    assert response.mimetype == "text/event-stream"
+    assert response.headers["X-Model"] == "a"
+    body = response.get_data(as_text=True)
+    assert "hmm" not in body and "Onion is " in body and "30/kg" in body
+    assert body.endswith("data: [DONE]\n\n") and body.count("[DONE]") == 1
+    assert upstream.closed
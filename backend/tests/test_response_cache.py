@@ -0,0 +1,191 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from response_cache import ResponseCache, cache_key
+from routing import ModelRouter
+
+
+WAIT = 5
+
+
+def make_cache(tmp_path=None):
+    return ResponseCache(max_entries=16, ttl=60, path=tmp_path / "cache.sqlite3" if tmp_path else None)
+
+
+def test_concurrent_misses_share_one_fetch():
+    cache = make_cache()
+    calls = 0
+    started = threading.Event()
+
+    def fetch():
+        nonlocal calls
+        calls += 1
+        started.set()
+        time.sleep(0.05)
+        return "answer", "stop"
+
+    results = []
+
+    def ask():
+        results.append(cache.get_or_fetch("key", fetch, WAIT))
+
+    leader = threading.Thread(target=ask)
+    leader.start()
+    started.wait()
+    followers = [threading.Thread(target=ask) for _ in range(4)]
+    for thread in followers:
+        thread.start()
+    for thread in [leader, *followers]:
+        thread.join()
+
+    assert calls == 1
+    statuses = sorted(status for _, status, _ in results)
+    assert statuses == ["COALESCED"] * 4 + ["MISS"]
+    assert all(content == "answer" for content, _, _ in results)
+    assert cache.get_or_fetch("key", fetch, WAIT) == ("answer", "HIT", "memory")
+
+
+def test_fetch_error_reaches_coalesced_callers():
+    cache = make_cache()
+    started = threading.Event()
+
+    def fetch():
+        started.set()
+        time.sleep(0.05)
+        raise RuntimeError("upstream down")
+
+    errors = []
+
+    def ask():
+        try:
+            cache.get_or_fetch("key", fetch, WAIT)
+        except RuntimeError as e:
+            errors.append(e)
+
+    leader = threading.Thread(target=ask)
+    leader.start()
+    started.wait()
+    follower = threading.Thread(target=ask)
+    follower.start()
+    leader.join()
+    follower.join()
+
+    assert len(errors) == 2
+    assert cache.lookup("key") is None
+
+
+def test_async_misses_share_one_fetch():
+    cache = make_cache()
+    calls = 0
+
+    async def fetch():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.02)
+        return "answer", "stop"
+
+    async def main():
+        return await asyncio.gather(*(cache.aget_or_fetch("key", fetch) for _ in range(5)))
+
+    results = asyncio.run(main())
+    assert calls == 1
+    assert sorted(status for _, status, _ in results) == ["COALESCED"] * 4 + ["MISS"]
+    assert cache.lookup("key") == ("answer", "memory")
+
+
+def test_async_shared_fetch_survives_a_cancelled_caller():
+    cache = make_cache()
+
+    async def main():
+        started = asyncio.Event()
+
+        async def fetch():
+            started.set()
+            await asyncio.sleep(0.02)
+            return "answer", "stop"
+
+        leaving = asyncio.ensure_future(cache.aget_or_fetch("key", fetch))
+        await started.wait()
+        staying = asyncio.ensure_future(cache.aget_or_fetch("key", fetch))
+        await asyncio.sleep(0)
+        leaving.cancel()
+        return await staying
+
+    assert asyncio.run(main()) == ("answer", "COALESCED", None)
+
+
+@pytest.mark.parametrize("answer", [("", "stop"), ("   ", "stop"), ("half an answ", "length"), (None, "stop")])
+def test_incomplete_answers_are_returned_but_not_stored(answer):
+    cache = make_cache()
+    assert cache.get_or_fetch("key", lambda: answer, WAIT) == (answer[0], "MISS", None)
+    assert cache.lookup("key") is None
+
+    async def fetch():
+        return answer
+
+    assert asyncio.run(cache.aget_or_fetch("other", fetch)) == (answer[0], "MISS", None)
+    assert cache.lookup("other") is None
+
+
+def test_disk_tier_is_shared_between_instances(tmp_path):
+    make_cache(tmp_path).get_or_fetch("key", lambda: ("answer", "stop"), WAIT)
+    assert make_cache(tmp_path).get_or_fetch("key", lambda: ("other", "stop"), WAIT) == ("answer", "HIT", "disk")
+
+
+def test_coalesced_callers_wait_out_a_slow_failover():
+    cache = make_cache()
+    started = threading.Event()
+
+    def fetch():
+        started.set()
+        # Longer than one upstream timeout, within the router's budget
+        time.sleep(0.3)
+        return "answer", "stop"
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(cache.get_or_fetch("key", fetch, 1.0)))
+    leader.start()
+    started.wait()
+    assert cache.get_or_fetch("key", fetch, 1.0) == ("answer", "COALESCED", None)
+    leader.join()
+
+
+def test_follower_gives_up_after_its_wait():
+    from upstream import ProxyError
+
+    cache = make_cache()
+    started = threading.Event()
+    release = threading.Event()
+
+    def fetch():
+        started.set()
+        release.wait()
+        return "answer", "stop"
+
+    leader = threading.Thread(target=lambda: cache.get_or_fetch("key", fetch, WAIT))
+    leader.start()
+    started.wait()
+    with pytest.raises(ProxyError) as timed_out:
+        cache.get_or_fetch("key", fetch, 0.05)
+    release.set()
+    leader.join()
+    assert timed_out.value.status == 504
+
+
+def test_time_budget_covers_every_attempt():
+    import routing
+
+    assert ModelRouter(models=["a", "b", "c"], max_attempts=3).time_budget() == 3 * routing.UPSTREAM_TIMEOUT + 5
+    # Never more attempts than there are models
+    assert ModelRouter(models=["a"], max_attempts=3).time_budget() == routing.UPSTREAM_TIMEOUT + 5
+
+
+def test_cache_key_names_the_model_pool():
+    payload = {"model": "a", "messages": [{"role": "user", "content": "hi"}],
+               "temperature": 0.2, "max_tokens": 512}
+    assert cache_key(payload) == cache_key(payload, ["a"])
+    assert cache_key(payload, ["a", "b"]) != cache_key(payload, ["a"])
+    assert cache_key({**payload, "temperature": 0.20, "max_tokens": 512.0}) == cache_key(payload)
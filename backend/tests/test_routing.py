@@ -0,0 +1,106 @@
+import asyncio
+
+import pytest
+
+import routing
+from routing import ModelRouter
+from upstream import ProxyError
+
+
+@pytest.fixture(autouse=True)
+def no_exploration(monkeypatch):
+    # Random exploration would make candidate order nondeterministic
+    monkeypatch.setattr(routing, "ROUTE_EXPLORE", 0.0)
+
+
+def make_router(**kwargs):
+    return ModelRouter(models=["a", "b", "c"], **kwargs)
+
+
+def test_fails_over_on_retryable_errors():
+    router = make_router()
+    tried = []
+
+    def call(model):
+        tried.append(model)
+        if model == "a":
+            raise ProxyError(429, "AI API error: 429", retry_after=30)
+        return f"answer from {model}"
+
+    assert router.run(call) == ("answer from b", "b")
+    assert tried == ["a", "b"]
+    assert router.stats["failovers"] == 1
+    # The rate-limited model waits out its Retry-After at the back of the line
+    assert router.candidates() == ["b", "c", "a"]
+    assert router.snapshot()["models"]["a"]["cooling_for"] > 20
+
+
+def test_client_errors_do_not_fail_over():
+    router = make_router()
+    tried = []
+
+    def call(model):
+        tried.append(model)
+        raise ProxyError(400, "AI API error: 400")
+
+    with pytest.raises(ProxyError):
+        router.run(call)
+    assert tried == ["a"]
+    assert router.models["a"].error_rate == 0.0
+    assert router.candidates()[0] == "a"
+
+
+def test_raises_the_last_error_when_every_model_fails():
+    router = make_router()
+
+    def call(model):
+        raise ProxyError(503, f"{model} down")
+
+    with pytest.raises(ProxyError) as failed:
+        router.run(call)
+    assert failed.value.error == "c down"
+
+
+def test_prefers_the_faster_model():
+    router = make_router()
+    router.record_success("a", 4.0)
+    router.record_success("b", 0.5)
+    router.record_success("c", 2.0)
+    assert router.candidates() == ["b", "c", "a"]
+
+
+def test_async_failover():
+    router = make_router(hedge=False)
+
+    async def call(model):
+        if model == "a":
+            raise ConnectionError("reset")
+        return f"answer from {model}"
+
+    assert asyncio.run(router.arun(call)) == ("answer from b", "b")
+
+
+def test_async_hedge_wins_over_a_slow_model(monkeypatch):
+    monkeypatch.setattr(routing, "PROXY_HEDGE_AFTER", 0.01)
+    monkeypatch.setattr(routing, "PROXY_HEDGE_MAX_RATIO", 1.0)
+    router = make_router(hedge=True)
+    cancelled = []
+
+    async def call(model):
+        try:
+            await asyncio.sleep(1 if model == "a" else 0)
+        except asyncio.CancelledError:
+            cancelled.append(model)
+            raise
+        return f"answer from {model}"
+
+    async def main():
+        result = await router.arun(call)
+        # Let the loser's cancellation run
+        await asyncio.sleep(0)
+        return result
+
+    assert asyncio.run(main()) == ("answer from b", "b")
+    assert router.stats["hedges"] == 1
+    assert router.stats["hedge_wins"] == 1
+    assert cancelled == ["a"]
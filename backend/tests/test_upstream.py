@@ -0,0 +1,41 @@
+import json
+
+from upstream import SSE_DONE, StreamRelay
+
+
+def delta(content=None, **extra):
+    return "data: " + json.dumps({"choices": [{"index": 0, "delta": {"content": content, **extra}}]})
+
+
+def contents(events):
+    shown = []
+    for event in events:
+        if event.startswith("data: {"):
+            for choice in json.loads(event[6:])["choices"]:
+                shown.append(choice["delta"].get("content") or "")
+    return "".join(shown)
+
+
+def test_relay_cuts_thinking_split_across_chunks():
+    relay = StreamRelay()
+    events = []
+    for chunk in ["Hello <thi", "nk>plan the", " answer</th", "ink> world", " <"]:
+        events += relay.feed(delta(chunk))
+    events += relay.feed("data: [DONE]")
+
+    assert contents(events) == "Hello  world <"
+    assert events[-1] == SSE_DONE
+    assert relay.feed("data: [DONE]") == []
+
+
+def test_relay_drops_reasoning_only_events():
+    relay = StreamRelay()
+    assert relay.feed(delta(None, reasoning="thinking...")) == []
+    assert relay.feed(": OPENROUTER PROCESSING") == [": OPENROUTER PROCESSING\n\n"]
+    assert contents(relay.feed(delta("hi", reasoning="x"))) == "hi"
+    assert "reasoning" not in relay.feed(delta("hi", reasoning="x"))[0]
+
+
+def test_relay_passes_reasoning_through_when_asked():
+    line = delta("<think>plan</think>", reasoning="x")
+    assert StreamRelay(include_reasoning=True).feed(line) == [line + "\n\n"]
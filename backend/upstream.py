@@ -0,0 +1,329 @@
+"""
+Shared OpenRouter settings and helpers for the Agri Vista AI proxy.
+
+Used by both serving modes:
+- app.py:  Flask (sync), one worker thread per in-flight call
+- asgi.py: Starlette (async), thousands of in-flight calls per worker
+           over one shared keep-alive connection pool
+"""
+import asyncio
+import json
+import os
+from contextlib import asynccontextmanager
+from urllib.parse import urlsplit
+
+# ── OpenRouter Configuration ──────────────────────────────────────────────────
+# Set these environment variables before running:
+#   set OPENROUTER_API_KEY=sk-or-v1-your-key-here
+#   set AI_MODEL=google/gemini-2.0-flash-exp
+OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY", "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")
+AI_MODEL = os.getenv("AI_MODEL", "deepseek/deepseek-r1:free")
+OPENROUTER_URL = os.getenv("OPENROUTER_URL", "https://openrouter.ai/api/v1/chat/completions")
+
+# ── Connection pool / concurrency (async mode) ────────────────────────────────
+# Seconds to wait for an upstream answer
+UPSTREAM_TIMEOUT = float(os.getenv("PROXY_UPSTREAM_TIMEOUT", "30"))
+# Use HTTP/2 when the h2 package is installed (one connection, many streams)
+PROXY_HTTP2 = os.getenv("PROXY_HTTP2", "1") == "1"
+PROXY_MAX_CONNECTIONS = int(os.getenv("PROXY_MAX_CONNECTIONS", "512"))
+PROXY_MAX_KEEPALIVE = int(os.getenv("PROXY_MAX_KEEPALIVE", "64"))
+PROXY_KEEPALIVE_EXPIRY = float(os.getenv("PROXY_KEEPALIVE_EXPIRY", "30"))
+# In-flight calls allowed per upstream host, e.g. "openrouter.ai=200,127.0.0.1=1000"
+PROXY_UPSTREAM_LIMITS = os.getenv("PROXY_UPSTREAM_LIMITS", "")
+PROXY_DEFAULT_LIMIT = int(os.getenv("PROXY_DEFAULT_LIMIT", "256"))
+# Seconds a request may wait for a free upstream slot before a 503
+PROXY_QUEUE_TIMEOUT = float(os.getenv("PROXY_QUEUE_TIMEOUT", "10"))
+
+
+class ProxyError(Exception):
+    """A request the proxy answers with {"success": false, "error": ...}."""
+
+    def __init__(self, status: int, error: str, retry_after: int = 0):
+        super().__init__(error)
+        self.status = status
+        self.error = error
+        self.retry_after = retry_after
+
+
+def wants_stream(data, accept: str = "") -> bool:
+    """Streaming is requested with "stream": true or Accept: text/event-stream."""
+    return bool(data.get("stream")) or "text/event-stream" in (accept or "")
+
+
+def build_payload(data, stream: bool = False) -> dict:
+    """
+    Validates the Flutter app's request body and builds the OpenRouter payload.
+
+    Args:
+        data: The request body
+        stream: Ask OpenRouter for SSE deltas instead of one completion
+
+    Raises:
+        ProxyError: 400 without messages, 500 without an API key
+    """
+    messages = data.get("messages", [])
+    if not messages:
+        raise ProxyError(400, "No messages provided")
+    if not OPENROUTER_API_KEY:
+        raise ProxyError(500, "API key not configured")
+    payload = {
+        "model": AI_MODEL,
+        "messages": messages,
+        "temperature": data.get("temperature", 0.7),
+        "max_tokens": data.get("max_tokens", 512),
+    }
+    if stream:
+        payload["stream"] = True
+        if not data.get("include_reasoning", False):
+            # OpenRouter still lets the model think, but leaves the
+            # reasoning out of the stream
+            payload["reasoning"] = {"exclude": True}
+    return payload
+
+
+def upstream_headers() -> dict:
+    return {
+        "Authorization": f"Bearer {OPENROUTER_API_KEY}",
+        "Content-Type": "application/json",
+    }
+
+
+def upstream_error(response) -> ProxyError:
+    """ProxyError for a non-200 OpenRouter answer (requests or httpx response)."""
+    try:
+        retry_after = int(response.headers.get("Retry-After", 0))
+    except ValueError:
+        retry_after = 0
+    return ProxyError(response.status_code, f"AI API error: {response.status_code}", retry_after)
+
+
+def extract_content(result: dict) -> tuple:
+    """Returns (answer text, finish_reason) of a non-streamed completion."""
+    choice = result["choices"][0]
+    return choice["message"]["content"], choice.get("finish_reason")
+
+
+# ── Streaming ─────────────────────────────────────────────────────────────────
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+SSE_DONE = "data: [DONE]\n\n"
+
+_THINK_OPEN = "<think>"
+_THINK_CLOSE = "</think>"
+_REASONING_KEYS = ("reasoning", "reasoning_content", "reasoning_details")
+
+
+def sse_error(message: str) -> str:
+    """An in-stream error event, in OpenRouter's format."""
+    return f"data: {json.dumps({'error': {'message': message}})}\n\n"
+
+
+class StreamRelay:
+    """
+    Turns OpenRouter SSE lines into the events sent to the client.
+
+    With include_reasoning=True lines are relayed untouched. Otherwise
+    reasoning fields are dropped from each delta, <think>...</think>
+    spans are cut out of the content (even when a tag is split across
+    chunks), and events left with nothing to show are skipped.
+
+    WHY: Reasoning models stream hundreds of thinking tokens before the
+    answer; the app only displays the answer.
+    """
+
+    def __init__(self, include_reasoning: bool = False):
+        self.include_reasoning = include_reasoning
+        self.thinking = False
+        # Tail of the content that may be the start of a tag
+        self.carry = ""
+        self.done = False
+
+    def feed(self, line: str) -> list:
+        """Returns the SSE events to send for one upstream line."""
+        if not line or line.startswith(":"):
+            # Blank separators are re-added per event; comments (OpenRouter
+            # sends ": OPENROUTER PROCESSING") keep idle connections open
+            return [line + "\n\n"] if line else []
+        if not line.startswith("data:"):
+            return []
+        data = line[5:].strip()
+        if data == "[DONE]":
+            return self.finish()
+        if self.include_reasoning:
+            return [f"data: {data}\n\n"]
+        if not (self.thinking or self.carry or "reasoning" in data or "<" in data):
+            return [f"data: {data}\n\n"]
+        try:
+            event = json.loads(data)
+        except ValueError:
+            return [f"data: {data}\n\n"]
+        keep = False
+        for choice in event.get("choices") or []:
+            delta = choice.get("delta") or {}
+            for key in _REASONING_KEYS:
+                delta.pop(key, None)
+            if "content" in delta:
+                delta["content"] = self._strip_thinking(delta["content"] or "")
+            if delta.get("content") or delta.get("tool_calls") or choice.get("finish_reason"):
+                keep = True
+        if not keep and "error" not in event and "usage" not in event:
+            return []
+        return [f"data: {json.dumps(event, ensure_ascii=False)}\n\n"]
+
+    def _strip_thinking(self, text: str) -> str:
+        text, self.carry = self.carry + text, ""
+        shown = []
+        while text:
+            tag = _THINK_CLOSE if self.thinking else _THINK_OPEN
+            at = text.find(tag)
+            if at >= 0:
+                if not self.thinking:
+                    shown.append(text[:at])
+                self.thinking = not self.thinking
+                text = text[at + len(tag):]
+                continue
+            # Hold back a trailing partial tag until the next chunk
+            for size in range(min(len(tag) - 1, len(text)), 0, -1):
+                if tag.startswith(text[-size:]):
+                    self.carry, text = text[-size:], text[:-size]
+                    break
+            if not self.thinking:
+                shown.append(text)
+            break
+        return "".join(shown)
+
+    def finish(self) -> list:
+        """
+        Closing events: held-back text that turned out not to be a tag,
+        then [DONE] (once, even if upstream ended without one).
+        """
+        if self.done:
+            return []
+        self.done = True
+        events = []
+        if self.carry and not self.thinking:
+            delta = {"choices": [{"index": 0, "delta": {"content": self.carry}}]}
+            events.append(f"data: {json.dumps(delta, ensure_ascii=False)}\n\n")
+        self.carry = ""
+        return events + [SSE_DONE]
+
+
+def _parse_limits(spec: str) -> dict:
+    """Parses "host=limit,host=limit" into {host: limit}."""
+    limits = {}
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        host, _, limit = part.rpartition("=")
+        try:
+            limits[host.strip().lower()] = int(limit)
+        except ValueError:
+            print(f"Ignoring invalid PROXY_UPSTREAM_LIMITS entry: {part}")
+    return limits
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+class UpstreamPool:
+    """
+    One shared httpx.AsyncClient (keep-alive, HTTP/2 when available) with
+    a concurrency limit per upstream host.
+
+    WHY: A fresh connection per call paid TCP+TLS setup every time, and
+    without a limit a traffic spike would open unbounded sockets and get
+    the API key rate limited upstream.
+    """
+
+    def __init__(self, limits: dict = None, default_limit: int = PROXY_DEFAULT_LIMIT,
+                 queue_timeout: float = PROXY_QUEUE_TIMEOUT):
+        import httpx
+
+        self.http2 = PROXY_HTTP2 and _http2_available()
+        self.client = httpx.AsyncClient(
+            http2=self.http2,
+            timeout=httpx.Timeout(UPSTREAM_TIMEOUT, connect=10),
+            limits=httpx.Limits(
+                max_connections=PROXY_MAX_CONNECTIONS,
+                max_keepalive_connections=PROXY_MAX_KEEPALIVE,
+                keepalive_expiry=PROXY_KEEPALIVE_EXPIRY,
+            ),
+        )
+        self.limits = limits if limits is not None else _parse_limits(PROXY_UPSTREAM_LIMITS)
+        self.default_limit = default_limit
+        self.queue_timeout = queue_timeout
+        self._slots = {}
+        self.stats = {"calls": 0, "streams": 0, "rejected": 0, "errors": 0}
+
+    def _slot(self, url: str) -> asyncio.Semaphore:
+        host = (urlsplit(url).hostname or "").lower()
+        slot = self._slots.get(host)
+        if slot is None:
+            slot = self._slots[host] = asyncio.Semaphore(self.limits.get(host, self.default_limit))
+        return slot
+
+    async def post(self, url: str, payload: dict, headers: dict):
+        """
+        POSTs JSON upstream within the host's concurrency limit.
+
+        Raises:
+            ProxyError: 503 when no slot frees up within queue_timeout
+        """
+        slot = self._slot(url)
+        try:
+            await asyncio.wait_for(slot.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.stats["rejected"] += 1
+            raise ProxyError(503, "Proxy is busy, please retry shortly", retry_after=2)
+        try:
+            self.stats["calls"] += 1
+            return await self.client.post(url, json=payload, headers=headers)
+        except Exception:
+            self.stats["errors"] += 1
+            raise
+        finally:
+            slot.release()
+
+    @asynccontextmanager
+    async def stream(self, url: str, payload: dict, headers: dict):
+        """
+        Opens a streaming POST upstream, holding the host's concurrency
+        slot until the stream is closed.
+
+        Closing early (e.g. the client disconnected) closes the upstream
+        connection, which cancels the generation.
+
+        Raises:
+            ProxyError: 503 when no slot frees up within queue_timeout
+        """
+        slot = self._slot(url)
+        try:
+            await asyncio.wait_for(slot.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.stats["rejected"] += 1
+            raise ProxyError(503, "Proxy is busy, please retry shortly", retry_after=2)
+        try:
+            self.stats["calls"] += 1
+            self.stats["streams"] += 1
+            async with self.client.stream("POST", url, json=payload, headers=headers) as response:
+                yield response
+        except Exception:
+            self.stats["errors"] += 1
+            raise
+        finally:
+            slot.release()
+
+    def snapshot(self) -> dict:
+        return {
+            "http2": self.http2,
+            "in_flight": {
+                host: (self.limits.get(host, self.default_limit) - slot._value)
+                for host, slot in self._slots.items()
+            },
+            **self.stats,
+        }
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
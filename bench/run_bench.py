@@ -0,0 +1,393 @@
+"""
+Load test and benchmark suite for the Multilingual Mandi backend and the
+Agri Vista AI proxy.
+
+Starts the stub LLM upstream (stub_upstream.py), the FastAPI app in
+"agrivesta mandi/backend" and the AI proxy in backend/ (Flask app.py, or
+asgi.py under uvicorn with --proxy-mode async), points
+both at the stub, then drives every endpoint at each concurrency level
+with a closed loop of workers. For every (scenario, concurrency) pair it
+reports p50/p95/p99 latency, time to first byte for streams, throughput,
+status codes and server memory (RSS and peak RSS, Linux only).
+
+Results are written as JSON to bench/results/ so runs can be compared
+between commits:
+
+    python bench/run_bench.py --concurrency 1,8,32 --duration 10
+    python bench/run_bench.py --only chat,prices --latency-median 0.3
+    python bench/run_bench.py --compare bench/results/old.json
+    python bench/run_bench.py --only proxy_chat --proxy-mode async
+
+Needs httpx and uvicorn plus each app's own requirements.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import httpx
+
+ROOT = Path(__file__).resolve().parent.parent
+MANDI_DIR = ROOT / "agrivesta mandi" / "backend"
+PROXY_DIR = ROOT / "backend"
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+ITEMS = ["Tomato", "Onion", "Potato", "Cauliflower", "Spinach", "Apple", "Banana", "Garlic"]
+LANGUAGES = ["Hindi", "Tamil", "Telugu", "Bengali", "Marathi", "Hinglish"]
+QUESTIONS = [
+    "aaj {item} ka rate kya hai",
+    "{item} ko fresh kaise rakhe",
+    "best time to buy {item}?",
+    "{item} sasta kahan milega",
+    "is {item} quality good this week",
+]
+SENTENCES = [
+    "What is the price of {item} today?",
+    "Please give me 2 kg of fresh {item}.",
+    "This {item} is too expensive, give a discount.",
+    "I will come back tomorrow for more {item}.",
+]
+
+
+def _pick(pool: list, i: int, unique: bool) -> str:
+    """Pool entry for request i; unique mode makes every request distinct."""
+    item = ITEMS[i % len(ITEMS)]
+    text = pool[(i // len(ITEMS)) % len(pool)].format(item=item)
+    return f"{text} #{i}" if unique else text
+
+
+# name -> (target app, method, path, body factory or None, streaming)
+SCENARIOS = {
+    "health": ("mandi", "GET", "/api/health", None, False),
+    "prices": ("mandi", "GET", "/api/prices", None, False),
+    "prices_query": ("mandi", "GET", "/api/prices?item=Tomato&sort=price&limit=20", None, False),
+    "prices_export": ("mandi", "GET", "/api/prices/export?format=csv", None, False),
+    "translate": ("mandi", "POST", "/api/translate", lambda i, u: {
+        "text": _pick(SENTENCES, i, u), "target_lang": LANGUAGES[i % 5]}, False),
+    "translate_batch": ("mandi", "POST", "/api/translate/batch", lambda i, u: {
+        "texts": [_pick(SENTENCES, i + k, u) for k in range(10)],
+        "target_langs": LANGUAGES[:3]}, False),
+    "detect_language": ("mandi", "POST", "/api/detect-language", lambda i, u: {
+        "text": _pick(QUESTIONS, i, u)}, False),
+    "negotiate": ("mandi", "POST", "/api/negotiate", lambda i, u: {
+        "item": ITEMS[i % len(ITEMS)], "vendor_price": f"{40 + (i % 7) * 5}/kg",
+        "language": LANGUAGES[i % len(LANGUAGES)] if not u else f"Hinglish #{i}"}, False),
+    "negotiate_stream": ("mandi", "POST", "/api/negotiate", lambda i, u: {
+        "item": ITEMS[i % len(ITEMS)], "vendor_price": f"{40 + (i % 7) * 5}/kg",
+        "language": "Hinglish", "stream": True}, True),
+    "price_insight": ("mandi", "POST", "/api/price-insight", lambda i, u: {
+        "item": ITEMS[i % len(ITEMS)], "location": "Delhi" if not u else f"Delhi {i}"}, False),
+    "chat": ("mandi", "POST", "/api/chat", lambda i, u: {
+        "message": _pick(QUESTIONS, i, u), "language": "Hinglish"}, False),
+    "chat_stream": ("mandi", "POST", "/api/chat", lambda i, u: {
+        "message": _pick(QUESTIONS, i, u), "language": "Hinglish", "stream": True}, True),
+    "smart_phrases": ("mandi", "POST", "/api/smart-phrases", lambda i, u: {
+        "item": ITEMS[i % len(ITEMS)], "context": "high price" if not u else f"context {i}",
+        "language": LANGUAGES[i % len(LANGUAGES)]}, False),
+    "proxy_chat": ("proxy", "POST", "/api/chat", lambda i, u: {
+        "messages": [
+            {"role": "system", "content": "You are a farming assistant."},
+            {"role": "user", "content": _pick(QUESTIONS, i, u)},
+        ]}, False),
+    "proxy_chat_stream": ("proxy", "POST", "/api/chat", lambda i, u: {
+        "messages": [
+            {"role": "system", "content": "You are a farming assistant."},
+            {"role": "user", "content": _pick(QUESTIONS, i, u)},
+        ], "stream": True}, True),
+}
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _memory(pid: int) -> dict:
+    """RSS and peak RSS of a process in MiB (Linux /proc), else empty."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            fields = dict(line.split(":", 1) for line in f if ":" in line)
+    except OSError:
+        return {}
+    return {
+        "rss_mib": round(int(fields["VmRSS"].split()[0]) / 1024, 1),
+        "peak_rss_mib": round(int(fields["VmHWM"].split()[0]) / 1024, 1),
+    }
+
+
+def _percentile(sorted_values: list, q: float):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(q * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+class Server:
+    """A child process serving HTTP, stopped on exit."""
+
+    def __init__(self, name: str, args: list, cwd: Path, env: dict, port: int, probe: str):
+        self.name = name
+        self.port = port
+        self.url = f"http://127.0.0.1:{port}"
+        self.probe = probe
+        self.log = tempfile.NamedTemporaryFile(prefix=f"bench-{name}-", suffix=".log", delete=False)
+        self.proc = subprocess.Popen(args, cwd=cwd, env=env, stdout=self.log, stderr=subprocess.STDOUT)
+
+    def wait_ready(self, timeout: float = 30) -> None:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.proc.poll() is not None:
+                break
+            try:
+                httpx.get(self.url + self.probe, timeout=1)
+                return
+            except httpx.HTTPError:
+                time.sleep(0.2)
+        raise RuntimeError(f"{self.name} did not start, see {self.log.name}")
+
+    def stop(self) -> None:
+        if self.proc.poll() is None:
+            self.proc.terminate()
+            try:
+                self.proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+
+
+def start_servers(args, targets: set) -> dict:
+    """Starts the stub and whichever apps the selected scenarios need."""
+    servers = {}
+    stub_port = _free_port()
+    servers["stub"] = Server(
+        "stub",
+        [sys.executable, str(Path(__file__).parent / "stub_upstream.py"), "--port", str(stub_port),
+         "--latency-median", str(args.latency_median), "--latency-sigma", str(args.latency_sigma),
+         "--error-rate", str(args.error_rate), "--tokens", str(args.tokens),
+         "--token-interval", str(args.token_interval), "--reasoning-tokens", str(args.reasoning_tokens),
+         "--model-profiles", args.model_profiles],
+        ROOT, dict(os.environ), stub_port, "/stats",
+    )
+    servers["stub"].wait_ready()
+
+    scratch = Path(tempfile.mkdtemp(prefix="bench-data-"))
+    if "mandi" in targets:
+        port = _free_port()
+        env = {
+            **os.environ,
+            "GEMINI_API_KEY": os.getenv("GEMINI_API_KEY", "bench-key"),
+            "GOOGLE_GEMINI_BASE_URL": servers["stub"].url,
+            # Keep caches and logs out of the repo's data/ directory
+            "CACHE_DB_PATH": str(scratch / "cache.sqlite3"),
+            "PHRASE_BANK_PATH": str(scratch / "phrase_bank.json"),
+            "INGEST_LOG_PATH": str(scratch / "ingest.log"),
+        }
+        servers["mandi"] = Server(
+            "mandi",
+            [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port),
+             "--log-level", "warning", "--workers", str(args.workers)],
+            MANDI_DIR, env, port, "/api/health",
+        )
+    if "proxy" in targets:
+        port = _free_port()
+        env = {
+            **os.environ,
+            "OPENROUTER_API_KEY": os.getenv("OPENROUTER_API_KEY", "bench-key"),
+            "OPENROUTER_URL": servers["stub"].url + "/api/v1/chat/completions",
+        }
+        if args.proxy_mode == "async":
+            command = [sys.executable, "-m", "uvicorn", "asgi:app", "--port", str(port),
+                       "--log-level", "warning", "--workers", str(args.workers)]
+        else:
+            command = [sys.executable, "-c",
+                       f"from app import app; app.run(host='127.0.0.1', port={port}, threaded=True)"]
+        servers["proxy"] = Server("proxy", command, PROXY_DIR, env, port, "/")
+    for name in targets:
+        servers[name].wait_ready()
+    return servers
+
+
+async def _one(client: httpx.AsyncClient, method: str, url: str, body, stream: bool) -> tuple:
+    """Sends one request; returns (status, latency, time to first byte)."""
+    started = time.perf_counter()
+    first = None
+    try:
+        async with client.stream(method, url, json=body) as response:
+            async for _ in response.aiter_raw():
+                if first is None:
+                    first = time.perf_counter() - started
+            status = response.status_code
+    except httpx.HTTPError as e:
+        status = type(e).__name__
+    latency = time.perf_counter() - started
+    return status, latency, first if stream else None
+
+
+async def run_scenario(name: str, server: Server, concurrency: int, args) -> dict:
+    """Closed-loop load: `concurrency` workers send back-to-back requests."""
+    _, method, path, make_body, stream = SCENARIOS[name]
+    url = server.url + path
+    latencies, ttfbs, statuses = [], [], {}
+    counter = iter(range(10 ** 9))
+    deadline = time.perf_counter() + args.duration
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(limits=limits, timeout=args.timeout) as client:
+        # Warm-up so first-request costs (imports, caches) are not measured
+        for _ in range(min(3, concurrency)):
+            i = next(counter)
+            await _one(client, method, url, make_body(i, args.unique) if make_body else None, stream)
+
+        async def worker():
+            while time.perf_counter() < deadline:
+                i = next(counter)
+                body = make_body(i, args.unique) if make_body else None
+                status, latency, ttfb = await _one(client, method, url, body, stream)
+                statuses[str(status)] = statuses.get(str(status), 0) + 1
+                latencies.append(latency)
+                if ttfb is not None:
+                    ttfbs.append(ttfb)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    ttfbs.sort()
+    ok = sum(n for s, n in statuses.items() if s.startswith("2"))
+    ms = lambda v: round(v * 1000, 2) if v is not None else None
+    return {
+        "scenario": name,
+        "target": server.name,
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "throughput_rps": round(len(latencies) / elapsed, 2),
+        "error_rate": round(1 - ok / len(latencies), 4) if latencies else None,
+        "statuses": statuses,
+        "latency_ms": {
+            "p50": ms(_percentile(latencies, 0.50)),
+            "p95": ms(_percentile(latencies, 0.95)),
+            "p99": ms(_percentile(latencies, 0.99)),
+            "max": ms(latencies[-1] if latencies else None),
+        },
+        "ttfb_ms": {
+            "p50": ms(_percentile(ttfbs, 0.50)),
+            "p95": ms(_percentile(ttfbs, 0.95)),
+        } if stream else None,
+        "memory": _memory(server.proc.pid),
+    }
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True).stdout.strip() or "unknown"
+    except OSError:
+        return "unknown"
+
+
+def compare(base_path: str, results: list) -> None:
+    """Prints p50/p95/throughput changes against an earlier result file."""
+    with open(base_path) as f:
+        base = {(r["scenario"], r["concurrency"]): r for r in json.load(f)["results"]}
+    print(f"\nChange vs {base_path} (negative latency / positive rps is better)")
+    print(f"{'scenario':<20}{'conc':>5}{'p50 ms':>16}{'p95 ms':>16}{'rps':>16}")
+    for r in results:
+        old = base.get((r["scenario"], r["concurrency"]))
+        if old is None:
+            continue
+
+        def delta(new, before):
+            if new is None or not before:
+                return "-"
+            return f"{new:.1f} ({(new - before) / before * 100:+.0f}%)"
+
+        print(f"{r['scenario']:<20}{r['concurrency']:>5}"
+              f"{delta(r['latency_ms']['p50'], old['latency_ms']['p50']):>16}"
+              f"{delta(r['latency_ms']['p95'], old['latency_ms']['p95']):>16}"
+              f"{delta(r['throughput_rps'], old['throughput_rps']):>16}")
+
+
+async def main_async(args) -> list:
+    names = args.only.split(",") if args.only else list(SCENARIOS)
+    unknown = [n for n in names if n not in SCENARIOS]
+    if unknown:
+        raise SystemExit(f"Unknown scenario(s): {', '.join(unknown)}. Choose from {', '.join(SCENARIOS)}")
+    levels = [int(c) for c in args.concurrency.split(",")]
+    servers = await asyncio.to_thread(start_servers, args, {SCENARIOS[n][0] for n in names})
+    results = []
+    try:
+        for name in names:
+            server = servers[SCENARIOS[name][0]]
+            for level in levels:
+                result = await run_scenario(name, server, level, args)
+                results.append(result)
+                lat = result["latency_ms"]
+                print(f"{name:<20} c={level:<4} {result['throughput_rps']:>9.1f} rps  "
+                      f"p50 {lat['p50']:>8} ms  p95 {lat['p95']:>8} ms  p99 {lat['p99']:>8} ms  "
+                      f"err {result['error_rate']:.2%}  rss {result['memory'].get('rss_mib', '?')} MiB")
+    finally:
+        for server in servers.values():
+            server.stop()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the mandi backend and the AI proxy against a stub LLM.")
+    parser.add_argument("--only", help="comma-separated scenarios (default: all)")
+    parser.add_argument("--concurrency", default="1,8,32", help="comma-separated concurrency levels")
+    parser.add_argument("--duration", type=float, default=10, help="seconds per scenario and level")
+    parser.add_argument("--timeout", type=float, default=60, help="client timeout per request")
+    parser.add_argument("--unique", action="store_true",
+                        help="make every request body distinct, defeating caches")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers for the mandi app and async proxy")
+    parser.add_argument("--proxy-mode", choices=("flask", "async"), default="flask",
+                        help="serve the AI proxy with Flask (app.py) or uvicorn (asgi.py)")
+    parser.add_argument("--latency-median", type=float, default=0.8)
+    parser.add_argument("--latency-sigma", type=float, default=0.5)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--tokens", type=int, default=60)
+    parser.add_argument("--token-interval", type=float, default=0.02)
+    parser.add_argument("--reasoning-tokens", type=int, default=0,
+                        help="reasoning deltas the stub streams before OpenRouter answers")
+    parser.add_argument("--model-profiles", default="",
+                        help='stub latency/errors per OpenRouter model: "name=median:error_rate,..."')
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="result file (default: bench/results/<time>-<commit>.json)")
+    parser.add_argument("--compare", help="earlier result file to compare against")
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    results = asyncio.run(main_async(args))
+
+    commit = _git_commit()
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    output = Path(args.output) if args.output else RESULTS_DIR / f"{stamp}-{commit}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({
+            "meta": {
+                "commit": commit,
+                "time": stamp,
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "args": vars(args),
+            },
+            "results": results,
+        }, f, indent=2)
+    print(f"\nSaved {len(results)} results to {output}")
+    if args.compare:
+        compare(args.compare, results)
+
+
+if __name__ == "__main__":
+    main()
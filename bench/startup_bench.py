@@ -0,0 +1,241 @@
+"""
+Cold-start benchmark for the Multilingual Mandi backend.
+
+Runs `import main` in fresh Python processes, the way a serverless
+platform does on a cold start, and reports:
+
+- import time per module (from `python -X importtime`), for our own
+  modules and the heaviest third-party packages
+- time from process start to the first response of each endpoint,
+  calling the ASGI app directly without lifespan (as on Vercel)
+
+The model endpoint is pointed at an unreachable upstream, so its row
+shows what the first model call pays for lazy initialization before
+falling back.
+
+    python bench/startup_bench.py --runs 5
+    python bench/startup_bench.py --compare bench/results/startup-old.json
+
+Results are written as JSON to bench/results/.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timezone
+from pathlib import Path
+
+from run_bench import MANDI_DIR, RESULTS_DIR, _git_commit
+
+# (name, method, path, body) requested in order after the import
+ENDPOINTS = (
+    ("health", "GET", "/api/health", None),
+    ("prices", "GET", "/api/prices", None),
+    ("detect_language", "POST", "/api/detect-language", {"text": "यह टमाटर कितने का है?"}),
+    ("translate", "POST", "/api/translate", {"text": "How much for tomatoes?", "target_lang": "Hindi"}),
+)
+
+# Runs inside each fresh process; prints one JSON line
+PROBE = r"""
+import asyncio, json, sys, time
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+
+async def call(method, path, body):
+    payload = json.dumps(body).encode() if body is not None else b""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": method, "scheme": "http", "path": path, "raw_path": path.encode(),
+        "query_string": b"", "root_path": "", "client": ("127.0.0.1", 50000),
+        "server": ("127.0.0.1", 80),
+        "headers": [(b"host", b"localhost"), (b"content-type", b"application/json"),
+                    (b"content-length", str(len(payload)).encode())],
+    }
+    messages = [{"type": "http.request", "body": payload, "more_body": False}]
+    status = []
+
+    async def receive():
+        return messages.pop(0) if messages else {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status.append(message["status"])
+
+    t = time.perf_counter()
+    await main.app(scope, receive, send)
+    return status[0] if status else None, (time.perf_counter() - t) * 1000
+
+async def run(endpoints):
+    out = []
+    for name, method, path, body in endpoints:
+        code, ms = await call(method, path, body)
+        out.append({"endpoint": name, "status": code, "ms": round(ms, 2),
+                    "since_start_ms": round((time.perf_counter() - started) * 1000, 2)})
+    return out
+
+endpoints = json.loads(sys.argv[1])
+print(json.dumps({
+    "import_ms": round((imported - started) * 1000, 2),
+    "requests": asyncio.run(run(endpoints)),
+    "heavy_modules": {m: m in sys.modules for m in ("google.genai", "numpy", "httpx")},
+}))
+"""
+
+
+def _env(scratch: Path) -> dict:
+    return {
+        **os.environ,
+        "GEMINI_API_KEY": os.getenv("GEMINI_API_KEY", "bench-key"),
+        # Nothing listens here, so the model call fails fast and falls back
+        "GOOGLE_GEMINI_BASE_URL": "http://127.0.0.1:9",
+        "GEMINI_TIMEOUT": "2",
+        "CACHE_DB_PATH": str(scratch / "cache.sqlite3"),
+        "PHRASE_BANK_PATH": str(scratch / "phrase_bank.json"),
+        "INGEST_LOG_PATH": str(scratch / "ingest.log"),
+    }
+
+
+def _parse_importtime(stderr: str) -> dict:
+    """{module: cumulative import ms} from `-X importtime` output."""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        _self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        modules[name.strip()] = int(cumulative_us) / 1000
+    return modules
+
+
+def _own_modules() -> set:
+    return {p.stem for p in MANDI_DIR.glob("*.py")}
+
+
+def run_once(endpoints: list, env: dict) -> tuple:
+    """One cold process for import times, and one for first responses."""
+    imports = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=MANDI_DIR, env=env, capture_output=True, text=True,
+    )
+    if imports.returncode != 0:
+        raise RuntimeError(f"import main failed:\n{imports.stderr[-2000:]}")
+    probe = subprocess.run(
+        [sys.executable, "-c", PROBE, json.dumps(endpoints)],
+        cwd=MANDI_DIR, env=env, capture_output=True, text=True,
+    )
+    lines = [l for l in probe.stdout.splitlines() if l.startswith("{")]
+    if probe.returncode != 0 or not lines:
+        raise RuntimeError(f"startup probe failed:\n{probe.stderr[-2000:]}")
+    return _parse_importtime(imports.stderr), json.loads(lines[-1])
+
+
+def summarize(runs: list, top: int) -> dict:
+    own = _own_modules()
+    median = lambda values: round(statistics.median(values), 2)
+
+    module_times = {}
+    for modules, _probe in runs:
+        for name, ms in modules.items():
+            module_times.setdefault(name, []).append(ms)
+    ours = {n: median(t) for n, t in module_times.items() if n in own}
+    # Top-level third-party packages only; their submodules are included
+    third_party = {
+        n: median(t) for n, t in module_times.items()
+        if "." not in n and n not in own and n not in sys.stdlib_module_names
+    }
+
+    per_endpoint = {}
+    for _modules, probe in runs:
+        for request in probe["requests"]:
+            per_endpoint.setdefault(request["endpoint"], []).append(request)
+    return {
+        "import_main_ms": median([p["import_ms"] for _m, p in runs]),
+        "modules_ms": dict(sorted(ours.items(), key=lambda kv: -kv[1])),
+        "third_party_ms": dict(sorted(third_party.items(), key=lambda kv: -kv[1])[:top]),
+        "first_requests": {
+            name: {
+                "status": requests[0]["status"],
+                "request_ms": median([r["ms"] for r in requests]),
+                "since_start_ms": median([r["since_start_ms"] for r in requests]),
+            }
+            for name, requests in per_endpoint.items()
+        },
+        "loaded_at_exit": runs[-1][1]["heavy_modules"],
+    }
+
+
+def report(summary: dict) -> None:
+    print(f"import main: {summary['import_main_ms']:.1f} ms (median)\n")
+    print(f"{'module':<28}{'cumulative ms':>14}")
+    for name, ms in summary["modules_ms"].items():
+        print(f"{name:<28}{ms:>14.1f}")
+    print(f"\n{'third-party package':<28}{'cumulative ms':>14}")
+    for name, ms in summary["third_party_ms"].items():
+        print(f"{name:<28}{ms:>14.1f}")
+    print(f"\n{'first request':<16}{'status':>8}{'request ms':>12}{'since start ms':>16}")
+    for name, r in summary["first_requests"].items():
+        print(f"{name:<16}{r['status']!s:>8}{r['request_ms']:>12.1f}{r['since_start_ms']:>16.1f}")
+    print(f"\nloaded after the requests: {summary['loaded_at_exit']}")
+
+
+def compare(base_path: str, summary: dict) -> None:
+    """Prints import and first-request changes against an earlier result file."""
+    with open(base_path) as f:
+        base = json.load(f)["summary"]
+
+    def delta(new, before):
+        if new is None or not before:
+            return "-"
+        return f"{new:.1f} ({(new - before) / before * 100:+.0f}%)"
+
+    print(f"\nChange vs {base_path} (negative is better)")
+    print(f"{'import main':<28}{delta(summary['import_main_ms'], base['import_main_ms']):>20}")
+    for name, r in summary["first_requests"].items():
+        old = base["first_requests"].get(name)
+        if old:
+            print(f"{'first ' + name:<28}{delta(r['since_start_ms'], old['since_start_ms']):>20}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold-start import and first-request times.")
+    parser.add_argument("--runs", type=int, default=5, help="fresh processes to measure (median is reported)")
+    parser.add_argument("--top", type=int, default=15, help="third-party packages to list")
+    parser.add_argument("--only", help="comma-separated endpoints (default: all)")
+    parser.add_argument("--output", help="result file (default: bench/results/startup-<time>-<commit>.json)")
+    parser.add_argument("--compare", help="earlier result file to compare against")
+    args = parser.parse_args()
+
+    names = args.only.split(",") if args.only else [e[0] for e in ENDPOINTS]
+    endpoints = [e for e in ENDPOINTS if e[0] in names]
+    scratch = Path(tempfile.mkdtemp(prefix="bench-startup-"))
+    runs = [run_once(endpoints, _env(scratch)) for _ in range(args.runs)]
+    summary = summarize(runs, args.top)
+    report(summary)
+
+    commit = _git_commit()
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    output = Path(args.output) if args.output else RESULTS_DIR / f"startup-{stamp}-{commit}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({
+            "meta": {
+                "commit": commit,
+                "time": stamp,
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "args": vars(args),
+            },
+            "summary": summary,
+            "runs": [probe for _modules, probe in runs],
+        }, f, indent=2)
+    print(f"\nSaved results to {output}")
+    if args.compare:
+        compare(args.compare, summary)
+
+
+if __name__ == "__main__":
+    main()
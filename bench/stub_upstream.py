@@ -0,0 +1,237 @@
+"""
+Stub LLM upstream for benchmarks.
+
+Imitates the two model APIs our backends call, so load tests do not
+burn real quota:
+
+- Gemini:     POST /v1beta/models/{model}:generateContent
+              POST /v1beta/models/{model}:streamGenerateContent?alt=sse
+- OpenRouter: POST /api/v1/chat/completions  (with "stream": true for SSE)
+
+Latency is drawn from a log-normal distribution (median and sigma), a
+configurable share of calls fails with 429/500, and streamed answers
+arrive token by token at a fixed interval. With --reasoning-tokens N,
+OpenRouter streams first send N "reasoning" deltas (or, when the request
+sets reasoning.exclude, the same wait with a ": OPENROUTER PROCESSING"
+comment), like a reasoning model. --model-profiles gives individual
+OpenRouter models their own latency median and error rate, to exercise
+the proxy's model routing.
+
+Point the apps at it with:
+    GOOGLE_GEMINI_BASE_URL=http://127.0.0.1:8900   (read by google-genai)
+    OPENROUTER_URL=http://127.0.0.1:8900/api/v1/chat/completions
+
+Run:
+    python bench/stub_upstream.py --port 8900 --latency-median 0.8 --error-rate 0.02
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+from typing import Optional
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# Defaults, overridable by CLI flags or STUB_* environment variables
+CONFIG = {
+    "latency_median": float(os.getenv("STUB_LATENCY_MEDIAN", "0.8")),
+    "latency_sigma": float(os.getenv("STUB_LATENCY_SIGMA", "0.5")),
+    "error_rate": float(os.getenv("STUB_ERROR_RATE", "0.0")),
+    "tokens": int(os.getenv("STUB_TOKENS", "60")),
+    "token_interval": float(os.getenv("STUB_TOKEN_INTERVAL", "0.02")),
+    "reasoning_tokens": int(os.getenv("STUB_REASONING_TOKENS", "0")),
+    # "model=median:error_rate,..." overrides for OpenRouter models
+    "model_profiles": os.getenv("STUB_MODEL_PROFILES", ""),
+}
+
+WORDS = (
+    "bhaiya thoda kam karo tomato fresh hai aaj rate market mandi accha "
+    "price fair quality kilo discount regular customer sabzi dukaan"
+).split()
+
+app = FastAPI(title="stub-llm-upstream")
+stats = {"requests": 0, "errors": 0, "streams": 0}
+
+
+def _model_profile(model: str) -> tuple:
+    """(latency median, error rate) for an OpenRouter model."""
+    for entry in filter(None, CONFIG["model_profiles"].split(",")):
+        name, _, profile = entry.strip().rpartition("=")
+        if name == model:
+            median, _, error_rate = profile.partition(":")
+            return float(median), float(error_rate or CONFIG["error_rate"])
+    return CONFIG["latency_median"], CONFIG["error_rate"]
+
+
+def _latency(median: Optional[float] = None) -> float:
+    """One log-normal latency sample around the configured median."""
+    median = CONFIG["latency_median"] if median is None else median
+    if median <= 0:
+        return 0.0
+    return random.lognormvariate(0, CONFIG["latency_sigma"]) * median
+
+
+def _tokens(prompt: str) -> list:
+    """Deterministic pseudo-answer for a prompt, split into tokens."""
+    rng = random.Random(prompt)
+    return [rng.choice(WORDS) + " " for _ in range(CONFIG["tokens"])]
+
+
+def _answer(prompt: str) -> str:
+    """
+    Whole answer for a prompt. Batch translation prompts get the JSON
+    object they expect, so that code path is exercised realistically.
+    """
+    if "\nEntries:\n" in prompt:
+        try:
+            entries = json.loads(prompt.rsplit("\nEntries:\n", 1)[1])
+            return json.dumps({
+                entry_id: {lang: f"stub {lang} {entry_id}" for lang in entry["languages"]}
+                for entry_id, entry in entries.items()
+            }, ensure_ascii=False)
+        except (ValueError, KeyError, AttributeError):
+            pass
+    return "".join(_tokens(prompt)).strip()
+
+
+def _maybe_error(error_rate: Optional[float] = None):
+    if random.random() < (CONFIG["error_rate"] if error_rate is None else error_rate):
+        stats["errors"] += 1
+        status = random.choice((429, 500, 503))
+        return JSONResponse({"error": {"code": status, "message": "stub failure"}}, status_code=status)
+    return None
+
+
+def _gemini_prompt(body: dict) -> str:
+    parts = []
+    for content in body.get("contents", []):
+        for part in content.get("parts", []):
+            parts.append(part.get("text", ""))
+    return "\n".join(parts)
+
+
+def _gemini_chunk(text: str, final: bool) -> dict:
+    chunk = {
+        "candidates": [{
+            "content": {"parts": [{"text": text}], "role": "model"},
+            "index": 0,
+        }],
+    }
+    if final:
+        chunk["candidates"][0]["finishReason"] = "STOP"
+        chunk["usageMetadata"] = {"promptTokenCount": 10, "candidatesTokenCount": CONFIG["tokens"]}
+    return chunk
+
+
+@app.post("/v1beta/models/{model_action:path}")
+async def gemini(model_action: str, request: Request):
+    stats["requests"] += 1
+    body = await request.json()
+    prompt = _gemini_prompt(body)
+    await asyncio.sleep(_latency())
+    error = _maybe_error()
+    if error is not None:
+        return error
+
+    if model_action.endswith(":streamGenerateContent"):
+        stats["streams"] += 1
+        tokens = _tokens(prompt)
+
+        async def events():
+            for i, token in enumerate(tokens):
+                yield f"data: {json.dumps(_gemini_chunk(token, i == len(tokens) - 1))}\r\n\r\n"
+                await asyncio.sleep(CONFIG["token_interval"])
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+    return _gemini_chunk(_answer(prompt), True)
+
+
+@app.post("/api/v1/chat/completions")
+async def openrouter(request: Request):
+    stats["requests"] += 1
+    body = await request.json()
+    prompt = "\n".join(str(m.get("content", "")) for m in body.get("messages", []))
+    model = body.get("model", "stub/model")
+    median, error_rate = _model_profile(model)
+    await asyncio.sleep(_latency(median))
+    error = _maybe_error(error_rate)
+    if error is not None:
+        return error
+
+    if body.get("stream"):
+        stats["streams"] += 1
+        tokens = _tokens(prompt)
+
+        exclude = (body.get("reasoning") or {}).get("exclude", False)
+
+        async def events():
+            if exclude and CONFIG["reasoning_tokens"]:
+                yield ": OPENROUTER PROCESSING\n\n"
+            for i in range(CONFIG["reasoning_tokens"]):
+                if not exclude:
+                    delta = {"choices": [{"index": 0, "delta": {"content": "", "reasoning": f"thought {i} "}}],
+                             "model": model}
+                    yield f"data: {json.dumps(delta)}\n\n"
+                await asyncio.sleep(CONFIG["token_interval"])
+            for token in tokens:
+                delta = {"choices": [{"index": 0, "delta": {"content": token}}], "model": model}
+                yield f"data: {json.dumps(delta)}\n\n"
+                await asyncio.sleep(CONFIG["token_interval"])
+            done = {"choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}], "model": model}
+            yield f"data: {json.dumps(done)}\n\ndata: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+    return {
+        "id": "stub",
+        "object": "chat.completion",
+        "model": model,
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": _answer(prompt)},
+            "finish_reason": "stop",
+        }],
+        "usage": {"prompt_tokens": 10, "completion_tokens": CONFIG["tokens"]},
+    }
+
+
+@app.get("/stats")
+async def get_stats():
+    return {**stats, "config": CONFIG}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency-median", type=float, default=CONFIG["latency_median"],
+                        help="median upstream latency in seconds")
+    parser.add_argument("--latency-sigma", type=float, default=CONFIG["latency_sigma"],
+                        help="log-normal sigma; larger means a heavier tail")
+    parser.add_argument("--error-rate", type=float, default=CONFIG["error_rate"],
+                        help="share of calls failing with 429/500/503")
+    parser.add_argument("--tokens", type=int, default=CONFIG["tokens"],
+                        help="tokens per answer")
+    parser.add_argument("--token-interval", type=float, default=CONFIG["token_interval"],
+                        help="seconds between streamed tokens")
+    parser.add_argument("--reasoning-tokens", type=int, default=CONFIG["reasoning_tokens"],
+                        help="reasoning deltas before each streamed OpenRouter answer")
+    parser.add_argument("--model-profiles", default=CONFIG["model_profiles"],
+                        help='per-model "name=median:error_rate,..." for OpenRouter calls')
+    args = parser.parse_args()
+    CONFIG.update(
+        latency_median=args.latency_median,
+        latency_sigma=args.latency_sigma,
+        error_rate=args.error_rate,
+        tokens=args.tokens,
+        token_interval=args.token_interval,
+        reasoning_tokens=args.reasoning_tokens,
+        model_profiles=args.model_profiles,
+    )
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()